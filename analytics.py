@@ -0,0 +1,211 @@
+import bisect
+import datetime
+import json
+import logging
+import os
+import struct
+
+logger = logging.getLogger("F1Bot")
+
+# Event-sourced race analytics. Every finished race is appended to race_events.bin as one
+# fixed-width record; hourly and daily rollups are kept in memory and checkpointed to
+# race_rollups.json together with the number of events they cover, so startup only replays
+# the events appended since the last checkpoint. Range queries read the rollups only.
+#
+#   timestamp (UTC epoch seconds), guild ID, channel ID, mode, player count,
+#   duration in seconds, track name (UTF-8, NUL padded)
+
+EVENT = struct.Struct("<dQQBHf32s")
+MODES = ("solo", "duo")
+HOUR = 3600
+DAY = 86400
+
+def new_bucket():
+    return {"races": 0, "solo": 0, "duo": 0, "players": 0, "duration": 0.0, "guilds": {}}
+
+def add_to_bucket(bucket, other):
+    for key in ("races", "solo", "duo", "players", "duration"):
+        bucket[key] += other[key]
+    for guild_id, races in other["guilds"].items():
+        bucket["guilds"][guild_id] = bucket["guilds"].get(guild_id, 0) + races
+
+class Rollup:
+    # Buckets of a fixed width, keyed by bucket start; keys is kept sorted for range lookups
+    def __init__(self, width):
+        self.width = width
+        self.buckets = {}
+        self.keys = []
+
+    def add(self, timestamp, mode, guild_id, players, duration):
+        start = int(timestamp // self.width) * self.width
+        bucket = self.buckets.get(start)
+        if bucket is None:
+            bucket = self.buckets[start] = new_bucket()
+            bisect.insort(self.keys, start)
+        bucket["races"] += 1
+        bucket[mode] += 1
+        bucket["players"] += players
+        bucket["duration"] += duration
+        bucket["guilds"][guild_id] = bucket["guilds"].get(guild_id, 0) + 1
+
+    def sum(self, start, end, total):
+        # Adds every bucket starting in [start, end) to total
+        for key in self.keys[bisect.bisect_left(self.keys, start):bisect.bisect_left(self.keys, end)]:
+            add_to_bucket(total, self.buckets[key])
+
+    def to_json(self):
+        return {
+            str(start): dict(bucket, guilds={str(guild_id): races for guild_id, races in bucket["guilds"].items()})
+            for start, bucket in self.buckets.items()
+        }
+
+    def load_json(self, data):
+        self.buckets = {
+            int(start): dict(bucket, guilds={int(guild_id): races for guild_id, races in bucket["guilds"].items()})
+            for start, bucket in data.items()
+        }
+        self.keys = sorted(self.buckets)
+
+class RaceEventStore:
+    def __init__(self, path="race_events.bin", rollup_path="race_rollups.json"):
+        self.path = path
+        self.rollup_path = rollup_path
+        self.hourly = Rollup(HOUR)
+        self.daily = Rollup(DAY)
+        self.count = 0
+        self.checkpointed = 0
+        self.events_file = None
+
+    def open(self):
+        checkpointed = self.load_checkpoint()
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size % EVENT.size:
+            # A crash mid-append leaves a torn last record behind
+            logger.warning(f"Truncating torn record at the end of {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(size - size % EVENT.size)
+        replayed = 0
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                f.seek(checkpointed * EVENT.size)
+                for record in EVENT.iter_unpack(f.read()):
+                    self.apply(*record)
+                    replayed += 1
+        self.count = checkpointed + replayed
+        self.checkpointed = checkpointed
+        self.events_file = open(self.path, "ab")
+        logger.info(f"✅ Loaded race analytics (Events: {self.count}, replayed: {replayed})")
+
+    def load_checkpoint(self):
+        try:
+            if not os.path.exists(self.rollup_path):
+                return 0
+            with open(self.rollup_path, "r") as f:
+                data = json.load(f)
+            self.hourly.load_json(data["hourly"])
+            self.daily.load_json(data["daily"])
+            return data["events"]
+        except (json.JSONDecodeError, KeyError, ValueError, IOError) as e:
+            logger.error(f"⚠️ Error loading {self.rollup_path}: {e}, rebuilding from {self.path}")
+            self.hourly = Rollup(HOUR)
+            self.daily = Rollup(DAY)
+            return 0
+
+    def apply(self, timestamp, guild_id, channel_id, mode, players, duration, track):
+        mode = MODES[mode]
+        self.hourly.add(timestamp, mode, guild_id, players, duration)
+        self.daily.add(timestamp, mode, guild_id, players, duration)
+
+    def append(self, timestamp, mode, guild_id, channel_id, track, players, duration):
+        record = (timestamp, guild_id or 0, channel_id or 0, MODES.index(mode) if mode in MODES else 1,
+                  players, duration, track.encode("utf-8")[:32])
+        try:
+            self.events_file.write(EVENT.pack(*record))
+            self.events_file.flush()
+        except (IOError, OSError) as e:
+            logger.error(f"Failed to append race event to {self.path}: {e}")
+            return self.count
+        self.apply(*record)
+        self.count += 1
+        return self.count
+
+    def checkpoint(self):
+        if self.count == self.checkpointed:
+            return
+        try:
+            self.events_file.flush()
+            os.fsync(self.events_file.fileno())
+            temp_file = f"{self.rollup_path}.tmp"
+            with open(temp_file, "w") as f:
+                json.dump({"events": self.count, "hourly": self.hourly.to_json(), "daily": self.daily.to_json()}, f)
+            os.replace(temp_file, self.rollup_path)
+            self.checkpointed = self.count
+        except (IOError, OSError) as e:
+            logger.error(f"Failed to checkpoint {self.rollup_path}: {e}")
+
+    def summary(self, start, end):
+        # Whole days come from the daily rollup, the partial days at either end from the hourly one
+        start = int(start // HOUR) * HOUR
+        end = -int(-end // HOUR) * HOUR
+        first_day = -(-start // DAY) * DAY
+        last_day = end // DAY * DAY
+        total = new_bucket()
+        if first_day >= last_day:
+            self.hourly.sum(start, end, total)
+            return total
+        self.hourly.sum(start, first_day, total)
+        self.daily.sum(first_day, last_day, total)
+        self.hourly.sum(last_day, end, total)
+        return total
+
+    def close(self):
+        if self.events_file is not None:
+            self.checkpoint()
+            self.events_file.close()
+            self.events_file = None
+
+class ServerJoinIndex:
+    # Latest join date per current guild and every leave event per guild, mirrored into sorted
+    # lists of day ordinals so "joined since X" is one bisect. join_dates/leave_dates are the
+    # ISO date maps persisted in race_logs.json (leave_dates holds a list per guild, so a rejoin
+    # doesn't erase a departure already counted) and are updated in place.
+    def __init__(self, join_dates, leave_dates):
+        self.join_dates = join_dates
+        self.leave_dates = leave_dates
+        for key, dates in leave_dates.items():
+            if isinstance(dates, str):  # Written before leaves were kept per event
+                leave_dates[key] = [dates]
+        self.joins = sorted(datetime.date.fromisoformat(date).toordinal() for date in join_dates.values())
+        self.leaves = sorted(datetime.date.fromisoformat(date).toordinal() for dates in leave_dates.values() for date in dates)
+
+    def __len__(self):
+        return len(self.join_dates)
+
+    def __contains__(self, guild_id):
+        return str(guild_id) in self.join_dates
+
+    def join(self, guild_id, date):
+        key = str(guild_id)
+        self.discard(self.joins, self.join_dates.pop(key, None))
+        self.join_dates[key] = str(date)
+        bisect.insort(self.joins, date.toordinal())
+
+    def leave(self, guild_id, date):
+        key = str(guild_id)
+        self.discard(self.joins, self.join_dates.pop(key, None))
+        self.leave_dates.setdefault(key, []).append(str(date))
+        bisect.insort(self.leaves, date.toordinal())
+
+    def discard(self, ordinals, date):
+        if date is None:
+            return
+        ordinal = datetime.date.fromisoformat(date).toordinal()
+        i = bisect.bisect_left(ordinals, ordinal)
+        if i < len(ordinals) and ordinals[i] == ordinal:
+            del ordinals[i]
+
+    def joined_since(self, date):
+        return len(self.joins) - bisect.bisect_left(self.joins, date.toordinal())
+
+    def left_since(self, date):
+        return len(self.leaves) - bisect.bisect_left(self.leaves, date.toordinal())
@@ -9,9 +9,26 @@ import os
 import time
 import logging
 import datetime
+import multiprocessing
 import os
-from collections import defaultdict
+import sys
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 import uuid
+from storage import JsonProfileStore, ProfileCache, SqliteProfileStore, copy_profile
+from analytics import RaceEventStore, ServerJoinIndex
+from outbound import ALERT, DROPPED, PANEL, RESULTS, STATUS, OutboundScheduler
+from profiles import (
+    PART_MAX_LEVEL, RACE_ZCOIN_MIN_PLAYERS, RACE_ZCOIN_REWARDS, ZCOIN_CLAIMS, apply_upgrade, new_player_profile, upgrade_cost
+)
+from predictor import RacePredictor, best_start
+from replay import encode_replay, replay_path, write_replay
+from race_engine import (
+    BALANCED, F1_POINTS, PIT_STOP, PUSH, SAVE, STRATEGY_CODES, STRATEGY_INDEX, TRACKS_INFO, TYRE_CODES, TYRE_INDEX,
+    WEATHER_OPTIONS, PendingInput, WeatherWindow, car_modifiers, create_engine, current_physics, race_highlights,
+    reload_physics, resolve_race
+)
+from race_state import Lobby, RaceDriver
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("F1Bot")
@@ -23,38 +40,6 @@ intents.members = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 bot.remove_command("help")
 
-TRACKS_INFO = {
-    "Australia": {"base_lap_time": 96.5, "laps": 58, "conditions": {"speed": "Medium", "acceleration": "Medium", "overtaking": "Medium", "corners": "Moderate"}},
-    "China": {"base_lap_time": 92.7, "laps": 56, "conditions": {"speed": "Medium", "acceleration": "High", "overtaking": "Medium", "corners": "Moderate"}},
-    "Japan": {"base_lap_time": 87.6, "laps": 53, "conditions": {"speed": "Medium", "acceleration": "Medium", "overtaking": "Medium", "corners": "Many"}},
-    "Bahrain": {"base_lap_time": 93.8, "laps": 57, "conditions": {"speed": "High", "acceleration": "Medium", "overtaking": "Easy", "corners": "Moderate"}},
-    "Saudi Arabia": {"base_lap_time": 90.0, "laps": 50, "conditions": {"speed": "High", "acceleration": "Low", "overtaking": "Easy", "corners": "Few"}},
-    "Miami": {"base_lap_time": 91.8, "laps": 57, "conditions": {"speed": "Medium", "acceleration": "Medium", "overtaking": "Medium", "corners": "Moderate"}},
-    "Imola": {"base_lap_time": 93.2, "laps": 63, "conditions": {"speed": "Medium", "acceleration": "Medium", "overtaking": "Hard", "corners": "Many"}},
-    "Monaco": {"base_lap_time": 73.3, "laps": 78, "conditions": {"speed": "Low", "acceleration": "Low", "overtaking": "Hard", "corners": "Many"}},
-    "Spain": {"base_lap_time": 85.5, "laps": 66, "conditions": {"speed": "Medium", "acceleration": "High", "overtaking": "Medium", "corners": "Moderate"}},
-    "Canada": {"base_lap_time": 69.0, "laps": 70, "conditions": {"speed": "High", "acceleration": "Medium", "overtaking": "Easy", "corners": "Few"}},
-    "Austria": {"base_lap_time": 67.2, "laps": 71, "conditions": {"speed": "High", "acceleration": "High", "overtaking": "Easy", "corners": "Few"}},
-    "UK": {"base_lap_time": 90.3, "laps": 52, "conditions": {"speed": "High", "acceleration": "Medium", "overtaking": "Easy", "corners": "Moderate"}},
-    "Belgium": {"base_lap_time": 102.0, "laps": 44, "conditions": {"speed": "High", "acceleration": "High", "overtaking": "Medium", "corners": "Moderate"}},
-    "Hungary": {"base_lap_time": 71.5, "laps": 70, "conditions": {"speed": "Low", "acceleration": "Low", "overtaking": "Hard", "corners": "Many"}},
-    "Netherlands": {"base_lap_time": 67.1, "laps": 72, "conditions": {"speed": "Low", "acceleration": "Medium", "overtaking": "Hard", "corners": "Many"}},
-    "Monza": {"base_lap_time": 83.6, "laps": 53, "conditions": {"speed": "High", "acceleration": "Medium", "overtaking": "Easy", "corners": "Few"}},
-    "Azerbaijan": {"base_lap_time": 95.0, "laps": 51, "conditions": {"speed": "High", "acceleration": "Low", "overtaking": "Medium", "corners": "Moderate"}},
-    "Singapore": {"base_lap_time": 88.0, "laps": 61, "conditions": {"speed": "Low", "acceleration": "Low", "overtaking": "Hard", "corners": "Many"}},
-    "Austin": {"base_lap_time": 85.7, "laps": 56, "conditions": {"speed": "Medium", "acceleration": "High", "overtaking": "Easy", "corners": "Moderate"}},
-    "Mexico": {"base_lap_time": 67.6, "laps": 71, "conditions": {"speed": "Medium", "acceleration": "Medium", "overtaking": "Medium", "corners": "Moderate"}},
-    "Brazil": {"base_lap_time": 73.0, "laps": 71, "conditions": {"speed": "Medium", "acceleration": "High", "overtaking": "Medium", "corners": "Moderate"}},
-    "Las Vegas": {"base_lap_time": 89.5, "laps": 50, "conditions": {"speed": "High", "acceleration": "Low", "overtaking": "Easy", "corners": "Few"}},
-    "Qatar": {"base_lap_time": 91.2, "laps": 57, "conditions": {"speed": "High", "acceleration": "Medium", "overtaking": "Medium", "corners": "Moderate"}},
-    "Abu Dhabi": {"base_lap_time": 90.6, "laps": 55, "conditions": {"speed": "Medium", "acceleration": "Medium", "overtaking": "Medium", "corners": "Moderate"}}
-}
-
-WEATHER_OPTIONS = ["☀️ Sunny", "🌦️ Light Rain", "🌧️ Heavy Rain", "☁️ Cloudy", "🌬️ Windy"]
-
-F1_POINTS = {
-    1: 25, 2: 18, 3: 15, 4: 12, 5: 10, 6: 8, 7: 6, 8: 4, 9: 2, 10: 1
-}
 
 AUTHORIZED_TM_USERS = [
     851188509501947924,
@@ -69,142 +54,173 @@ AUTHORIZED_USERS = [
 banned_users = {}
 lobbies = {}
 career_stats = {}
-default_player_profile = {
-    "races": 0, "wins": 0, "podiums": 0, "dnfs": 0, "fastest_lap": None, "total_time": 0.0,
-    "points": 0, "zcoins": 0, "last_daily": 0, "last_weekly": 0, "last_monthly": 0,
-    "car_parts": {
-        "engine": 5,
-        "aero": 5,
-        "tyres": 5,
-        "chassis": 5,
-        "gearbox": 5,
-        "suspension": 5
-    },
-    "part_upgrade_counts": {
-        "engine": 0,
-        "aero": 0,
-        "tyres": 0,
-        "chassis": 0,
-        "gearbox": 0,
-        "suspension": 0
-    },
-    "tournament_stats": {
-        "points": 0, "wins": 0, "podiums": 0
-    }
-}
+dirty_profiles = set()
+user_names = {}  # user_id -> (name, resolved_at)
+user_names_dirty = False
+STORAGE_BACKEND = "json"  # "json" for small installs, "sqlite" for large ones (convert with migrate_storage.py)
+SNAPSHOT_FORMAT = "json"  # "binary" keeps a compact mmap-loaded career_stats.bin; JSON stays the export format (snapshot.py)
+CAREER_JOURNAL_FILE = "career_stats.journal"
+JOURNAL_FSYNC_INTERVAL = 1.0  # Seconds between batched fsyncs of the journal
+JOURNAL_COMPACT_RECORDS = 5000  # Fold the journal into a snapshot past this many records
+PROFILE_CACHE_SIZE = 5000  # Profiles kept in memory; the rest are paged in from the store on demand
+REPLAY_DIR = "replays"  # One seeded replay per race, re-simulate with replay.py
+LAP_DELAY = 4.0  # Seconds per lap in live races
+INSTANT_HIGHLIGHT_DELAY = 3.0  # Seconds between highlights of an instant race
+INSTANT_FINAL_LAPS = 3  # Closing laps of an instant race shown on the status message
+DM_FANOUT_CONCURRENCY = 8  # DM panel edits in flight at once per race
+DM_UPDATE_TIMEOUT = 3.0  # Most seconds a lap's DM panel fan-out may take (never more than what's left of the lap)
+USER_NAMES_FILE = "user_names.json"  # Display names seen for user IDs, kept across restarts
+USER_NAME_TTL = 24 * 3600  # Seconds a cached display name is used before it's looked up again
+USER_FETCH_CONCURRENCY = 5  # fetch_user calls in flight at once for users the gateway doesn't know
+if STORAGE_BACKEND == "sqlite":
+    profile_store = SqliteProfileStore("career_stats.db")
+else:
+    snapshot_file = "career_stats.bin" if SNAPSHOT_FORMAT == "binary" else "career_stats.json"
+    profile_store = JsonProfileStore(snapshot_file, CAREER_JOURNAL_FILE, JOURNAL_COMPACT_RECORDS, SNAPSHOT_FORMAT)
+
+def discord_rate_limit(error):
+    # (retry after, global?) from a 429's headers, for the outbound scheduler
+    if not isinstance(error, discord.HTTPException) or error.status != 429:
+        return None
+    headers = getattr(error.response, "headers", None) or {}
+    retry_after = headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After") or 1.0
+    return float(retry_after), headers.get("X-RateLimit-Global") == "true"
+
+# Race traffic (results, alerts, status edits, DM panels) goes through one scheduler: per-route
+# token buckets paced under Discord's limits (discord.py retries 429s itself, so the buckets do the
+# throttling), priorities, and merging/dropping of stale panel refreshes (outbound.py)
+outbound = OutboundScheduler(discord_rate_limit)
+
+def channel_route(target):
+    # A ctx, message or channel -> the channel's outbound route
+    return ("channel", getattr(target, "channel", target).id)
+
+async def safe_send(channel, content=None, embed=None, priority=ALERT):
+    if not embed and not content:
+        return None
+    try:
+        if embed:
+            return await outbound.send(channel_route(channel), priority, lambda: channel.send(embed=embed))
+        return await outbound.send(channel_route(channel), priority, lambda: channel.send(content))
+    except (discord.HTTPException, discord.Forbidden) as e:
+        logger.error(f"Failed to send message: {e}")
+        return None
 
-async def safe_send(channel, content=None, embed=None, retries=3, delay=5):
-    for attempt in range(retries):
-        try:
-            if embed:
-                await channel.send(embed=embed)
-            elif content:
-                await channel.send(content)
-            return
-        except (discord.HTTPException, discord.Forbidden) as e:
-            if e.status == 429:
-                logger.warning(f"Rate limited, retrying in {delay}s...")
-                await asyncio.sleep(delay)
-                delay *= 2
-            else:
-                logger.error(f"Failed to send message: {e}")
-                return
-    logger.warning(f"Failed to send message after {retries} retries")
+def mark_profile_dirty(user_id):
+    dirty_profiles.add(int(user_id))
 
 def get_player_profile(user_id):
     user_id = int(user_id)
-    if user_id not in career_stats:
-        career_stats[user_id] = default_player_profile.copy()
-    profile = career_stats[user_id]
-    for key, value in default_player_profile.items():
-        if key not in profile:
-            profile[key] = value
-        elif isinstance(value, dict):
-            for subkey, subvalue in value.items():
-                if subkey not in profile[key]:
-                    profile[key][subkey] = subvalue
-    save_career_stats()
+    profile = career_stats.get(user_id)
+    if profile is None:
+        profile = new_player_profile()
+        career_stats[user_id] = profile
+        mark_profile_dirty(user_id)
     return profile
 
+def read_profiles(user_ids):
+    # Runs on the persistence thread
+    return {user_id: profile_store.get(user_id) for user_id in user_ids}
+
+async def load_player_profiles(user_ids):
+    # Pages profiles missing from career_stats in on the persistence thread, so the
+    # get_player_profile() calls that follow never read the store on the event loop
+    # (the SQLite store holds its lock through writes and compactions)
+    missing = career_stats.missing(user_ids)
+    if not missing:
+        return
+    profiles = await persistence.submit(read_profiles, missing)
+    created = [user_id for user_id, profile in profiles.items() if profile is None]
+    career_stats.preload({user_id: profile if profile is not None else new_player_profile() for user_id, profile in profiles.items()})
+    for user_id in created:
+        mark_profile_dirty(user_id)
+
+class PersistenceWorker:
+    # Runs all blocking disk work on one background thread. Jobs execute in submission order,
+    # so a journal append can never overtake the compaction that follows it.
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistence")
+        self.loop = None  # The event loop jobs are submitted from
+
+    def submit(self, func, *args):
+        future = self.executor.submit(func, *args)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return future  # Called outside the event loop (startup/atexit)
+        self.loop = loop
+        return asyncio.wrap_future(future, loop=loop)
+
+    def call_on_loop(self, func, *args):
+        # From a job: state owned by the event loop is only touched on the loop
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(func, *args)
+        else:
+            func(*args)  # The loop is gone (atexit), nothing else touches the state any more
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+persistence = PersistenceWorker()
+predictor = RacePredictor()  # !predict simulations run in its process pool, off the event loop
+
+def take_dirty_profiles():
+    pending = {}
+    for user_id in sorted(dirty_profiles):
+        profile = career_stats.get(user_id)
+        if profile is not None:
+            pending[user_id] = copy_profile(profile)
+    dirty_profiles.clear()
+    return pending
+
+def flush_career_stats(sync=False):
+    # Write-behind: only the profiles that changed are handed to the store
+    return persistence.submit(write_profiles, take_dirty_profiles(), sync)
+
+def write_profiles(profiles, sync):
+    # Runs on the persistence thread
+    if profiles:
+        if not profile_store.write(profiles):
+            persistence.call_on_loop(dirty_profiles.update, profiles)  # Retry on the next flush
+            return False
+        logger.debug(f"💾 Wrote {len(profiles)} dirty profiles to {profile_store.name} store")
+    if sync:
+        profile_store.sync()
+    return True
+
+def write_back_evicted(user_id, profile):
+    # A dirty profile fell out of the LRU: it is written on its own and dropped from the
+    # cache's writeback copies only once the store holds it
+    dirty_profiles.discard(user_id)
+    persistence.submit(write_evicted_profile, user_id, profile)
+
+def write_evicted_profile(user_id, profile):
+    # Runs on the persistence thread
+    if write_profiles({user_id: profile}, False):
+        career_stats.written_back(user_id, profile)
+
+def compact_career_stats():
+    flush_career_stats(sync=True)
+    return save_career_stats()
+
+async def autosync_career_journal():
+    while True:
+        await asyncio.sleep(JOURNAL_FSYNC_INTERVAL)
+        persistence.submit(profile_store.sync)
+
 def save_career_stats():
-    try:
-        if not career_stats:
-            logger.warning("Skipping save: career_stats is empty")
-            return
-        temp_file = "career_stats_temp.json"
-        with open(temp_file, "w") as f:
-            json.dump(career_stats, f, indent=2)
-        if os.path.exists("career_stats.json"):
-            os.replace("career_stats.json", "career_stats_backup.json")
-        os.replace(temp_file, "career_stats.json")
-        logger.info(f"💾 Saved career_stats.json (Size: {os.path.getsize('career_stats.json')} bytes)")
-    except (IOError, OSError) as e:
-        logger.error(f"Failed to save career_stats.json: {e}")
-        if os.path.exists("career_stats_backup.json"):
-            os.replace("career_stats_backup.json", "career_stats.json")
-            logger.info("Restored career_stats.json from backup")
+    return persistence.submit(profile_store.compact)
 
 def load_career_stats():
     global career_stats
-    try:
-        if os.path.exists("career_stats.json"):
-            with open("career_stats.json", "r") as f:
-                file_content = f.read()
-                if not file_content.strip():  # Check for empty file
-                    logger.warning("career_stats.json is empty, starting fresh")
-                    career_stats = {}
-                    return
-                data = json.loads(file_content)
-                career_stats = {int(k): v for k, v in data.items()}
-                # Ensure all profiles have necessary fields
-                for user_id, profile in career_stats.items():
-                    for key, value in default_player_profile.items():
-                        if key not in profile:
-                            profile[key] = value
-                        elif isinstance(value, dict):
-                            for subkey, subvalue in value.items():
-                                if subkey not in profile[key]:
-                                    profile[key][subkey] = subvalue
-                logger.info(f"✅ Loaded career_stats.json (Entries: {len(career_stats)})")
-                # Log a sample of the loaded data for debugging
-                if career_stats:
-                    sample_user = next(iter(career_stats))
-                    logger.info(f"Sample data: User {sample_user} - {career_stats[sample_user]}")
-        else:
-            logger.info("ℹ️ career_stats.json not found, starting fresh")
-            career_stats = {}
-    except (json.JSONDecodeError, IOError) as e:
-        logger.error(f"⚠️ Error loading career_stats.json: {e}, attempting backup")
-        try:
-            if os.path.exists("career_stats_backup.json"):
-                with open("career_stats_backup.json", "r") as f:
-                    file_content = f.read()
-                    if not file_content.strip():
-                        logger.warning("career_stats_backup.json is empty, starting fresh")
-                        career_stats = {}
-                        return
-                    data = json.loads(file_content)
-                    career_stats = {int(k): v for k, v in data.items()}
-                    # Ensure all profiles have necessary fields
-                    for user_id, profile in career_stats.items():
-                        for key, value in default_player_profile.items():
-                            if key not in profile:
-                                profile[key] = value
-                            elif isinstance(value, dict):
-                                for subkey, subvalue in value.items():
-                                    if subkey not in profile[key]:
-                                        profile[key][subkey] = subvalue
-                    logger.info("✅ Loaded career_stats_backup.json")
-                    # Log a sample of the loaded data
-                    if career_stats:
-                        sample_user = next(iter(career_stats))
-                        logger.info(f"Sample data from backup: User {sample_user} - {career_stats[sample_user]}")
-            else:
-                logger.info("ℹ️ No backup found, starting fresh")
-                career_stats = {}
-        except (json.JSONDecodeError, IOError) as e:
-            logger.error(f"❌ Failed to load backup: {e}, starting fresh")
-            career_stats = {}
+    # Profiles are paged in by get_player_profile(); the store has already migrated them to the current schema
+    profile_store.open()
+    career_stats = ProfileCache(
+        profile_store, PROFILE_CACHE_SIZE,
+        is_dirty=lambda user_id: user_id in dirty_profiles, write_back=write_back_evicted
+    )
+    logger.info(f"✅ Opened career stats from {profile_store.name} store (Entries: {profile_store.count()}, cache size: {PROFILE_CACHE_SIZE})")
 
 def load_banned_users():
     global banned_users
@@ -220,14 +236,105 @@ def load_banned_users():
         logger.error(f"⚠️ Error loading banned_users.json: {e}")
         banned_users = {}
 
-def save_banned_users():
+def write_json_atomic(path, data):
+    temp_file = f"{path}.tmp"
+    with open(temp_file, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_file, path)
+
+def write_banned_users(snapshot):
     try:
-        with open("banned_users.json", "w") as f:
-            json.dump(banned_users, f, indent=2)
+        write_json_atomic("banned_users.json", snapshot)
         logger.info(f"💾 Saved banned_users.json")
     except (IOError, OSError) as e:
         logger.error(f"Failed to save banned_users.json: {e}")
 
+def save_banned_users():
+    snapshot = {guild_id: list(user_ids) for guild_id, user_ids in banned_users.items()}
+    return persistence.submit(write_banned_users, snapshot)
+
+def load_user_names():
+    global user_names
+    try:
+        with open(USER_NAMES_FILE, "r") as f:
+            user_names = {int(user_id): tuple(entry) for user_id, entry in json.load(f).items()}
+        logger.info(f"✅ Loaded {USER_NAMES_FILE} (Entries: {len(user_names)})")
+    except FileNotFoundError:
+        logger.info(f"ℹ️ {USER_NAMES_FILE} not found, starting fresh")
+        user_names = {}
+    except (json.JSONDecodeError, IOError, TypeError, ValueError) as e:
+        logger.error(f"⚠️ Error loading {USER_NAMES_FILE}: {e}")
+        user_names = {}
+
+def write_user_names(snapshot):
+    try:
+        write_json_atomic(USER_NAMES_FILE, snapshot)
+    except (IOError, OSError) as e:
+        logger.error(f"Failed to save {USER_NAMES_FILE}: {e}")
+
+def snapshot_user_names():
+    return {str(user_id): list(entry) for user_id, entry in user_names.items()}
+
+def flush_user_names():
+    global user_names_dirty
+    if not user_names_dirty:
+        return None  # Nothing to write, no trip through the worker
+    user_names_dirty = False
+    return persistence.submit(write_user_names, snapshot_user_names())
+
+def remember_user_name(user_id, name):
+    global user_names_dirty
+    cached = user_names.get(user_id)
+    now = time.time()
+    if cached is None or cached[0] != name or now - cached[1] >= USER_NAME_TTL / 2:
+        user_names[user_id] = (name, now)
+        user_names_dirty = True
+
+async def resolve_users(user_ids, guild=None):
+    # user_id -> User/Member for every ID that resolves: the gateway cache first (no request), then one
+    # member query for the rest in this guild, then concurrent fetch_user calls for what's left
+    users = {}
+    missing = []
+    for user_id in user_ids:
+        user = bot.get_user(user_id)
+        if user is not None:
+            users[user_id] = user
+        else:
+            missing.append(user_id)
+    if missing and guild is not None:
+        try:
+            for member in await guild.query_members(user_ids=missing[:100], limit=len(missing[:100])):
+                users[member.id] = member
+        except (asyncio.TimeoutError, discord.ClientException, discord.HTTPException) as e:
+            logger.warning(f"Member query for {len(missing)} users failed: {e}")
+        missing = [user_id for user_id in missing if user_id not in users]
+    if missing:
+        semaphore = asyncio.Semaphore(USER_FETCH_CONCURRENCY)
+
+        async def fetch(user_id):
+            async with semaphore:
+                try:
+                    return user_id, await bot.fetch_user(user_id)
+                except (discord.NotFound, discord.HTTPException):
+                    logger.warning(f"Failed to fetch user {user_id}")
+                    return user_id, None
+
+        for user_id, user in await asyncio.gather(*(fetch(user_id) for user_id in missing)):
+            if user is not None:
+                users[user_id] = user
+    for user_id, user in users.items():
+        remember_user_name(user_id, user.name)
+    return users
+
+async def resolve_user_names(user_ids, guild=None):
+    # Names younger than USER_NAME_TTL come straight from user_names; a stale name is still
+    # better than "Unknown" if the lookup fails
+    now = time.time()
+    stale = [user_id for user_id in user_ids if user_id not in user_names or now - user_names[user_id][1] >= USER_NAME_TTL]
+    if stale:
+        await resolve_users(stale, guild)
+    return {user_id: user_names[user_id][0] if user_id in user_names else f"Unknown ({user_id})" for user_id in user_ids}
+
 async def on_timeout(self):
     await self.message.edit(content="🛞 Pit stop cancelled: No tyre selected in time.", view=None)
 
@@ -255,116 +362,6 @@ def get_zcoin_emoji(ctx):
     except Exception:
         return "Zcoins"
 
-def migrate_to_car_parts():
-    global career_stats
-    if not career_stats:
-        logger.info("No career_stats to migrate, skipping migration.")
-        return
-    for user_id, stats in list(career_stats.items()):  # Use list to avoid runtime dict changes
-        user_id = int(user_id)
-        if "car_parts" not in stats:
-            stats["car_parts"] = {
-                "engine": 5, "aero": 5, "tyres": 5,
-                "chassis": 5, "gearbox": 5, "suspension": 5
-            }
-        if "part_upgrade_counts" not in stats:
-            stats["part_upgrade_counts"] = {
-                "engine": 0, "aero": 0, "tyres": 0,
-                "chassis": 0, "gearbox": 0, "suspension": 0
-            }
-        if "tournament_stats" not in stats:
-            stats["tournament_stats"] = {
-                "points": 0, "wins": 0, "podiums": 0
-            }
-        for key in ["races", "wins", "podiums", "dnfs", "points", "zcoins"]:
-            if key not in stats:
-                stats[key] = 0
-        if "total_time" not in stats:
-            stats["total_time"] = 0.0
-        if "fastest_lap" not in stats:
-            stats["fastest_lap"] = None
-        for key in ["last_daily", "last_weekly", "last_monthly"]:
-            if key not in stats:
-                stats[key] = 0
-    save_career_stats()
-    logger.info("Migration to car parts and tournament stats completed successfully!")
-
-def apply_track_conditions(lobby, player_data, strategy):
-    conditions = lobby["conditions"]
-    pid = None
-    for player_id, data in lobby["player_data"].items():
-        if data == player_data:
-            pid = player_id
-            break
-    if pid is None:
-        logger.error(f"Player data not found in lobby {lobby.get('channel_id', 'unknown')}")
-        raise ValueError("Player not found in lobby")
-    profile = get_player_profile(pid)
-    # Compute stats from car parts
-    stats = {
-        "top_speed": 0,
-        "acceleration": 0,
-        "overtaking": 0,
-        "cornering": 0,
-        "tyre_management": 0,
-        "reliability": 0
-    }
-    # Apply part contributions with exponential scaling
-    scaling_factor = 1.0 
-    stats["top_speed"] += (profile["car_parts"]["engine"] - 5) / 5 * 8 * scaling_factor 
-    stats["acceleration"] += (profile["car_parts"]["engine"] - 5) / 5 * 4 * scaling_factor 
-    stats["acceleration"] += (profile["car_parts"]["gearbox"] - 5) / 5 * 4 * scaling_factor 
-    stats["overtaking"] += (profile["car_parts"]["aero"] - 5) / 5 * 6 * scaling_factor
-    stats["cornering"] += (profile["car_parts"]["aero"] - 5) / 5 * 4 * scaling_factor 
-    stats["cornering"] += (profile["car_parts"]["chassis"] - 5) / 5 * 2 * scaling_factor 
-    stats["cornering"] += (profile["car_parts"]["suspension"] - 5) / 5 * 4 * scaling_factor 
-    stats["tyre_management"] += (profile["car_parts"]["tyres"] - 5) / 5 * 8 * scaling_factor 
-    stats["tyre_management"] += (profile["car_parts"]["suspension"] - 5) / 5 * 4 * scaling_factor 
-    stats["reliability"] += (profile["car_parts"]["chassis"] - 5) / 5 * 6 * scaling_factor 
-    stats["reliability"] += (profile["car_parts"]["gearbox"] - 5) / 5 * 4 * scaling_factor
-    
-    # Speed: Adjusts base lap time
-    speed_multipliers = {"High": 0.97, "Medium": 1.00, "Low": 1.03}
-    speed_multiplier = speed_multipliers.get(conditions["speed"], 1.00)
-    top_speed_mod = 1.0 - (stats["top_speed"] / 100.0) * 0.025 * (1 if conditions["speed"] == "High" else 0.5)
-    accel_mod = 1.0 - (stats["acceleration"] / 100.0) * 0.01 * (1 if conditions["acceleration"] == "High" else 0.5)
-    speed_multiplier *= top_speed_mod * accel_mod
-    
-    # Overtaking: Adjusts driver variance
-    overtaking_ranges = {
-        "Easy": (0.98, 1.02),
-        "Medium": (0.99, 1.01),
-        "Hard": (0.998, 1.002)
-    }
-    base_min, base_max = overtaking_ranges.get(conditions["overtaking"], (0.995, 1.005))
-    overtaking_mod = stats["overtaking"] / 100.0
-    variance_min = base_min - (0.02 * overtaking_mod if conditions["overtaking"] == "Easy" else 0.015 * overtaking_mod if conditions["overtaking"] == "Medium" else 0.01 * overtaking_mod)
-    variance_max = base_max + (0.02 * overtaking_mod if conditions["overtaking"] == "Easy" else 0.015 * overtaking_mod if conditions["overtaking"] == "Medium" else 0.01 * overtaking_mod)
-    
-    # Corners: Adjusts tyre wear
-    corner_tyre_wear = {"Few": 1.0, "Moderate": 1.1, "Many": 1.2}
-    tyre_wear_multiplier = corner_tyre_wear.get(conditions["corners"], 1.0)
-    cornering_mod = 1.0 - (stats["cornering"] / 100.0) * 0.20 * (1 if conditions["corners"] == "Many" else 0.5)
-    tyre_wear_multiplier *= cornering_mod
-    
-    # Tyre Management: Global tyre wear reduction
-    tyre_management_mod = 1.0 - (stats["tyre_management"] / 100.0) * 0.15
-    
-    # Crash risks
-    collision_risks = {
-        "Easy": 0.002 if strategy == "Push" else 0.001,  # Reduced for balance
-        "Medium": 0.004 if strategy == "Push" else 0.002,
-        "Hard": 0.008 if strategy == "Push" else 0.003
-    }
-    reliability_mod = max(0, 1.0 - (stats["reliability"] / 100.0) * 0.75)  # Cap at 0
-    crash_risks = {
-        "Collision": collision_risks.get(conditions["overtaking"], 0.002) * reliability_mod,
-        "Engine Failure": {"Few": 0.0, "Moderate": 0.001, "Many": 0.002}.get(conditions["corners"], 0.001) * reliability_mod,
-        "Gearbox Issue": {"Few": 0.0, "Moderate": 0.001, "Many": 0.002}.get(conditions["corners"], 0.001) * reliability_mod
-    }
-    
-    return speed_multiplier, variance_min, variance_max, tyre_wear_multiplier * tyre_management_mod, crash_risks["Collision"], crash_risks["Engine Failure"], crash_risks["Gearbox Issue"]
-
 @bot.command()
 async def create(ctx):
     channel_id = ctx.channel.id
@@ -373,22 +370,17 @@ async def create(ctx):
         await ctx.send("⚠️ A race lobby already exists in this channel.")
         return
     track_name = random.choice(list(TRACKS_INFO.keys()))
-    initial_weather = random.choice(WEATHER_OPTIONS)
+    initial_weather = random.randrange(len(WEATHER_OPTIONS))
     track_info = TRACKS_INFO[track_name]
     has_weather_change = random.random() < 0.4
-    weather_window = {}
+    weather_window = None
     if has_weather_change:
         total_laps = track_info["laps"]
         start = random.randint(total_laps // 3, total_laps // 2)
         end = random.randint(start + 3, min(total_laps, start + 10))
-        new_weather = random.choice([w for w in WEATHER_OPTIONS if w != initial_weather])
-        weather_window = {"start": start, "end": end, "new_weather": new_weather}
-    lobbies[channel_id] = {
-        "host": user_id, "track": track_name, "conditions": TRACKS_INFO[track_name]["conditions"],
-        "weather": initial_weather, "initial_weather": initial_weather,
-        "weather_window": weather_window, "players": [user_id], "users": {user_id: ctx.author},
-        "status": "waiting", "mode": "solo", "teams": [], "team_names": {}, "initial_settings": {}, "race_mode": "casual"
-    }
+        new_weather = random.choice([w for w in range(len(WEATHER_OPTIONS)) if w != initial_weather])
+        weather_window = WeatherWindow(start, end, new_weather)
+    lobbies[channel_id] = Lobby(user_id, ctx.author, track_name, initial_weather, weather_window)
     
     embed = discord.Embed(
         title="🏎️ New Race Lobby Created!",
@@ -408,13 +400,13 @@ async def create(ctx):
         ),
         inline=False
     )
-    embed.add_field(name="Weather", value=initial_weather, inline=True)
+    embed.add_field(name="Weather", value=WEATHER_OPTIONS[initial_weather], inline=True)
     embed.add_field(name="Mode", value="Solo", inline=True)
     embed.set_footer(text="🏆 Join with !join")
     if weather_window:
         embed.add_field(
             name="Weather Forecast",
-            value=f"Change to **{new_weather}** expected from **Lap {start} to {end}**",
+            value=f"Change to **{WEATHER_OPTIONS[new_weather]}** expected from **Lap {start} to {end}**",
             inline=False
         )
     embed.set_footer(text="Use !join to enter the race")
@@ -428,7 +420,7 @@ async def set(ctx, *, track_name: str):
         await ctx.send("❌ There's no active race lobby in this channel.")
         return
     lobby = lobbies[channel_id]
-    if lobby["host"] != user_id:
+    if lobby.host != user_id:
         await ctx.send("🚫 Only the host can set the track.")
         return
     if track_name not in TRACKS_INFO:
@@ -437,22 +429,22 @@ async def set(ctx, *, track_name: str):
         await ctx.send(f"⚠️ Invalid track name.{suggestion}")
         return
     # Update track and conditions
-    lobby["track"] = track_name
-    lobby["conditions"] = TRACKS_INFO[track_name]["conditions"]
+    lobby.track = track_name
+    lobby.laps = TRACKS_INFO[track_name]["laps"]
     # Reset weather and weather window, similar to !create
-    initial_weather = random.choice(WEATHER_OPTIONS)
+    initial_weather = random.randrange(len(WEATHER_OPTIONS))
     track_info = TRACKS_INFO[track_name]
     has_weather_change = random.random() < 0.4
-    weather_window = {}
+    weather_window = None
     if has_weather_change:
         total_laps = track_info["laps"]
         start = random.randint(total_laps // 3, total_laps // 2)
         end = random.randint(start + 3, min(total_laps, start + 10))
-        new_weather = random.choice([w for w in WEATHER_OPTIONS if w != initial_weather])
-        weather_window = {"start": start, "end": end, "new_weather": new_weather}
-    lobby["weather"] = initial_weather
-    lobby["initial_weather"] = initial_weather
-    lobby["weather_window"] = weather_window
+        new_weather = random.choice([w for w in range(len(WEATHER_OPTIONS)) if w != initial_weather])
+        weather_window = WeatherWindow(start, end, new_weather)
+    lobby.weather = initial_weather
+    lobby.initial_weather = initial_weather
+    lobby.weather_window = weather_window
     # Create embed for response
     embed = discord.Embed(
         title=f"🏁 Track Updated",
@@ -472,11 +464,11 @@ async def set(ctx, *, track_name: str):
         ),
         inline=False
     )
-    embed.add_field(name="Weather", value=initial_weather, inline=True)
+    embed.add_field(name="Weather", value=WEATHER_OPTIONS[initial_weather], inline=True)
     if weather_window:
         embed.add_field(
             name="Weather Forecast",
-            value=f"Change to **{new_weather}** expected from **Lap {start} to {end}**",
+            value=f"Change to **{WEATHER_OPTIONS[new_weather]}** expected from **Lap {start} to {end}**",
             inline=False
         )
     embed.set_footer(text="🏆 Track set for racing!")
@@ -558,19 +550,19 @@ async def join(ctx):
         await ctx.send("❌ No active race lobby in this channel. Use `!create` to start one.")
         return
     lobby = lobbies[channel_id]
-    if lobby["status"] != "waiting":
+    if lobby.status != "waiting":
         await ctx.send("⚠️ This race has already started.")
         return
-    if user_id in lobby["players"]:
+    if user_id in lobby.players:
         await ctx.send("🙃 You're already in this race.")
         return
     MAX_PLAYERS = 20
-    if len(lobby["players"]) >= MAX_PLAYERS:
+    if len(lobby.players) >= MAX_PLAYERS:
         await ctx.send("🚗 This race is full!")
         return
-    lobby["players"].append(user_id)
-    lobby["users"][user_id] = ctx.author
-    await ctx.send(f"✅ {ctx.author.mention} joined the race at **{lobby['track']}**!")
+    lobby.players.append(user_id)
+    lobby.users[user_id] = ctx.author
+    await ctx.send(f"✅ {ctx.author.mention} joined the race at **{lobby.track}**!")
 
 @bot.command()
 async def leave(ctx):
@@ -580,18 +572,18 @@ async def leave(ctx):
         await ctx.send("❌ There's no active race lobby in this channel.")
         return
     lobby = lobbies[channel_id]
-    if user_id not in lobby["players"]:
+    if user_id not in lobby.players:
         await ctx.send("🙃 You're not part of this race.")
         return
-    if lobby["status"] != "waiting":
+    if lobby.status != "waiting":
         await ctx.send("🚫 You can't leave the race after it has started!")
         return
-    lobby["players"].remove(user_id)
-    if user_id == lobby["host"]:
+    lobby.players.remove(user_id)
+    if user_id == lobby.host:
         await ctx.send("⚠️ The host left. Race lobby is closed.")
         del lobbies[channel_id]
         return
-    if not lobby["players"]:
+    if not lobby.players:
         await ctx.send("🏁 All players have left. The race lobby is now closed.")
         del lobbies[channel_id]
         return
@@ -610,7 +602,7 @@ async def start(ctx):
         await ctx.send(embed=embed)
         return
     lobby = lobbies[channel_id]
-    if user_id != lobby["host"]:
+    if user_id != lobby.host:
         embed = discord.Embed(
             title="🚫 Permission Denied",
             description="Only the host can start the race.",
@@ -618,7 +610,7 @@ async def start(ctx):
         )
         await ctx.send(embed=embed)
         return
-    if lobby["status"] != "waiting":
+    if lobby.status != "waiting":
         embed = discord.Embed(
             title="⚠️ Race Already Started",
             description="This race has already begun.",
@@ -626,7 +618,7 @@ async def start(ctx):
         )
         await ctx.send(embed=embed)
         return
-    if len(lobby["players"]) < 2:
+    if len(lobby.players) < 2:
         embed = discord.Embed(
             title="❌ Not Enough Players",
             description="You need at least 2 players to start the race.",
@@ -634,42 +626,37 @@ async def start(ctx):
         )
         await ctx.send(embed=embed)
         return
-    lobby["safety_car_active"] = False
-    lobby["safety_car_laps"] = 0
-    lobby["laps"] = TRACKS_INFO[lobby["track"]]["laps"]
-    lobby["status"] = "in_progress"
-    lobby["current_lap"] = 1
-    lobby["position_order"] = random.sample(lobby["players"], len(lobby["players"]))
-    track = TRACKS_INFO[lobby["track"]]
+    lobby.safety_car_active = False
+    lobby.safety_car_laps = 0
+    lobby.laps = TRACKS_INFO[lobby.track]["laps"]
+    lobby.status = "in_progress"
+    lobby.current_lap = 1
+    lobby.position_order = random.sample(lobby.players, len(lobby.players))
+    track = TRACKS_INFO[lobby.track]
     total_laps = track["laps"]
-    lobby["player_data"] = {}
-    for pid in lobby["players"]:
+    # Car parts are locked in for the race: the lap loop only reads these, never the profiles
+    await load_player_profiles(lobby.players)
+    lobby.car_parts = {pid: dict(get_player_profile(pid)["car_parts"]) for pid in lobby.players}
+    lobby.physics = current_physics()  # A !reloadphysics mid-race only affects the next race
+    lobby.modifiers = {pid: car_modifiers(track["conditions"], lobby.car_parts[pid], lobby.physics) for pid in lobby.players}
+    lobby.seed = random.getrandbits(64)  # The race's own RNG, so it can be replayed
+    lobby.player_data = {}
+    # !create and !join already stored each player's ctx.author; only gaps are looked up
+    lobby.users.update(await resolve_users([pid for pid in lobby.players if pid not in lobby.users], ctx.guild))
+    for pid in lobby.players:
+        setting = lobby.initial_settings.get(pid)
+        lobby.player_data[pid] = RaceDriver(setting.strategy, setting.tyre) if setting else RaceDriver()
         try:
-            user = await bot.fetch_user(pid)
-            logger.info(f"✅ Successfully fetched user {pid}: {user.name}")
-            lobby["users"][pid] = user
-            initial_tyre = "Medium"
-            initial_strategy = "Balanced"
-            if "initial_settings" in lobby and pid in lobby["initial_settings"]:
-                initial_tyre = lobby["initial_settings"][pid]["tyre"]
-                initial_strategy = lobby["initial_settings"][pid]["strategy"]
-            lobby["player_data"][pid] = {
-                "strategy": initial_strategy,
-                "tyre": initial_tyre,
-                "last_pit_lap": 0,
-                "total_time": 0.0,
-                "tyre_condition": 100.0,
-                "dnf": False,
-                "dnf_reason": None,
-                "lap_times": [],
-                "last_sent_lap": 0,
-                "last_sent_fuel": 100.0,
-                "last_sent_tyre": 100.0,
-                "last_position": "?"
-            }
+            user = lobby.users.get(pid)
+            if user is None:
+                logger.warning(f"No user for {pid}, skipping their strategy panel")
+                continue
+            remember_user_name(pid, user.name)
+            if lobby.pace == "instant":
+                continue  # Resolved up front, nothing to steer
             view = StrategyPanelView(pid, channel_id)
-            position = lobby["position_order"].index(pid) + 1
-            total = len(lobby["players"])
+            position = lobby.position_order.index(pid) + 1
+            total = len(lobby.players)
             embed = discord.Embed(
                 title="📊 Strategy Panel",
                 description=(
@@ -685,15 +672,15 @@ async def start(ctx):
             )
             embed.set_footer(text="Use this panel during the race to update your strategy.")
             try:
-                dm_msg = await user.send(embed=embed, view=view)
-                lobby["player_data"][pid]["dm_msg"] = dm_msg
+                dm_msg = await outbound.send(("dm", pid), PANEL, lambda: user.send(embed=embed, view=view))
+                lobby.player_data[pid].dm_msg = dm_msg
             except discord.Forbidden:
                 embed = discord.Embed(
                     title="⚠️ DMs Disabled",
                     description=f"{user.mention} has DMs disabled and won’t receive the strategy panel.",
                     color=discord.Color.red()
                 )
-                await ctx.send(embed=embed)
+                await safe_send(ctx, embed=embed)
         except Exception as e:
             logger.error(f"Error creating strategy panel for user {pid}: {e}")
     lights_gif_embed = discord.Embed(
@@ -702,329 +689,258 @@ async def start(ctx):
         color=discord.Color.red()
     )
     lights_gif_embed.set_image(url="https://media.tenor.com/RtrDuGASCoMAAAAM/f1.gif")
-    await ctx.send(embed=lights_gif_embed)
+    await safe_send(ctx, embed=lights_gif_embed)
     await asyncio.sleep(7)
     embed = generate_race_status_embed(lobby)
-    msg = await ctx.send(embed=embed)
-    lobby["status_msg_id"] = msg.id
+    msg = await outbound.send(channel_route(ctx), ALERT, lambda: ctx.send(embed=embed))
+    lobby.status_msg_id = msg.id
     bot.loop.create_task(race_loop(ctx, channel_id, msg, total_laps))
 
+def save_replay(engine, lobby):
+    path = replay_path(REPLAY_DIR, lobby.seed)
+    return persistence.submit(write_replay, path, encode_replay(engine, lobby.seed, lobby.car_parts))
+
+async def update_dm_panels(lobby, current_lap, total_laps, budget):
+    # Every driver's panel is updated concurrently, at most DM_FANOUT_CONCURRENCY at a time. The whole
+    # fan-out gets budget seconds (what's left of the lap, capped at DM_UPDATE_TIMEOUT) from the start,
+    # time spent waiting for a slot included, and updates still running then are cancelled, so one
+    # slow or failing DM can't hold up the lap
+    semaphore = asyncio.Semaphore(DM_FANOUT_CONCURRENCY)
+    started = time.perf_counter()
+
+    async def update(pid):
+        try:
+            async with semaphore:
+                return await update_dm_panel(lobby, pid, current_lap, total_laps)
+        except Exception as e:
+            logger.error(f"DM update for pid {pid} failed on lap {current_lap}: {e}")
+            return "failed"
+
+    tasks = {asyncio.create_task(update(pid)): pid for pid in lobby.players}
+    if not tasks:
+        return
+    done, pending = await asyncio.wait(tasks, timeout=min(DM_UPDATE_TIMEOUT, budget))
+    for task in pending:
+        task.cancel()
+        logger.warning(f"DM update for pid {tasks[task]} timed out on lap {current_lap}")
+    results = [task.result() for task in done] + ["timeout"] * len(pending)
+    logger.info(
+        f"📨 DM fan-out for lap {current_lap}: {results.count('sent')}/{len(results)} panels sent in {(time.perf_counter() - started) * 1000:.0f}ms "
+        f"({results.count('unchanged')} unchanged, {results.count('dropped')} dropped, {results.count('timeout')} timed out, {results.count('failed')} failed)"
+    )
+
+async def update_dm_panel(lobby, pid, current_lap, total_laps):
+    # Returns "sent", "unchanged" (the panel would render exactly what it already shows), "dropped"
+    # (shed by the outbound scheduler) or "failed"
+    user = lobby.users.get(pid)
+    pdata = lobby.player_data.get(pid)
+    if not user or not pdata:
+        logger.warning(f"Skipping DM update for pid {pid}: user or data missing")
+        return "failed"
+    if pdata.dnf:
+        position = "DNF"
+    else:
+        try:
+            position = lobby.position_order.index(pid) + 1
+        except ValueError:
+            position = "?"
+    total = len(lobby.players)
+    tyre_cond = round(pdata.tyre_condition, 1)
+    weather_emoji = WEATHER_OPTIONS[lobby.weather]
+    safety_car_status = "🚨 Active" if lobby.safety_car_active else "Inactive"
+    # The description is the only part of the panel that changes, so it is the panel's payload
+    panel = (
+        f"📍 You are currently **P{position}** out of **{total}**.\n"
+        f"🏁 Lap **{current_lap}/{total_laps}**\n"
+        f"Weather: **{weather_emoji}**\n"
+        f"🚨 Safety Car: **{safety_car_status}**\n"
+        f"🛞 Tyre Condition: **{tyre_cond}%**"
+    )
+    if panel == pdata.last_panel:
+        return "unchanged"
+    embed = discord.Embed(
+        title="📊 Strategy Panel (Live)",
+        description=panel,
+        color=discord.Color.orange()
+    )
+    embed.add_field(
+        name="Strategies",
+        value="⚡ Push\n⚖️ Balanced\n🛟 Save\n🛞 Pit Stop",
+        inline=False
+    )
+    embed.set_footer(text="Use this panel during the race to update your strategy.")
+    dm_msg = pdata.dm_msg
+    route, merge_key = ("dm", pid), ("panel", pid)
+    if dm_msg:
+        try:
+            if await outbound.send(route, PANEL, lambda: dm_msg.edit(embed=embed), merge_key, DM_UPDATE_TIMEOUT) is DROPPED:
+                return "dropped"  # Shed under load, next lap's refresh supersedes it
+            logger.debug(f"📨 Updated DM for {user.name} on lap {current_lap}")
+        except (discord.HTTPException, discord.Forbidden, discord.NotFound) as e:
+            logger.warning(f"Failed to update DM for pid {pid}: {e}, recreating DM")
+            try:
+                new_dm = await outbound.send(route, PANEL, lambda: user.send(embed=embed), merge_key, DM_UPDATE_TIMEOUT)
+                if new_dm is DROPPED:
+                    return "dropped"
+                pdata.dm_msg = new_dm
+            except (discord.Forbidden, discord.HTTPException) as e:
+                logger.error(f"Failed to recreate DM for pid {pid}: {e}")
+                pdata.dm_msg = None
+                return "failed"
+    else:
+        try:
+            new_dm = await outbound.send(route, PANEL, lambda: user.send(embed=embed), merge_key, DM_UPDATE_TIMEOUT)
+            if new_dm is DROPPED:
+                return "dropped"
+            pdata.dm_msg = new_dm
+        except (discord.Forbidden, discord.HTTPException) as e:
+            logger.error(f"Failed to send initial DM for pid {pid}: {e}")
+            pdata.dm_msg = None
+            return "failed"
+    pdata.last_panel = panel
+    return "sent"
+
+class StatusMessage:
+    # The live race status message. Edits go through the Message handle from !start instead of
+    # fetching it by ID every lap, and are coalesced: while one edit is in flight, newer frames
+    # replace each other and only the latest is sent once it completes. Frames are
+    # race_status_payload() tuples, and one equal to what the message already shows is skipped.
+    def __init__(self, ctx, lobby, message):
+        self.ctx = ctx
+        self.lobby = lobby
+        self.message = message
+        self.pending = None
+        self.shown = None  # Payload of the last successful edit
+        self.skipped = 0
+        self.task = None
+        self.error = None
+
+    def update(self, payload):
+        if self.error is not None:
+            raise self.error  # An edit failed for good: let race_loop handle it like before
+        if payload == (self.shown if self.pending is None else self.pending):
+            self.skipped += 1
+            return
+        self.pending = payload
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        while self.pending is not None:
+            payload, self.pending = self.pending, None
+            if payload == self.shown:
+                self.skipped += 1
+                continue
+            try:
+                await self.edit(status_payload_embed(payload))
+                self.shown = payload
+            except Exception as e:
+                self.error = e
+                self.pending = None
+
+    async def edit(self, embed):
+        route = channel_route(self.ctx)
+        try:
+            if self.message is None:
+                self.message = await self.ctx.channel.fetch_message(self.lobby.status_msg_id)
+            await outbound.send(route, STATUS, lambda: self.message.edit(embed=embed), ("status", route))
+        except discord.NotFound:
+            logger.warning("Race status message not found, recreating...")
+            self.message = await outbound.send(route, STATUS, lambda: self.ctx.send(embed=embed))
+            self.lobby.status_msg_id = self.message.id
+        except discord.HTTPException as e:
+            logger.error(f"HTTP error updating status message: {e}")
+            if e.status != 429:
+                raise
+
+    async def drain(self):
+        if self.task is not None:
+            await self.task
+        if self.error is not None:
+            raise self.error
+
 async def race_loop(ctx, channel_id, status_msg, total_laps):
+    race_started = time.time()
+    engine = None
     try:
-        lap_delay = 4.0
-        while channel_id in lobbies:
+        lap_delay = LAP_DELAY
+        lobby = lobbies[channel_id]
+        # The engine shares lobby.player_data, so the DM strategy panel feeds it directly
+        engine = create_engine(
+            lobby.track, lobby.players,
+            lobby.modifiers,
+            lobby.weather, lobby.weather_window,
+            drivers=lobby.player_data, position_order=lobby.position_order,
+            rng=random.Random(lobby.seed), physics=lobby.physics
+        )
+        engine.start_recording()
+        status = StatusMessage(ctx, lobby, status_msg)
+        if lobby.pace == "instant":
+            await play_highlights(ctx, channel_id, engine, status)
+        while channel_id in lobbies and not engine.finished:
             lap_start_time = time.time()
-            if channel_id not in lobbies:
-                logger.warning(f"Lobby {channel_id} removed during race_loop")
-                return
             lobby = lobbies.get(channel_id)
             if not lobby:
                 logger.error(f"Lobby {channel_id} missing during race_loop")
                 return
-            current_lap = lobby.get("current_lap", 1)
-            collision_occurred = False  # Track if any collision happens this lap
-            window = lobby.get("weather_window", {})
-            start = window.get("start")
-            end = window.get("end")
-            new_weather = window.get("new_weather")
-            initial_weather = lobby.get("initial_weather", lobby["weather"])
-            weather_updates = []
-            if start is not None and end is not None and current_lap == start and lobby["weather"] != new_weather:
-                lobby["weather"] = new_weather
-                weather_updates.append(f"Weather has changed to {new_weather} on Lap {current_lap}!")
-            elif end is not None and current_lap == end + 1 and lobby["weather"] != initial_weather:
-                lobby["weather"] = initial_weather
-                weather_updates.append(f"Weather has reverted to {initial_weather} on Lap {current_lap}!")
-            if weather_updates:
-                await safe_send(ctx, "\n".join(weather_updates))
-            if current_lap > total_laps:
-                break
-            track = lobby.get("track")
-            if track in TRACKS_INFO:
-                base_lap_time = TRACKS_INFO[track]["base_lap_time"]
-            else:
-                logger.error(f"Invalid track {track} in lobby {channel_id}")
-                base_lap_time = 100.0
-            weather = lobby["weather"]
-            player_times = {}
-            for pid in lobby["players"]:
-                pdata = lobby["player_data"].get(pid)
-                if not pdata or pdata.get("dnf", False):
-                    logger.debug(f"⏖ Skipping DNF player {pid}")
-                    continue
-                if pid not in lobby["users"]:
-                    try:
-                        user = await bot.fetch_user(pid)
-                        lobby["users"][pid] = user
-                    except (discord.NotFound, discord.HTTPException):
-                        logger.warning(f"Failed to fetch user {pid}")
-                        continue
-                strategy = pdata.get("strategy", "Balanced")
-                tyre = pdata.get("tyre", "Medium")
-                just_pitted = False
-                pit_penalty = 0
-                last_pit_lap = pdata.get("last_pit_lap", -2)
-                if strategy == "Pit Stop" and last_pit_lap != current_lap:
-                    pit_penalty = 20.0
-                    pdata["last_pit_lap"] = current_lap
-                    just_pitted = True
-                    logger.info(f"🛞 PIT STOP TRIGGERED for {pid} (User: {lobby['users'].get(pid, {'name': 'Unknown'}).name}) on lap {current_lap}, Penalty: {pit_penalty}s")
-                    logger.debug(f"Before pit reset: Tyre condition={pdata.get('tyre_condition')}")
-                    pdata["tyre_condition"] = 100.0
-                    logger.debug(f"After pit reset: Tyre condition={pdata['tyre_condition']}, Strategy reset to Balanced")
-                    
-                # Replace the degradation block starting with `if not just_pitted and not lobby.get("safety_car_active", False):`
-                if not lobby.get("safety_car_active", False):
-                    base_wear = {"Push": 8.0, "Balanced": 5.0, "Save": 3.0}.get(strategy, 5.0)
-                    speed_multiplier, variance_min, variance_max, tyre_wear_multiplier, collision_risk, engine_risk, gearbox_risk = apply_track_conditions(lobby, pdata, strategy)
-                    base_lap_time *= speed_multiplier
-                    tyre_type_wear = {
-                        "Soft": 1.2,
-                        "Medium": 1.0,
-                        "Hard": 0.8,
-                        "Intermediate": 1.1,
-                        "Wet": 0.9
-                    }.get(tyre, 1.0)
-                    tyre_wear = base_wear * tyre_type_wear * tyre_wear_multiplier
-                    if just_pitted or pdata["last_pit_lap"] == current_lap:
-                        tyre_wear = 0.0  # Skip degradation on pit lap
-                        pdata["tyre_condition"] = 100.0  # Ensure tyre condition is reset
-                        logger.debug(f"🛞 Skipping tyre degradation for {pid} on lap {current_lap} due to pit stop") 
-                    if weather == "🌦️ Light Rain":
-                        if tyre == "Intermediate":
-                            tyre_wear *= 0.85
-                        elif tyre == "Wet":
-                            tyre_wear *= 1.15
-                    elif weather == "🌧️ Heavy Rain":
-                        if tyre == "Intermediate":
-                            tyre_wear *= 1.10
-                        elif tyre == "Wet":
-                            tyre_wear *= 0.75
-                    else:
-                        if tyre == "Wet":
-                            tyre_wear *= 1.6
-                        elif tyre == "Intermediate":
-                            tyre_wear *= 1.3
-                    logger.debug(f"🔧 Degradation - Tyre Wear: {tyre_wear}, Weather: {weather}, Track Conditions: Speed={speed_multiplier}, Corners={tyre_wear_multiplier}, Crash Risks: Collision={collision_risk}, Engine={engine_risk}, Gearbox={gearbox_risk}")
-                    prev_tyre = pdata.get("tyre_condition", 100.0)
-                    pdata["tyre_condition"] = max(prev_tyre - tyre_wear, 0.0)
-            # Check for crashes
-                    crash_types = [
-                        ("Collision", collision_risk),
-                        ("Engine Failure", engine_risk),
-                        ("Gearbox Issue", gearbox_risk)
-                    ]
-                    for crash_type, risk in crash_types:
-                        if risk > 0 and random.random() < risk and not pdata.get("dnf", False):
-                            pdata["dnf"] = True
-                            pdata["dnf_reason"] = crash_type
-                            logger.info(f"💀 DNF: {pid} DNFed on lap {current_lap}: {crash_type}")
-                            embed = discord.Embed(
-                                title="🏎️ Crash Alert!",
-                                description=f"✦ `{lobby['users'][pid].name}` DNFed: {crash_type}! ✦",
-                                color=discord.Color.red()
-                            )
-                            embed.set_footer(text="🏆 Check your DM strategy panel!")
-                            await safe_send(ctx, embed=embed)
-                            if crash_type == "Collision":
-                                collision_occurred = True
-                            if pid in lobby["users"]:
-                                try:
-                                    dm_embed = discord.Embed(
-                                        title="🏎️ Your Race Ended!",
-                                        description=f"✦ Your car suffered a {crash_type.lower()} on Lap {current_lap}. ✦",
-                                        color=discord.Color.red()
-                                    )
-                                    await lobby["users"][pid].send(embed=dm_embed)
-                                except (discord.Forbidden, discord.HTTPException):
-                                    logger.warning(f"Failed to send crash DM to {pid}")
-                logger.debug(f"Checking safety car: collision_occurred={collision_occurred}, lap={current_lap}")
-                await handle_safety_car(ctx, lobby, current_lap, collision_occurred)
-                if pdata.get("tyre_condition", 0.0) <= 0:
-                    pdata["dnf"] = True
-                    pdata["dnf_reason"] = "Tyres worn out"
-                    logger.info(f"💀 DNF: {pid} DNFed on lap {current_lap}: {pdata['dnf_reason']}")
-                    embed = discord.Embed(
-                        title="🏎️ DNF Alert!",
-                        description=f"✦ `{lobby['users'][pid].name}` DNFed: {pdata['dnf_reason']} on Lap {current_lap}! ✦",
-                        color=discord.Color.red()
-                    )
-                    await safe_send(ctx, embed=embed)
-                strat_factor = {
-                    "Push": 0.975,
-                    "Balanced": 1.0,
-                    "Save": 1.025,
-                    "Pit Stop": 1.15
-                }.get(strategy, 1.0)
-                weather_penalty = {
-                    ("☀️ Sunny", "Soft"): 1.0,
-                    ("☀️ Sunny", "Medium"): 1.015,
-                    ("☀️ Sunny", "Hard"): 1.03,
-                    ("☀️ Sunny", "Wet"): 1.3,
-                    ("☀️ Sunny", "Intermediate"): 1.2,
-                    ("🌦️ Light Rain", "Soft"): 1.25,
-                    ("🌦️ Light Rain", "Medium"): 1.15,
-                    ("🌦️ Light Rain", "Hard"): 1.2,
-                    ("🌦️ Light Rain", "Intermediate"): 1.0,
-                    ("🌦️ Light Rain", "Wet"): 1.05,
-                    ("🌧️ Heavy Rain", "Soft"): 1.4,
-                    ("🌧️ Heavy Rain", "Medium"): 1.3,
-                    ("🌧️ Heavy Rain", "Hard"): 1.35,
-                    ("🌧️ Heavy Rain", "Intermediate"): 1.1,
-                    ("🌧️ Heavy Rain", "Wet"): 1.0,
-                    ("☁️ Cloudy", "Soft"): 1.0,
-                    ("☁️ Cloudy", "Medium"): 1.0,
-                    ("☁️ Cloudy", "Hard"): 1.05,
-                    ("☁️ Cloudy", "Wet"): 1.3,
-                    ("☁️ Cloudy", "Intermediate"): 1.2,
-                    ("🌬️ Windy", "Soft"): 1.1,
-                    ("🌬️ Windy", "Medium"): 1.05,
-                    ("🌬️ Windy", "Hard"): 1.0,
-                    ("🌬️ Windy", "Wet"): 1.3,
-                    ("🌬️ Windy", "Intermediate"): 1.2
-                }.get((weather, tyre), 1.0)
-                tyre_wear_penalty = 1.0 + ((100.0 - pdata["tyre_condition"]) / 100.0) * 0.1
-                if not lobby.get("safety_car_active", False):
-                    trend = lobby["player_data"][pid].get("variance_trend", 1.0)
-                    driver_variance = random.uniform(variance_min, variance_max) * (0.7 + 0.3 * trend) 
-                    lobby["player_data"][pid]["variance_trend"] = max(0.9, min(1.1, trend + random.uniform(-0.05, 0.05)))
-                else:
-                    driver_variance = 1.0
-                lap_time = (base_lap_time * strat_factor * weather_penalty * tyre_wear_penalty + pit_penalty) * driver_variance
-                if just_pitted:
-                    pdata["strategy"] = "Balanced"
-                if lobby.get("safety_car_active", False):
-                    lap_time *= 1.2  # 20% slower under safety car
-                pdata["lap_times"].append(lap_time)
-                total_time = sum(pdata["lap_times"])
-                pdata["total_time"] = total_time
-                player_times[pid] = total_time
-                # Note: This is a partial snippet for the debug log line (~512) in race_loop.
-                # Replace only the debug log line within the `for pid in lobby["players"]:` loop.
-                logger.debug(f"🏎 {pid} (User: {lobby['users'].get(pid, {'name': 'Unknown'}).name}) - Pos: {lobby['position_order'].index(pid)+1 if pid in lobby['position_order'] else 'N/A'}, Strat: {strategy}, Lap: {lap_time:.2f}s, Pit penalty: {pit_penalty}s, Total: {total_time:.2f}s, Tyre: {pdata['tyre_condition']:.1f}%")
-            valid_players = [pid for pid in lobby["players"] if not lobby["player_data"].get(pid, {}).get("dnf", False)]
-            lobby["position_order"] = sorted(valid_players, key=lambda pid: lobby["player_data"].get(pid, {}).get("total_time", float('inf')))
+            missing = [pid for pid in lobby.players if pid not in lobby.users]
+            if missing:
+                lobby.users.update(await resolve_users(missing, ctx.guild))
+            current_lap = engine.current_lap
+            events = engine.step()
+            lobby.weather = engine.weather
+            lobby.safety_car_active = engine.safety_car_active
+            lobby.safety_car_laps = engine.safety_car_laps
+            lobby.position_order = engine.position_order
+            lobby.gaps = engine.gaps
+            await render_race_events(ctx, lobby, events)
             # Log position order after update
             position_info = []
-            for pid in lobby['position_order']:
-                player_data = lobby['player_data'][pid]
-                user = lobby['users'].get(pid, {'name': f'Unknown ({pid})'})
-                position_info.append(f"{user.name} ({player_data['total_time']:.2f}s)")
+            for pid in lobby.position_order:
+                player_data = lobby.player_data[pid]
+                user = lobby.users.get(pid, {'name': f'Unknown ({pid})'})
+                position_info.append(f"{user.name} ({player_data.total_time:.2f}s)")
             logger.info(f"Position order after lap {current_lap}: {position_info}")
-            embed = generate_race_status_embed(lobby)
-            try:
-                msg = await ctx.channel.fetch_message(lobby["status_msg_id"])
-                await msg.edit(embed=embed)
-            except discord.NotFound:
-                logger.warning("Race status message not found, recreating...")
-                new_msg = await ctx.send(embed=embed)
-                lobby["status_msg_id"] = new_msg.id
-            except discord.HTTPException as e:
-                logger.error(f"HTTP error updating status message: {e}")
-                if e.status != 429:
-                    raise
-            lobby["current_lap"] += 1
-            for pid in lobby["players"]:
-                user = lobby["users"].get(pid)
-                pdata = lobby["player_data"].get(pid)
-                if not user or not pdata:
-                    logger.warning(f"Skipping DM update for pid {pid}: user or data missing")
-                    continue
-                if pdata.get("dnf", False):
-                    position = "DNF"
-                else:
-                    try:
-                        position = lobby["position_order"].index(pid) + 1
-                    except ValueError:
-                        position = "?"
-                total = len(lobby["players"])
-                tyre_cond = round(pdata.get("tyre_condition", 0.0), 1)
-                weather_emoji = lobby["weather"]
-                safety_car_status = "🚨 Active" if lobby.get("safety_car_active", False) else "Inactive"
-                last_sent_lap = pdata.get("last_sent_lap", 0)
-                if (current_lap != last_sent_lap or
-                    abs(pdata["tyre_condition"] - pdata.get("last_sent_tyre", 100.0)) > 5 or
-                    position != pdata.get("last_position", "?")):
-                    embed = discord.Embed(
-                        title="📊 Strategy Panel (Live)",
-                        description=(
-                            f"📍 You are currently **P{position}** out of **{total}**.\n"
-                            f"🏁 Lap **{current_lap}/{total_laps}**\n"
-                            f"Weather: **{weather_emoji}**\n"
-                            f"🚨 Safety Car: **{safety_car_status}**\n"
-                            f"🛞 Tyre Condition: **{tyre_cond}%**"
-                        ),
-                        color=discord.Color.orange()
-                    )
-                    embed.add_field(
-                        name="Strategies",
-                        value="⚡ Push\n⚖️ Balanced\n🛟 Save\n🛞 Pit Stop",
-                        inline=False
-                    )
-                    embed.set_footer(text="Use this panel during the race to update your strategy.")
-                    dm_msg = pdata.get("dm_msg")
-                    if dm_msg:
-                        try:
-                            await dm_msg.edit(embed=embed)
-                            pdata["last_sent_tyre"] = pdata["tyre_condition"]
-                            pdata["last_position"] = position
-                            pdata["last_sent_lap"] = current_lap
-                            logger.debug(f"📨 Updated DM for {user.name} on lap {current_lap}")
-                        except (discord.HTTPException, discord.Forbidden, discord.NotFound) as e:
-                            logger.warning(f"Failed to update DM for pid {pid}: {e}, recreating DM")
-                            try:
-                                new_dm = await user.send(embed=embed)
-                                pdata["dm_msg"] = new_dm
-                                pdata["last_sent_tyre"] = pdata["tyre_condition"]
-                                pdata["last_position"] = position
-                                pdata["last_sent_lap"] = current_lap
-                            except (discord.Forbidden, discord.HTTPException) as e:
-                                logger.error(f"Failed to recreate DM for pid {pid}: {e}")
-                                pdata["dm_msg"] = None
-                    else:
-                        try:
-                            new_dm = await user.send(embed=embed)
-                            pdata["dm_msg"] = new_dm
-                            pdata["last_sent_tyre"] = pdata["tyre_condition"]
-                            pdata["last_position"] = position
-                            pdata["last_sent_lap"] = current_lap
-                        except (discord.Forbidden, discord.HTTPException) as e:
-                            logger.error(f"Failed to send initial DM for pid {pid}: {e}")
-                            pdata["dm_msg"] = None
+            status.update(race_status_payload(lobby))
+            lobby.current_lap = engine.current_lap
+            await update_dm_panels(lobby, current_lap, total_laps, max(0, lap_delay - (time.time() - lap_start_time)))
             elapsed = time.time() - lap_start_time
             await asyncio.sleep(max(0, lap_delay - elapsed))
-            logger.debug(f"🏁 Finished lap {lobby['current_lap'] - 1}: Actual time = {elapsed:.2f}s")
+            logger.debug(f"🏁 Finished lap {lobby.current_lap - 1}: Actual time = {elapsed:.2f}s")
+        await status.drain()
+        logger.info(f"🖼️ Race status in {channel_id}: {status.skipped} unchanged frames skipped")
         if channel_id not in lobbies:
             return
+        save_replay(engine, lobby)
+        await load_player_profiles(lobby.players)
                 # Final results
-        final_order = lobby["position_order"]
+        final_order = lobby.position_order
         embed = discord.Embed(
-            title=f"🏆 {lobby['track']} Grand Prix — Results",
-            description=f"Weather: {lobby['weather']}",
+            title=f"🏆 {lobby.track} Grand Prix — Results",
+            description=f"Weather: {WEATHER_OPTIONS[lobby.weather]}",
             color=discord.Color.green()
         )
         podium_emojis = {1: "🥇", 2: "🥈", 3: "🥉", 4: "4️⃣", 5: "5️⃣", 6: "6️⃣", 7: "7️⃣", 8: "8️⃣", 9: "9️⃣", 10: "🔟"}
-        leader_time = lobby["player_data"][final_order[0]]["total_time"] if final_order else None
-        update_leaderboard = lobby["race_mode"] == "championship"
-        zcoin_rewards = {1: 30, 2: 20, 3: 10}  # Zcoin rewards for top 3
+        gaps = lobby.gaps
+        update_leaderboard = lobby.race_mode == "championship"
         zcoin_message = []
-        if len(lobby["players"]) >= 6:  # Only award zcoins if 6 or more players
-            for pos, pid in enumerate(final_order[:3], 1):  # Top 3 only
-                if pid in lobby["users"]:
+        if len(lobby.players) >= RACE_ZCOIN_MIN_PLAYERS:
+            for pos, pid in enumerate(final_order[:len(RACE_ZCOIN_REWARDS)], 1):
+                if pid in lobby.users:
                     profile = get_player_profile(pid)
-                    zcoins_earned = zcoin_rewards.get(pos, 0)
+                    zcoins_earned = RACE_ZCOIN_REWARDS.get(pos, 0)
                     profile["zcoins"] = profile.get("zcoins", 0) + zcoins_earned
-                    zcoin_message.append(f"{lobby['users'][pid].name} (P{pos}) earned {zcoins_earned} {get_zcoin_emoji(ctx)}!")
+                    mark_profile_dirty(pid)
+                    zcoin_message.append(f"{lobby.users[pid].name} (P{pos}) earned {zcoins_earned} {get_zcoin_emoji(ctx)}!")
         for pos, pid in enumerate(final_order, 1):
-            user = lobby["users"].get(pid)
+            user = lobby.users.get(pid)
             if not user:
                 continue
-            total_time = lobby["player_data"][pid]["total_time"]
-            if pos == 1 or leader_time is None:
+            total_time = lobby.player_data[pid].total_time
+            if pos == 1 or pid not in gaps:
                 time_display = format_race_time(total_time)
             else:
-                gap = total_time - leader_time
-                time_display = f"+{gap:.3f}s"
+                time_display = f"+{gaps[pid][0]:.3f}s"
             points = F1_POINTS.get(pos, 0)
             pos_display = podium_emojis.get(pos, f"{pos}.")
             embed.add_field(
@@ -1034,15 +950,16 @@ async def race_loop(ctx, channel_id, status_msg, total_laps):
             )
             profile = get_player_profile(pid)
             profile["points"] += points
+            mark_profile_dirty(pid)
             if update_leaderboard:
                 profile["tournament_stats"]["points"] += points
                 if pos == 1:
                     profile["tournament_stats"]["wins"] += 1
                 if pos <= 3:
                     profile["tournament_stats"]["podiums"] += 1
-        dnf_players = [pid for pid, pdata in lobby["player_data"].items() if pdata.get("dnf", False)]
+        dnf_players = [pid for pid, pdata in lobby.player_data.items() if pdata.dnf]
         if dnf_players:
-            dnf_names = [f"{lobby['users'].get(pid, {'name': f'Unknown ({pid})'}).name} — {lobby['player_data'][pid]['dnf_reason']}" for pid in dnf_players if pid in lobby["users"]]
+            dnf_names = [f"{lobby.users.get(pid, {'name': f'Unknown ({pid})'}).name} — {lobby.player_data[pid].dnf_reason}" for pid in dnf_players if pid in lobby.users]
             embed.add_field(
                 name="❌ DNFs",
                 value="\n".join(dnf_names) if dnf_names else "No DNFs recorded.",
@@ -1054,10 +971,10 @@ async def race_loop(ctx, channel_id, status_msg, total_laps):
                 value="\n".join(zcoin_message),
                 inline=False
             )
-        if lobby["mode"] == "duo":
+        if lobby.mode == "duo":
             team_points = {}
-            for team_idx, team in enumerate(lobby["teams"]):
-                team_name = lobby["team_names"].get(team_idx, f"Team {team_idx + 1}")
+            for team_idx, team in enumerate(lobby.teams):
+                team_name = lobby.team_names.get(team_idx, f"Team {team_idx + 1}")
                 team_points[team_name] = sum(F1_POINTS.get(final_order.index(pid) + 1, 0) for pid in team if pid in final_order)
             team_scores = [f"{name} — {points} pts" for name, points in sorted(team_points.items(), key=lambda x: x[1], reverse=True)]
             embed.add_field(
@@ -1065,29 +982,34 @@ async def race_loop(ctx, channel_id, status_msg, total_laps):
                 value="\n".join(team_scores) if team_scores else "No team scores.",
                 inline=False
             )
-        for pid in lobby["players"]:
-            pdata = lobby["player_data"].get(pid, {})
+        for pid in lobby.players:
+            pdata = lobby.player_data[pid]
             profile = get_player_profile(pid)
             profile["races"] += 1
-            if not pdata.get("dnf", False):
-                profile["total_time"] += pdata.get("total_time", 0.0)
+            mark_profile_dirty(pid)
+            if not pdata.dnf:
+                profile["total_time"] += pdata.total_time
                 pos = final_order.index(pid) + 1 if pid in final_order else None
                 if pos == 1:
                     profile["wins"] += 1
                 if pos and pos <= 3:
                     profile["podiums"] += 1
-            if pdata.get("lap_times", []):
-                fastest_lap_in_race = min(pdata["lap_times"])
+            if pdata.lap_times:
+                fastest_lap_in_race = min(pdata.lap_times)
                 if not profile["fastest_lap"] or fastest_lap_in_race < profile["fastest_lap"]:
                     profile["fastest_lap"] = fastest_lap_in_race
                     logger.info(f"🏅 New fastest lap for {pid}: {fastest_lap_in_race:.2f}s")
-            if pdata.get("dnf", False):
+            if pdata.dnf:
                 profile["dnfs"] += 1
-        save_career_stats()
-        await safe_send(ctx, embed=embed)
+        await flush_career_stats(sync=True)
+        await safe_send(ctx, embed=embed, priority=RESULTS)
         if channel_id in lobbies:
             lobby = lobbies[channel_id]
-            log_race(lobby["mode"], channel_id)
+            log_race(lobby.mode, channel_id)
+            race_number = await persistence.submit(
+                race_events.append, time.time(), lobby.mode, ctx.guild.id if ctx.guild else 0,
+                channel_id, lobby.track, len(lobby.players), time.time() - race_started
+            )
             
             # Log race details to the specified channel if configured
             race_log_channel_id = 1381832404490256444  # Replace with your channel ID
@@ -1097,87 +1019,122 @@ async def race_loop(ctx, channel_id, status_msg, total_laps):
                     if channel:
                         embed = discord.Embed(
                             title="🏁 Race Completed",
-                            description=f"Race #{len(load_logs()['race_history'])} logged",
+                            description=f"Race #{race_number} logged",
                             color=discord.Color.green()
                         )
-                        embed.add_field(name="Track", value=lobby["track"], inline=True)
-                        embed.add_field(name="Mode", value=lobby["mode"].capitalize(), inline=True)
-                        embed.add_field(name="Players", value=str(len(lobby["players"])), inline=True)
-                        await channel.send(embed=embed)
+                        embed.add_field(name="Track", value=lobby.track, inline=True)
+                        embed.add_field(name="Mode", value=lobby.mode.capitalize(), inline=True)
+                        embed.add_field(name="Players", value=str(len(lobby.players)), inline=True)
+                        embed.add_field(name="Replay", value=f"`{lobby.seed:016x}`", inline=True)
+                        await outbound.send(channel_route(channel), STATUS, lambda: channel.send(embed=embed))
                 except Exception as e:
                     logger.error(f"Failed to log race to channel: {e}")
         del lobbies[channel_id]
     except Exception as e:
         logger.error(f"🏃‍♂️ Race loop failed: {e}")
-        await safe_send(ctx, "❌ The race crashed! Please try creating a new lobby with `!create`.")
+        replay_note = ""
+        if engine is not None and engine.inputs is not None and channel_id in lobbies:
+            try:
+                save_replay(engine, lobbies[channel_id])
+                replay_note = f" (replay `{lobbies[channel_id].seed:016x}`)"
+            except Exception as replay_error:
+                logger.error(f"Failed to save replay of the crashed race in {channel_id}: {replay_error}")
+        await safe_send(ctx, f"❌ The race crashed{replay_note}! Please try creating a new lobby with `!create`.")
         if channel_id in lobbies:
             del lobbies[channel_id]
 
-def generate_race_status_embed(lobby):
-    track = lobby.get("track", "Unknown Track")
-    weather = lobby.get("weather", "☀️ Sunny")
-    current_lap = lobby.get("current_lap", 1)
-    total_laps = TRACKS_INFO.get(track, {"laps": 1})["laps"]
-    position_order = lobby.get("position_order", [])
-    player_data = lobby.get("player_data", {})
-    users = lobby.get("users", {})
-    embed = discord.Embed(
-        title=f"🏎️ {track} Grand Prix",
-        description=(
-            f"**Weather:** {weather} • **Lap:** {current_lap}/{total_laps}\n"
-            f"**Safety Car:** {'🚨 Active' if lobby.get('safety_car_active', False) else 'Inactive'}"
-        ),
-        color=discord.Color.red() if "Sunny" in weather else (
-            discord.Color.blue() if "Rain" in weather else discord.Color.blurple()
-        )
+async def play_highlights(ctx, channel_id, engine, status):
+    # Instant races are resolved in one go (drivers box for fresh Mediums once their tyres are
+    # worn, there's no strategy panel), then only the highlights are published: DNFs, safety
+    # cars and weather changes as they happened, and the closing laps on the status message.
+    lobby = lobbies[channel_id]
+    started = time.perf_counter()
+    records = resolve_race(engine)
+    logger.info(f"⚡ Resolved {len(records)} laps at {lobby.track} for {len(lobby.players)} drivers in {(time.perf_counter() - started) * 1000:.1f}ms")
+    for record in race_highlights(records, INSTANT_FINAL_LAPS):
+        await asyncio.sleep(INSTANT_HIGHLIGHT_DELAY)
+        lobby = lobbies.get(channel_id)
+        if not lobby:
+            return
+        lobby.current_lap = record.lap
+        lobby.weather = record.weather
+        lobby.safety_car_active = record.safety_car
+        lobby.position_order = record.order
+        lobby.gaps = record.gaps
+        await render_race_events(ctx, lobby, record.events)
+        if record.lap > lobby.laps - INSTANT_FINAL_LAPS:
+            status.update(race_status_payload(lobby, record.drivers))
+    lobby.current_lap = engine.current_lap
+    lobby.safety_car_laps = engine.safety_car_laps
+
+STATUS_TYRES = {
+    "Soft": "🔴 Soft",
+    "Medium": "🟠 Medium",
+    "Hard": "⚪ Hard",
+    "Intermediate": "🟢 Inter",
+    "Wet": "🔵 Wet"
+}
+STATUS_STRATEGIES = {
+    "Push": "⚡",
+    "Balanced": "⚖️",
+    "Save": "🛟",
+    "Pit Stop": "🛞"
+}
+
+def race_status_payload(lobby, drivers=None):
+    # Everything the race status embed shows as a plain tuple: equal payloads render identical
+    # embeds, so StatusMessage compares them to skip edits that wouldn't change anything.
+    # drivers: a LapRecord's DriverViews, for a lap other than the one in lobby.player_data
+    weather = WEATHER_OPTIONS[lobby.weather]
+    current_lap = lobby.current_lap
+    player_data = lobby.player_data if drivers is None else drivers
+    users = lobby.users
+    color = "red" if "Sunny" in weather else ("blue" if "Rain" in weather else "blurple")
+    description = (
+        f"**Weather:** {weather} • **Lap:** {current_lap}/{lobby.laps}\n"
+        f"**Safety Car:** {'🚨 Active' if lobby.safety_car_active else 'Inactive'}"
     )
-    tyre_emoji = {
-        "Soft": "🔴 Soft",
-        "Medium": "🟠 Medium",
-        "Hard": "⚪ Hard",
-        "Intermediate": "🟢 Inter",
-        "Wet": "🔵 Wet"
-    }
-    strat_emoji = {
-        "Push": "⚡",
-        "Balanced": "⚖️",
-        "Save": "🛟",
-        "Pit Stop": "🛞"
-    }
-    if not position_order:
-        embed.add_field(name="🏁 Status", value="No active drivers.", inline=False)
-        return embed
-    leader_time = player_data.get(position_order[0], {}).get("total_time", 0.0) if position_order else 0.0
-    for pos, pid in enumerate(position_order, 1):
+    if not lobby.position_order:
+        return (f"🏎️ {lobby.track} Grand Prix", description, color, (("🏁 Status", "No active drivers."),), None)
+    fields = []
+    gaps = lobby.gaps
+    lines = lobby.status_lines
+    for pos, pid in enumerate(lobby.position_order, 1):
         if pid not in users or pid not in player_data:
             continue
-        user = users[pid]
         pdata = player_data[pid]
-        strategy = pdata.get("strategy", "Balanced")
-        tyre = pdata.get("tyre", "Medium")
-        tyre_display = tyre_emoji.get(tyre, tyre)
-        strat_display = strat_emoji.get(strategy, "")
-        total_time = pdata.get("total_time", 0.0)
-        if pos == 1:
-            gap = "—"
-        else:
-            prev_pid = position_order[pos-2]
-            prev_time = player_data.get(prev_pid, {}).get("total_time", 0.0)
-            time_gap = total_time - prev_time
-            gap = f"+{time_gap:.3f}s"
-            logger.debug(f"Gap for {user.name} (P{pos}): {gap}, Total Time: {total_time:.2f}s, Prev Time: {prev_time:.2f}s")
-        if strategy == "Pit Stop" and pdata.get("last_pit_lap", 0) != current_lap:
-            driver_line = f"**P{pos}** `{user.name}` • 🛞 Pitting..."
-        else:
-            driver_line = f"**P{pos}** `{user.name}` • {tyre_display} • {strat_display} {strategy} • `{gap}`"
-        embed.add_field(name="\u200b", value=driver_line, inline=False)
-    dnf_players = [pid for pid, pdata in player_data.items() if pdata.get("dnf", False)]
+        gap = "—" if pos == 1 or pid not in gaps else f"+{gaps[pid][1]:.3f}s"
+        pitting = pdata.strategy == PIT_STOP and pdata.last_pit_lap != current_lap
+        inputs = (pos, users[pid].name, pdata.tyre, pdata.strategy, gap, pitting)
+        cached = lines.get(pid)
+        if cached is None or cached[0] != inputs:
+            name = users[pid].name
+            if pitting:
+                line = f"**P{pos}** `{name}` • 🛞 Pitting..."
+            else:
+                strategy = STRATEGY_CODES[pdata.strategy]
+                tyre = TYRE_CODES[pdata.tyre]
+                line = f"**P{pos}** `{name}` • {STATUS_TYRES.get(tyre, tyre)} • {STATUS_STRATEGIES.get(strategy, '')} {strategy} • `{gap}`"
+            cached = lines[pid] = (inputs, line)
+        fields.append(("\u200b", cached[1]))
+    dnf_players = [pid for pid, pdata in player_data.items() if pdata.dnf]
     if dnf_players:
-        dnf_names = [f"{users.get(pid, {'name': f'Unknown ({pid})'}).name} — {player_data[pid]['dnf_reason']}" for pid in dnf_players]
-        embed.add_field(name="❌ DNFs", value="\n".join(dnf_names), inline=False)
-    embed.set_footer(text="Use your DM strategy panel to make changes during the race.")
+        dnf_names = [f"{users.get(pid, {'name': f'Unknown ({pid})'}).name} — {player_data[pid].dnf_reason}" for pid in dnf_players]
+        fields.append(("❌ DNFs", "\n".join(dnf_names)))
+    return (f"🏎️ {lobby.track} Grand Prix", description, color, tuple(fields), "Use your DM strategy panel to make changes during the race.")
+
+def status_payload_embed(payload):
+    title, description, color, fields, footer = payload
+    embed = discord.Embed(title=title, description=description, color=getattr(discord.Color, color)())
+    for name, value in fields:
+        embed.add_field(name=name, value=value, inline=False)
+    if footer:
+        embed.set_footer(text=footer)
     return embed
 
+def generate_race_status_embed(lobby):
+    return status_payload_embed(race_status_payload(lobby))
+
 class StrategyPanelView(View):
     def __init__(self, user_id, channel_id):
         super().__init__(timeout=None)
@@ -1190,43 +1147,43 @@ class StrategyPanelView(View):
         return True
     @discord.ui.button(label="Push", style=discord.ButtonStyle.danger, emoji="⚡")
     async def push(self, interaction: discord.Interaction, button: Button):
-        if self.channel_id in lobbies and self.user_id in lobbies[self.channel_id]["player_data"]:
-            lobbies[self.channel_id]["player_data"][self.user_id]["strategy"] = "Push"
+        if self.channel_id in lobbies and self.user_id in lobbies[self.channel_id].player_data:
+            lobbies[self.channel_id].player_data[self.user_id].strategy = PUSH
             await interaction.response.send_message("⚡ Strategy set to **Push**.", ephemeral=True)
         else:
             await interaction.response.send_message("❌ Race or player data not found.", ephemeral=True)
     @discord.ui.button(label="Balanced", style=discord.ButtonStyle.primary, emoji="⚖️")
     async def balanced(self, interaction: discord.Interaction, button: Button):
-        if self.channel_id in lobbies and self.user_id in lobbies[self.channel_id]["player_data"]:
-            lobbies[self.channel_id]["player_data"][self.user_id]["strategy"] = "Balanced"
+        if self.channel_id in lobbies and self.user_id in lobbies[self.channel_id].player_data:
+            lobbies[self.channel_id].player_data[self.user_id].strategy = BALANCED
             await interaction.response.send_message("⚖️ Strategy set to **Balanced**.", ephemeral=True)
         else:
             await interaction.response.send_message("❌ Race or player data not found.", ephemeral=True)
     @discord.ui.button(label="Save", style=discord.ButtonStyle.success, emoji="🛟")
     async def save(self, interaction: discord.Interaction, button: Button):
-        if self.channel_id in lobbies and self.user_id in lobbies[self.channel_id]["player_data"]:
-            lobbies[self.channel_id]["player_data"][self.user_id]["strategy"] = "Save"
+        if self.channel_id in lobbies and self.user_id in lobbies[self.channel_id].player_data:
+            lobbies[self.channel_id].player_data[self.user_id].strategy = SAVE
             await interaction.response.send_message("🛟 Strategy set to **Save**.", ephemeral=True)
         else:
             await interaction.response.send_message("❌ Race or player data not found.", ephemeral=True)
     @discord.ui.button(label="Pit Stop", style=discord.ButtonStyle.secondary, emoji="🛞")
     async def pit(self, interaction: discord.Interaction, button: Button):
         logger.info(f"Pit button clicked by {self.user_id} in channel {self.channel_id}")
-        if self.channel_id not in lobbies or self.user_id not in lobbies[self.channel_id]["player_data"]:
+        if self.channel_id not in lobbies or self.user_id not in lobbies[self.channel_id].player_data:
             await interaction.response.send_message("❌ Race or player data not found.", ephemeral=True)
             return
         view = TyreView(self.user_id)
         await interaction.response.send_message("🛠 Choose your tyre set:", view=view, ephemeral=True)
         await view.wait()
         if view.choice:
-            pdata = lobbies[self.channel_id]["player_data"][self.user_id]
-            current_lap = lobbies[self.channel_id]["current_lap"]
-            if pdata["last_pit_lap"] == current_lap:
+            pdata = lobbies[self.channel_id].player_data[self.user_id]
+            current_lap = lobbies[self.channel_id].current_lap
+            if pdata.last_pit_lap == current_lap:
                 logger.warning(f"Pit stop skipped for {self.user_id}: Already pitted on lap {current_lap}")
                 await interaction.followup.send("🛞 You already pitted this lap!", ephemeral=True)
                 return
-            pdata["tyre"] = view.choice
-            pdata["strategy"] = "Pit Stop"  # Set strategy to trigger penalty
+            pdata.tyre = TYRE_INDEX[view.choice]
+            pdata.strategy = PIT_STOP  # Set strategy to trigger penalty
             logger.info(f"🛞 Pit stop confirmed for {self.user_id}: Tyre={view.choice}, Lap={current_lap}")
             await interaction.followup.send(
                 f"✅ Pit stop complete! You chose **{view.choice}** tyres.\n"
@@ -1268,54 +1225,80 @@ class TyreView(View):
     async def wet(self, interaction: discord.Interaction, button: Button):
         await self._select_tyre(interaction, "Wet")
 
-async def handle_safety_car(ctx, lobby, current_lap, collision_occurred):
-    logger.debug(f"handle_safety_car: lap={current_lap}, active={lobby.get('safety_car_active', False)}, laps={lobby.get('safety_car_laps', 0)}, collision={collision_occurred}")
-
-    # Initialize cooldown if not present
-    if "safety_car_cooldown" not in lobby:
-        lobby["safety_car_cooldown"] = 0
-
-    # Handle active safety car
-    if lobby.get("safety_car_active", False):
-        lobby["safety_car_laps"] = max(0, lobby["safety_car_laps"] - 1)
-        logger.info(f"Safety car active on lap {current_lap}, laps remaining: {lobby['safety_car_laps']}")
-        
-        if lobby["safety_car_laps"] == 0:
-            lobby["safety_car_active"] = False
-            lobby["safety_car_cooldown"] = 3  # Set cooldown to 3 laps after safety car ends
-            embed = discord.Embed(
-                title="🏎️🏁 Safety Car In!",
-                description=f"✦ The safety car has returned to the pits on Lap {current_lap}! Racing resumes. ✦",
-                color=discord.Color.green()
-            )
-            embed.set_footer(text="🏆 Adjust your strategy!")
-            await safe_send(ctx, embed=embed)
-            logger.info(f"Safety car ended on lap {current_lap} in channel {ctx.channel.id}")
+async def render_race_events(ctx, lobby, events):
+    weather_updates = []
+    for event in events:
+        if event["type"] == "weather":
+            if event["reverted"]:
+                weather_updates.append(f"Weather has reverted to {WEATHER_OPTIONS[event['weather']]} on Lap {event['lap']}!")
+            else:
+                weather_updates.append(f"Weather has changed to {WEATHER_OPTIONS[event['weather']]} on Lap {event['lap']}!")
+    if weather_updates:
+        await safe_send(ctx, "\n".join(weather_updates))
+    for event in events:
+        if event["type"] == "pit":
+            logger.info(f"🛞 PIT STOP TRIGGERED for {event['pid']} on lap {event['lap']}, Tyre: {TYRE_CODES[event['tyre']]}")
+        elif event["type"] == "dnf":
+            await render_dnf(ctx, lobby, event)
+        elif event["type"] == "safety_car":
+            await render_safety_car(ctx, event)
+
+async def render_dnf(ctx, lobby, event):
+    pid, current_lap, reason = event["pid"], event["lap"], event["reason"]
+    user = lobby.users.get(pid)
+    name = user.name if user else f"Unknown ({pid})"
+    logger.info(f"💀 DNF: {pid} DNFed on lap {current_lap}: {reason}")
+    if reason == "Tyres worn out":
+        embed = discord.Embed(
+            title="🏎️ DNF Alert!",
+            description=f"✦ `{name}` DNFed: {reason} on Lap {current_lap}! ✦",
+            color=discord.Color.red()
+        )
+        await safe_send(ctx, embed=embed)
         return
+    embed = discord.Embed(
+        title="🏎️ Crash Alert!",
+        description=f"✦ `{name}` DNFed: {reason}! ✦",
+        color=discord.Color.red()
+    )
+    embed.set_footer(text="🏆 Check your DM strategy panel!")
+    await safe_send(ctx, embed=embed)
+    if user:
+        try:
+            dm_embed = discord.Embed(
+                title="🏎️ Your Race Ended!",
+                description=f"✦ Your car suffered a {reason.lower()} on Lap {current_lap}. ✦",
+                color=discord.Color.red()
+            )
+            await outbound.send(("dm", pid), ALERT, lambda: user.send(embed=dm_embed))
+        except (discord.Forbidden, discord.HTTPException):
+            logger.warning(f"Failed to send crash DM to {pid}")
 
-    # Decrement cooldown
-    lobby["safety_car_cooldown"] = max(0, lobby["safety_car_cooldown"] - 1)
-    if lobby["safety_car_cooldown"] > 0:
-        logger.debug(f"Safety car on cooldown: {lobby['safety_car_cooldown']} laps remaining")
-
-    # Deploy safety car if conditions are met
-    if collision_occurred and lobby["safety_car_cooldown"] == 0 and current_lap < lobby["laps"] - 2:
-        logger.info(f"Deploying safety car due to collision on lap {current_lap}")
-        lobby["safety_car_active"] = True
-        lobby["safety_car_laps"] = random.randint(2, min(4, lobby["laps"] - current_lap - 1))  # Ensure safety car doesn't exceed race length
+async def render_safety_car(ctx, event):
+    current_lap = event["lap"]
+    if not event["active"]:
         embed = discord.Embed(
-            title="🏎️🏁 Safety Car Deployed!",
-            description=f"✦ Collision on Lap {current_lap}! Safety car out for {lobby['safety_car_laps']} laps. ✦",
-            color=discord.Color.yellow()
-        )
-        embed.add_field(
-            name="Impact",
-            value="⚡ Slower laps\n🛞 No tyre wear\n🏎️ No overtaking",
-            inline=False
+            title="🏎️🏁 Safety Car In!",
+            description=f"✦ The safety car has returned to the pits on Lap {current_lap}! Racing resumes. ✦",
+            color=discord.Color.green()
         )
-        embed.set_footer(text="🏆 Use your DM panel to plan your strategy!")
+        embed.set_footer(text="🏆 Adjust your strategy!")
         await safe_send(ctx, embed=embed)
-        logger.info(f"Safety car deployed on lap {current_lap} for {lobby['safety_car_laps']} laps in channel {ctx.channel.id}")
+        logger.info(f"Safety car ended on lap {current_lap} in channel {ctx.channel.id}")
+        return
+    embed = discord.Embed(
+        title="🏎️🏁 Safety Car Deployed!",
+        description=f"✦ Collision on Lap {current_lap}! Safety car out for {event['laps']} laps. ✦",
+        color=discord.Color.yellow()
+    )
+    embed.add_field(
+        name="Impact",
+        value="⚡ Slower laps\n🛞 No tyre wear\n🏎️ No overtaking",
+        inline=False
+    )
+    embed.set_footer(text="🏆 Use your DM panel to plan your strategy!")
+    await safe_send(ctx, embed=embed)
+    logger.info(f"Safety car deployed on lap {current_lap} for {event['laps']} laps in channel {ctx.channel.id}")
 
 @bot.command(name="help")
 async def help(ctx):
@@ -1335,6 +1318,7 @@ async def help(ctx):
             "`!tracks` – View all tracks\n"
             "`!set <track>` – Set track (host)\n"
             "`!lobby` – Show lobby details\n"
+            "`!predict` – Simulate the lobby's race odds\n"
             "`!setstrat <tyre> <strat>` – Set initial tyre/strategy (e.g., !setstrat Soft Push)"
         ),
         inline=True
@@ -1343,6 +1327,7 @@ async def help(ctx):
         name="👥 Team & Lobby",
         value=(
             "`!cm <solo|duo>` – Set mode (host)\n"
+            "`!pace <live|instant>` – Live laps or instant highlights (host)\n"
             "`!kick @user` – Kick player (host)\n"
             "`!yeet` – Delete lobby (host)\n"
             "`!swap @user1 @user2` – Swap duo teams (host)\n"
@@ -1410,15 +1395,14 @@ async def help(ctx):
 async def autosave_career_stats():
     while True:
         await asyncio.sleep(300)  # Autosave every 5 minutes (300 seconds)
-        if not career_stats:
-            logger.warning("Skipping autosave: career_stats is empty")
-            continue
-        save_career_stats()
-        logger.info("Autosaved career_stats.json (periodic)")
+        await flush_career_stats(sync=True)
+        if profile_store.needs_compaction():
+            await compact_career_stats()
 
 @bot.command()
 async def profile(ctx):
     user_id = ctx.author.id
+    await load_player_profiles([user_id])
     profile = get_player_profile(user_id)
     embed = discord.Embed(
         title=f"🏎️ {ctx.author.name}'s Career Profile",
@@ -1438,7 +1422,18 @@ async def profile(ctx):
     await ctx.send(embed=embed)
 
 def save_on_exit():
-    save_career_stats()
+    # The worker may already refuse new jobs at interpreter exit, so drain it and write inline
+    if multiprocessing.parent_process() is not None:
+        return  # A !predict worker that imported this module: it owns none of the bot's state
+    predictor.shutdown()
+    persistence.shutdown()
+    write_profiles(take_dirty_profiles(), True)
+    profile_store.close()
+    if race_logs is not None and race_logs_dirty:
+        save_logs(snapshot_race_logs())
+    if user_names_dirty:
+        write_user_names(snapshot_user_names())
+    race_events.close()
 
 atexit.register(save_on_exit)
 
@@ -1454,20 +1449,20 @@ async def lobby_status(ctx):
         await ctx.send(embed=embed)
         return
     lobby = lobbies[channel_id]
-    player_names = [lobby["users"][pid].name for pid in lobby["players"] if pid in lobby["users"]]
+    player_names = [lobby.users[pid].name for pid in lobby.players if pid in lobby.users]
     players_text = "\n".join([f"🏎️ {name}" for name in player_names]) if player_names else "No players yet."
-    if lobby["mode"] == "duo" and lobby["teams"]:
+    if lobby.mode == "duo" and lobby.teams:
         team_texts = []
-        for idx, team in enumerate(lobby["teams"]):
-            team_name = lobby["team_names"].get(idx, f"Team {idx + 1}")
-            team_players = [lobby["users"][pid].name for pid in team if pid in lobby["users"]]
+        for idx, team in enumerate(lobby.teams):
+            team_name = lobby.team_names.get(idx, f"Team {idx + 1}")
+            team_players = [lobby.users[pid].name for pid in team if pid in lobby.users]
             team_texts.append(f"**{team_name}**: {', '.join(team_players)}")
         teams_text = "\n".join(team_texts)
     else:
         teams_text = "Solo mode — no teams."
     embed = discord.Embed(
-        title=f"🏎️ {lobby['track']} Lobby",
-        description=f"**Host**: {lobby['users'][lobby['host']].name}\n**Status**: {lobby['status'].capitalize()}",
+        title=f"🏎️ {lobby.track} Lobby",
+        description=f"**Host**: {lobby.users[lobby.host].name}\n**Status**: {lobby.status.capitalize()}",
         color=discord.Color.blue()
     )
     embed.add_field(name="Players", value=players_text, inline=True)
@@ -1475,20 +1470,61 @@ async def lobby_status(ctx):
     embed.add_field(
         name="Track Info",
         value=(
-            f"**Track**: {lobby['track']}\n"
-            f"**Weather**: {lobby['weather']}\n"
+            f"**Track**: {lobby.track}\n"
+            f"**Weather**: {WEATHER_OPTIONS[lobby.weather]}\n"
             f"**Conditions**:\n"
-            f"  ⚡ Speed: {lobby['conditions']['speed']}\n"
-            f"  🛞 Accel: {lobby['conditions']['acceleration']}\n"
-            f"  🏎️ Overtake: {lobby['conditions']['overtaking']}\n"
-            f"  🔄 Corners: {lobby['conditions']['corners']}\n"
-            f"**Mode**: {lobby['race_mode'].capitalize()}"
+            f"  ⚡ Speed: {lobby.conditions['speed']}\n"
+            f"  🛞 Accel: {lobby.conditions['acceleration']}\n"
+            f"  🏎️ Overtake: {lobby.conditions['overtaking']}\n"
+            f"  🔄 Corners: {lobby.conditions['corners']}\n"
+            f"**Mode**: {lobby.race_mode.capitalize()}\n"
+            f"**Pace**: {lobby.pace.capitalize()}"
         ),
         inline=False
     )
     embed.set_footer(text="Join with `!join` or start with `!start` (host only).")
     await ctx.send(embed=embed)
 
+@bot.command()
+async def predict(ctx):
+    channel_id = ctx.channel.id
+    if channel_id not in lobbies:
+        await ctx.send("❌ No active race lobby in this channel. Create one with `!create`.")
+        return
+    lobby = lobbies[channel_id]
+    players = list(lobby.players)
+    await load_player_profiles(players)
+    car_parts = {pid: dict(get_player_profile(pid)["car_parts"]) for pid in players}
+    try:
+        async with ctx.typing():
+            result = await predictor.predict(lobby.track, players, car_parts, lobby.initial_weather, lobby.weather_window)
+    except Exception as e:
+        logger.error(f"Prediction failed for channel {channel_id}: {e}")
+        await ctx.send("⚠️ Couldn't run the prediction right now, try again in a moment.")
+        return
+    window = lobby.weather_window
+    forecast = f" → {WEATHER_OPTIONS[window.new_weather]} (Laps {window.start}-{window.end})" if window else ""
+    embed = discord.Embed(
+        title=f"🔮 {lobby.track} Race Prediction",
+        description=f"✦ {result['runs']} simulated races — Weather: {WEATHER_OPTIONS[lobby.initial_weather]}{forecast} ✦",
+        color=discord.Color.purple()
+    )
+    ranked = sorted(result["drivers"].items(), key=lambda item: (-item[1]["win"], -item[1]["points"]))
+    for pid, prediction in ranked[:20]:
+        user = lobby.users.get(pid)
+        option, gain = best_start(prediction)
+        best = f"\n💡 Best start: **{STRATEGY_CODES[option[0]]}** on **{TYRE_CODES[option[1]]}** ({gain:+.1f} pts)" if option else ""
+        embed.add_field(
+            name=f"🏎️ {user.name if user else pid}",
+            value=(
+                f"🏆 Win: {prediction['win']:.1%} | 🥇 Podium: {prediction['podium']:.1%} | 💥 DNF: {prediction['dnf']:.1%}\n"
+                f"📊 Expected points: {prediction['points']:.1f}{best}"
+            ),
+            inline=False
+        )
+    embed.set_footer(text="Predictions assume a pit stop for Mediums when tyres drop below 25%.")
+    await ctx.send(embed=embed)
+
 @bot.command()
 async def cm(ctx, mode: str = None):
     channel_id = ctx.channel.id
@@ -1497,44 +1533,37 @@ async def cm(ctx, mode: str = None):
         await ctx.send("❌ No active race lobby in this channel. Create one with `!create`.")
         return
     lobby = lobbies[channel_id]
-    if user_id != lobby["host"]:
+    if user_id != lobby.host:
         await ctx.send("🚫 Only the game host can change the race mode.")
         return
-    if lobby["status"] != "waiting":
+    if lobby.status != "waiting":
         await ctx.send("🚫 You can't change the mode after the race has started.")
         return
     if not mode or mode.lower() not in ["solo", "duo"]:
         await ctx.send("❌ Specify a valid mode: `!cm solo` or `!cm duo`.")
         return
     mode = mode.lower()
-    if mode == lobby["mode"]:
+    if mode == lobby.mode:
         await ctx.send(f"🏁 The lobby is already in **{mode}** mode.")
         return
     if mode == "duo":
-        if len(lobby["players"]) < 2:
+        if len(lobby.players) < 2:
             await ctx.send("❌ Need at least 2 players to form teams in duo mode.")
             return
-        if len(lobby["players"]) % 2 != 0:
+        if len(lobby.players) % 2 != 0:
             await ctx.send("❌ Duo mode requires an even number of players.")
             return
-        shuffled_players = random.sample(lobby["players"], len(lobby["players"]))
-        lobby["teams"] = [shuffled_players[i:i+2] for i in range(0, len(shuffled_players), 2)]
-        lobby["team_names"] = {i: f"Team {i+1}" for i in range(len(lobby["teams"]))}  # Initialize team names
-        lobby["mode"] = "duo"
+        shuffled_players = random.sample(lobby.players, len(lobby.players))
+        lobby.teams = [shuffled_players[i:i+2] for i in range(0, len(shuffled_players), 2)]
+        lobby.team_names = {i: f"Team {i+1}" for i in range(len(lobby.teams))}  # Initialize team names
+        lobby.mode = "duo"
+        lobby.users.update(await resolve_users([pid for pid in lobby.players if pid not in lobby.users], ctx.guild))
         team_display = []
-        for i, team in enumerate(lobby["teams"], 1):
+        for i, team in enumerate(lobby.teams, 1):
             team_names = []
             for pid in team:
-                user = lobby["users"].get(pid)
-                if not user:
-                    try:
-                        user = await bot.fetch_user(pid)
-                        lobby["users"][pid] = user
-                    except (discord.NotFound, discord.HTTPException):
-                        logger.warning(f"Failed to fetch user {pid} for team display")
-                        team_names.append(f"Unknown ({pid})")
-                        continue
-                team_names.append(user.name)
+                user = lobby.users.get(pid)
+                team_names.append(user.name if user else f"Unknown ({pid})")
             team_display.append(f"**Team {i}**: {team_names[0]} & {team_names[1]}")
         embed = discord.Embed(
             title="🤝 Duo Mode Activated",
@@ -1545,8 +1574,8 @@ async def cm(ctx, mode: str = None):
         embed.set_footer(text="Use !start to begin the race!")
         await ctx.send(embed=embed)
     else:
-        lobby["mode"] = "solo"
-        lobby["teams"] = []
+        lobby.mode = "solo"
+        lobby.teams = []
         embed = discord.Embed(
             title="🏎️ Solo Mode Activated",
             description="The lobby is now set to individual racing.",
@@ -1555,6 +1584,35 @@ async def cm(ctx, mode: str = None):
         embed.set_footer(text="Use !start to begin the race!")
         await ctx.send(embed=embed)
 
+@bot.command()
+async def pace(ctx, pace: str = None):
+    channel_id = ctx.channel.id
+    if channel_id not in lobbies:
+        await ctx.send("❌ No active race lobby in this channel. Create one with `!create`.")
+        return
+    lobby = lobbies[channel_id]
+    if ctx.author.id != lobby.host:
+        await ctx.send("🚫 Only the game host can change the race pace.")
+        return
+    if lobby.status != "waiting":
+        await ctx.send("🚫 You can't change the pace after the race has started.")
+        return
+    if not pace or pace.lower() not in ["live", "instant"]:
+        await ctx.send("❌ Specify a valid pace: `!pace live` or `!pace instant`.")
+        return
+    lobby.pace = pace.lower()
+    if lobby.pace == "instant":
+        description = "The race is decided the moment it starts and only the highlights are shown. No strategy panel: drivers pit for Mediums when their tyres wear out, starting on their `!setstrat` choice."
+    else:
+        description = "Lap-by-lap racing with the DM strategy panel."
+    embed = discord.Embed(
+        title=f"⏱️ {lobby.pace.capitalize()} Pace",
+        description=description,
+        color=discord.Color.blue()
+    )
+    embed.set_footer(text="Use !start to begin the race!")
+    await ctx.send(embed=embed)
+
 @bot.command()
 async def kick(ctx, member: discord.Member):
     channel_id = ctx.channel.id
@@ -1568,7 +1626,7 @@ async def kick(ctx, member: discord.Member):
         await ctx.send(embed=embed)
         return
     lobby = lobbies[channel_id]
-    if user_id != lobby["host"]:
+    if user_id != lobby.host:
         embed = discord.Embed(
             title="🚫 Permission Denied",
             description="Only the host can kick players from the lobby.",
@@ -1576,7 +1634,7 @@ async def kick(ctx, member: discord.Member):
         )
         await ctx.send(embed=embed)
         return
-    if lobby["status"] != "waiting":
+    if lobby.status != "waiting":
         embed = discord.Embed(
             title="🚫 Race In Progress",
             description="You can’t kick players after the race has started.",
@@ -1593,7 +1651,7 @@ async def kick(ctx, member: discord.Member):
         )
         await ctx.send(embed=embed)
         return
-    if target_id not in lobby["players"]:
+    if target_id not in lobby.players:
         embed = discord.Embed(
             title="❌ Player Not Found",
             description=f"{member.name} is not in this race lobby.",
@@ -1601,12 +1659,12 @@ async def kick(ctx, member: discord.Member):
         )
         await ctx.send(embed=embed)
         return
-    lobby["players"].remove(target_id)
-    lobby["users"].pop(target_id, None)
-    if lobby["mode"] == "duo":
-        if len(lobby["players"]) % 2 != 0:
-            lobby["mode"] = "solo"
-            lobby["teams"] = []
+    lobby.players.remove(target_id)
+    lobby.users.pop(target_id, None)
+    if lobby.mode == "duo":
+        if len(lobby.players) % 2 != 0:
+            lobby.mode = "solo"
+            lobby.teams = []
             embed = discord.Embed(
                 title="✅ Player Kicked",
                 description=f"{member.name} was kicked from the lobby.",
@@ -1619,12 +1677,12 @@ async def kick(ctx, member: discord.Member):
             )
             await ctx.send(embed=embed)
         else:
-            shuffled_players = random.sample(lobby["players"], len(lobby["players"]))
-            lobby["teams"] = [shuffled_players[i:i+2] for i in range(0, len(shuffled_players), 2)]
-            lobby["team_names"] = {i: f"Team {i+1}" for i in range(len(lobby["teams"]))}  # Reinitialize team names
+            shuffled_players = random.sample(lobby.players, len(lobby.players))
+            lobby.teams = [shuffled_players[i:i+2] for i in range(0, len(shuffled_players), 2)]
+            lobby.team_names = {i: f"Team {i+1}" for i in range(len(lobby.teams))}  # Reinitialize team names
             team_display = []
-            for i, team in enumerate(lobby["teams"], 1):
-                team_names = [lobby["users"].get(pid, {"name": f"Unknown ({pid})"}).name for pid in team]
+            for i, team in enumerate(lobby.teams, 1):
+                team_names = [lobby.users.get(pid, {"name": f"Unknown ({pid})"}).name for pid in team]
                 team_display.append(f"**Team {i}**: {team_names[0]} & {team_names[1]}")
             embed = discord.Embed(
                 title="✅ Player Kicked",
@@ -1644,7 +1702,7 @@ async def kick(ctx, member: discord.Member):
             color=discord.Color.blue()
         )
         await ctx.send(embed=embed)
-    if not lobby["players"]:
+    if not lobby.players:
         embed = discord.Embed(
             title="🏁 Lobby Closed",
             description="No players left after the kick. The lobby has been closed.",
@@ -1669,7 +1727,7 @@ async def yeet(ctx):
     lobby = lobbies[channel_id]
     # Check if user is admin, has "Game Host" role, or is the lobby host
     has_game_host_role = any(role.name.lower() == "game host" for role in ctx.author.roles)
-    if not (ctx.author.guild_permissions.administrator or has_game_host_role or user_id == lobby["host"]):
+    if not (ctx.author.guild_permissions.administrator or has_game_host_role or user_id == lobby.host):
         embed = discord.Embed(
             title="🚫 Permission Denied",
             description="Only server admins, users with the 'Game Host' role, or the lobby host can yeet the lobby.",
@@ -1677,7 +1735,7 @@ async def yeet(ctx):
         )
         await ctx.send(embed=embed)
         return
-    if lobby["status"] != "waiting":
+    if lobby.status != "waiting":
         embed = discord.Embed(
             title="🚫 Race In Progress",
             description="You can’t yeet the lobby after the race has started.",
@@ -1707,7 +1765,7 @@ async def swap(ctx, member1: discord.Member, member2: discord.Member):
         await ctx.send(embed=embed)
         return
     lobby = lobbies[channel_id]
-    if user_id != lobby["host"]:
+    if user_id != lobby.host:
         embed = discord.Embed(
             title="🚫 Permission Denied",
             description="Only the host can swap players between teams.",
@@ -1715,7 +1773,7 @@ async def swap(ctx, member1: discord.Member, member2: discord.Member):
         )
         await ctx.send(embed=embed)
         return
-    if lobby["status"] != "waiting":
+    if lobby.status != "waiting":
         embed = discord.Embed(
             title="🚫 Race In Progress",
             description="You can’t swap players after the race has started.",
@@ -1723,7 +1781,7 @@ async def swap(ctx, member1: discord.Member, member2: discord.Member):
         )
         await ctx.send(embed=embed)
         return
-    if lobby["mode"] != "duo":
+    if lobby.mode != "duo":
         embed = discord.Embed(
             title="🚫 Invalid Mode",
             description="Swap is only available in Duo mode. Use `!cm duo` to switch modes.",
@@ -1733,7 +1791,7 @@ async def swap(ctx, member1: discord.Member, member2: discord.Member):
         return
     pid1 = member1.id
     pid2 = member2.id
-    if pid1 not in lobby["players"] or pid2 not in lobby["players"]:
+    if pid1 not in lobby.players or pid2 not in lobby.players:
         embed = discord.Embed(
             title="❌ Player Not Found",
             description="One or both players are not in the lobby.",
@@ -1753,7 +1811,7 @@ async def swap(ctx, member1: discord.Member, member2: discord.Member):
     team2_idx = None
     pid1_pos = None
     pid2_pos = None
-    for i, team in enumerate(lobby["teams"]):
+    for i, team in enumerate(lobby.teams):
         for j, pid in enumerate(team):
             if pid == pid1:
                 team1_idx = i
@@ -1777,12 +1835,12 @@ async def swap(ctx, member1: discord.Member, member2: discord.Member):
         )
         await ctx.send(embed=embed)
         return
-    lobby["teams"][team1_idx][pid1_pos], lobby["teams"][team2_idx][pid2_pos] = (
-        lobby["teams"][team2_idx][pid2_pos], lobby["teams"][team1_idx][pid1_pos]
+    lobby.teams[team1_idx][pid1_pos], lobby.teams[team2_idx][pid2_pos] = (
+        lobby.teams[team2_idx][pid2_pos], lobby.teams[team1_idx][pid1_pos]
     )
     team_display = []
-    for i, team in enumerate(lobby["teams"], 1):
-        team_names = [lobby["users"].get(pid, {"name": f"Unknown ({pid})"}).name for pid in team]
+    for i, team in enumerate(lobby.teams, 1):
+        team_names = [lobby.users.get(pid, {"name": f"Unknown ({pid})"}).name for pid in team]
         team_display.append(f"Team {i}: {team_names[0]} & {team_names[1]}")
     embed = discord.Embed(
         title="🤝 Players Swapped",
@@ -1795,7 +1853,8 @@ async def swap(ctx, member1: discord.Member, member2: discord.Member):
 
 @bot.command(name="lb")
 async def leaderboard(ctx):
-    if not career_stats:
+    await flush_career_stats()
+    if not await persistence.submit(profile_store.count):
         embed = discord.Embed(
             title="🏆 Formula Z Leaderboard",
             description="🚩 No championship races recorded yet! Start a race with `!create` and use `!tm` for championship mode.",
@@ -1805,21 +1864,14 @@ async def leaderboard(ctx):
         embed.set_footer(text="🏎️ Race to dominate the championship!")
         await ctx.send(embed=embed)
         return
-    sorted_players = sorted(
-        career_stats.items(),
-        key=lambda x: (-x[1]["tournament_stats"]["points"], x[1]["races"])
-    )
+    sorted_players = await persistence.submit(profile_store.top_tournament, 10)
     leaderboard_lines = []
     number_emojis = {1: "🥇", 2: "🥈", 3: "🥉", 4: "4️⃣", 5: "5️⃣", 6: "6️⃣", 7: "7️⃣", 8: "8️⃣", 9: "9️⃣", 10: "🔟"}
+    names = await resolve_user_names([user_id for user_id, _ in sorted_players[:10]], ctx.guild)
     for rank, (user_id, stats) in enumerate(sorted_players, 1):
         if rank > 10:
             break
-        try:
-            user = await bot.fetch_user(user_id)
-            name = user.name
-        except (discord.NotFound, discord.HTTPException):
-            logger.warning(f"Failed to fetch user {user_id}")
-            name = f"Unknown ({user_id})"
+        name = names[user_id]
         points = stats["tournament_stats"]["points"]
         if points == 0:
             continue
@@ -1841,10 +1893,10 @@ async def setstrat(ctx, tyre: str = None, strat: str = None):
         await ctx.send("❌ No active race lobby in this channel.")
         return
     lobby = lobbies[channel_id]
-    if lobby["status"] != "waiting":
+    if lobby.status != "waiting":
         await ctx.send("🚫 You can only set your strategy before the race starts.")
         return
-    if user_id not in lobby["players"]:
+    if user_id not in lobby.players:
         await ctx.send("🙃 You're not in this race lobby. Use `!join` first.")
         return
     valid_tyres = ["Soft", "Medium", "Hard", "Intermediate", "Wet"]
@@ -1855,9 +1907,7 @@ async def setstrat(ctx, tyre: str = None, strat: str = None):
     if not strat or strat not in valid_strats:
         await ctx.send(f"⚠️ Invalid strategy. Choose from: {', '.join(valid_strats)}")
         return
-    if "initial_settings" not in lobby:
-        lobby["initial_settings"] = {}
-    lobby["initial_settings"][user_id] = {"tyre": tyre, "strategy": strat}
+    lobby.initial_settings[user_id] = PendingInput(1, user_id, STRATEGY_INDEX[strat], TYRE_INDEX[tyre])
     await ctx.send(f"✅ {ctx.author.mention} set initial strategy: **{tyre}** tyres, **{strat}** strategy.")
 
 @bot.command(name="ctn")
@@ -1867,25 +1917,26 @@ async def change_team_name(ctx, team_number: int, *, custom_name: str):
         await safe_send(ctx, "❌ No lobby exists in this channel. Use `!create` to start one.")
         return
     lobby = lobbies[channel_id]
-    if ctx.author.id != lobby["host"]:
+    if ctx.author.id != lobby.host:
         await safe_send(ctx, "❌ Only the lobby host can change team names.")
         return
-    if lobby["mode"] != "duo":
+    if lobby.mode != "duo":
         await safe_send(ctx, "❌ Team names can only be changed in duo mode.")
         return
-    if team_number < 1 or team_number > len(lobby["teams"]):
-        await safe_send(ctx, f"❌ Invalid team number. Choose a number between 1 and {len(lobby['teams'])}.")
+    if team_number < 1 or team_number > len(lobby.teams):
+        await safe_send(ctx, f"❌ Invalid team number. Choose a number between 1 and {len(lobby.teams)}.")
         return
     if len(custom_name) > 30:
         await safe_send(ctx, "❌ Team name must be 30 characters or less.")
         return
-    lobby["team_names"][team_number - 1] = custom_name
+    lobby.team_names[team_number - 1] = custom_name
     logger.info(f"Team {team_number} renamed to '{custom_name}' by host {ctx.author.id} in channel {channel_id}")
     await safe_send(ctx, f"✅ Team {team_number} renamed to **{custom_name}**!")
 
 @bot.command()
 async def coins(ctx):
     user_id = ctx.author.id
+    await load_player_profiles([user_id])
     profile = get_player_profile(user_id)
     zcoin_emoji = get_zcoin_emoji(ctx)
     embed = discord.Embed(
@@ -1899,21 +1950,23 @@ async def coins(ctx):
 @bot.command()
 async def daily(ctx):
     user_id = ctx.author.id
+    await load_player_profiles([user_id])
     profile = get_player_profile(user_id)
     zcoin_emoji = get_zcoin_emoji(ctx)
     current_time = time.time()
-    cooldown = 24 * 3600  # 24 hours
+    amount, cooldown = ZCOIN_CLAIMS["daily"]
     if current_time - profile["last_daily"] < cooldown:
         remaining = cooldown - (current_time - profile["last_daily"])
         await ctx.send(f"⏳ Wait **{format_cooldown(remaining)}** to claim your next daily reward!")
         return
-    profile["zcoins"] += 100
+    profile["zcoins"] += amount
     profile["last_daily"] = current_time
-    save_career_stats()
-    logger.info(f"User {user_id} claimed 100 Zcoins (daily)")
+    mark_profile_dirty(user_id)
+    flush_career_stats()
+    logger.info(f"User {user_id} claimed {amount} Zcoins (daily)")
     embed = discord.Embed(
         title="🎉 Daily Reward Claimed!",
-        description=f"You received **100** {zcoin_emoji}!",
+        description=f"You received **{amount}** {zcoin_emoji}!",
         color=discord.Color.green()
     )
     embed.set_footer(text="Come back tomorrow for more!")
@@ -1922,21 +1975,23 @@ async def daily(ctx):
 @bot.command()
 async def weekly(ctx):
     user_id = ctx.author.id
+    await load_player_profiles([user_id])
     profile = get_player_profile(user_id)
     zcoin_emoji = get_zcoin_emoji(ctx)
     current_time = time.time()
-    cooldown = 7 * 24 * 3600  # 7 days
+    amount, cooldown = ZCOIN_CLAIMS["weekly"]
     if current_time - profile["last_weekly"] < cooldown:
         remaining = cooldown - (current_time - profile["last_weekly"])
         await ctx.send(f"⏳ Wait **{format_cooldown(remaining)}** to claim your next weekly reward!")
         return
-    profile["zcoins"] += 500
+    profile["zcoins"] += amount
     profile["last_weekly"] = current_time
-    save_career_stats()
-    logger.info(f"User {user_id} claimed 500 Zcoins (weekly)")
+    mark_profile_dirty(user_id)
+    flush_career_stats()
+    logger.info(f"User {user_id} claimed {amount} Zcoins (weekly)")
     embed = discord.Embed(
         title="🎉 Weekly Reward Claimed!",
-        description=f"You received **500** {zcoin_emoji}!",
+        description=f"You received **{amount}** {zcoin_emoji}!",
         color=discord.Color.green()
     )
     embed.set_footer(text="Come back next week for more!")
@@ -1945,21 +2000,23 @@ async def weekly(ctx):
 @bot.command()
 async def monthly(ctx):
     user_id = ctx.author.id
+    await load_player_profiles([user_id])
     profile = get_player_profile(user_id)
     zcoin_emoji = get_zcoin_emoji(ctx)
     current_time = time.time()
-    cooldown = 30 * 24 * 3600  # 30 days
+    amount, cooldown = ZCOIN_CLAIMS["monthly"]
     if current_time - profile["last_monthly"] < cooldown:
         remaining = cooldown - (current_time - profile["last_monthly"])
         await ctx.send(f"⏳ Wait **{format_cooldown(remaining)}** to claim your next monthly reward!")
         return
-    profile["zcoins"] += 2000
+    profile["zcoins"] += amount
     profile["last_monthly"] = current_time
-    save_career_stats()
-    logger.info(f"User {user_id} claimed 2000 Zcoins (monthly)")
+    mark_profile_dirty(user_id)
+    flush_career_stats()
+    logger.info(f"User {user_id} claimed {amount} Zcoins (monthly)")
     embed = discord.Embed(
         title="🎉 Monthly Reward Claimed!",
-        description=f"You received **2000** {zcoin_emoji}!",
+        description=f"You received **{amount}** {zcoin_emoji}!",
         color=discord.Color.green()
     )
     embed.set_footer(text="Come back next month for more!")
@@ -1981,6 +2038,7 @@ class StatsView(View):
 
         # Fetch profile and calculate stats (same as original)
         user_id = interaction.user.id
+        await load_player_profiles([user_id])
         profile = get_player_profile(user_id)
         stats = {
             "top_speed": 0,
@@ -2041,6 +2099,7 @@ async def stats(ctx):
 @bot.command(name="upgrade")
 async def upgrade(ctx, part: str):
     user_id = ctx.author.id
+    await load_player_profiles([user_id])
     profile = get_player_profile(user_id)
     part = part.lower()
     valid_parts = ["engine", "aero", "tyres", "chassis", "gearbox", "suspension"]
@@ -2054,18 +2113,16 @@ async def upgrade(ctx, part: str):
         await ctx.send("Check your DMs for the upgrade result!")
         return
     part_level = profile["car_parts"][part]
-    if part_level >= 100:
+    if part_level >= PART_MAX_LEVEL:
         embed = discord.Embed(
             title="❌ Max Level Reached",
-            description=f"Your {part} is already at the maximum level (100)!",
+            description=f"Your {part} is already at the maximum level ({PART_MAX_LEVEL})!",
             color=discord.Color.red()
         )
         await ctx.author.send(embed=embed)
         await ctx.send("Check your DMs for the upgrade result!")
         return
-    # Calculate cost based on number of upgrades for this part
-    upgrade_count = profile["part_upgrade_counts"][part]
-    cost = 500 + (upgrade_count * 100)  # First upgrade: 500, then +100 per upgrade
+    cost = upgrade_cost(profile, part)
     zcoin_emoji = get_zcoin_emoji(ctx)
     if profile["zcoins"] < cost:
         embed = discord.Embed(
@@ -2107,10 +2164,7 @@ async def upgrade(ctx, part: str):
     stats_before["reliability"] += (profile["car_parts"]["chassis"] - 5) / 5 * 6 * scaling_factor
     scaling_factor = 1.0 
     stats_before["reliability"] += (profile["car_parts"]["gearbox"] - 5) / 5 * 4 * scaling_factor
-    # Apply upgrade
-    profile["zcoins"] -= cost
-    profile["car_parts"][part] = min(100, part_level + 5)  # Upgrade by 5 levels, cap at 100
-    profile["part_upgrade_counts"][part] += 1  # Increment upgrade count
+    apply_upgrade(profile, part)
     # Calculate stats after upgrade
     stats_after = {
         "top_speed": 0,
@@ -2148,11 +2202,10 @@ async def upgrade(ctx, part: str):
         change = stats_after[stat] - stats_before[stat]
         if change != 0:
             stat_changes[stat] = change
-    # Calculate next upgrade cost
-    next_upgrade_count = profile["part_upgrade_counts"][part]
-    next_cost = 500 + (next_upgrade_count * 100)
+    next_cost = upgrade_cost(profile, part)
     # Save changes
-    save_career_stats()
+    mark_profile_dirty(user_id)
+    flush_career_stats()
     # Prepare embed
     embed = discord.Embed(
         title=f"✅ {part.capitalize()} Upgraded!",
@@ -2201,6 +2254,7 @@ class GarageView(View):
 
         # Fetch profile and build garage embed (same as original)
         user_id = interaction.user.id
+        await load_player_profiles([user_id])
         profile = get_player_profile(user_id)
         parts = profile["car_parts"]
         zcoin_emoji = get_zcoin_emoji(interaction)
@@ -2290,7 +2344,7 @@ async def tm(ctx):
         await ctx.send(embed=embed)
         return
     lobby = lobbies[channel_id]
-    if lobby["host"] != user_id:
+    if lobby.host != user_id:
         embed = discord.Embed(
             title="🏎️ Permission Denied!",
             description="Only the host can set the race mode.",
@@ -2298,7 +2352,7 @@ async def tm(ctx):
         )
         await ctx.send(embed=embed)
         return
-    if lobby["status"] != "waiting":
+    if lobby.status != "waiting":
         embed = discord.Embed(
             title="🏎️ Race In Progress!",
             description="You can’t change the race mode after the race has started.",
@@ -2307,8 +2361,8 @@ async def tm(ctx):
         await ctx.send(embed=embed)
         return
     # Toggle race mode between "casual" and "championship"
-    new_mode = "casual" if lobby["race_mode"] == "championship" else "championship"
-    lobby["race_mode"] = new_mode
+    new_mode = "casual" if lobby.race_mode == "championship" else "championship"
+    lobby.race_mode = new_mode
     embed = discord.Embed(
         title="🏎️ Race Mode Updated!",
         description=f"Lobby set to **{new_mode.capitalize()}** mode. {'Leaderboard stats will be updated.' if new_mode == 'championship' else 'Leaderboard stats will not be updated.'}",
@@ -2320,10 +2374,6 @@ async def tm(ctx):
 if not os.path.exists('race_logs.json'):
     with open('race_logs.json', 'w') as f:
         json.dump({
-            "daily": {"races": 0, "solo": 0, "duo": 0, "date": str(datetime.date.today())},
-            "weekly": {"races": 0, "solo": 0, "duo": 0, "week": datetime.date.today().isocalendar()[1]},
-            "monthly": {"races": 0, "solo": 0, "duo": 0, "month": datetime.date.today().month},
-            "yearly": {"races": 0, "solo": 0, "duo": 0, "year": datetime.date.today().year},
             "servers": {
                 "total": 0,
                 "weekly_new": 0,
@@ -2332,19 +2382,24 @@ if not os.path.exists('race_logs.json'):
                 "tracking_start": str(datetime.date.today())
             },
             "server_join_dates": {},
+            "server_leave_dates": {},
             "race_history": []
         }, f, indent=2)
 
+# Race/server counters live in memory and are flushed to race_logs.json in the background
+race_logs = None
+race_logs_dirty = False
+RACE_LOG_FLUSH_INTERVAL = 60  # Seconds between race_logs.json flushes
+RACE_HISTORY_SIZE = 100
+server_index = None  # Sorted join/leave dates over race_logs["server_join_dates"] (analytics.py)
+race_events = RaceEventStore("race_events.bin", "race_rollups.json")  # Per-race events and their rollups (analytics.py)
+
 def load_logs():
     try:
         with open('race_logs.json', 'r') as f:
             return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
         return {
-            "daily": {"races": 0, "solo": 0, "duo": 0, "date": str(datetime.date.today())},
-            "weekly": {"races": 0, "solo": 0, "duo": 0, "week": datetime.date.today().isocalendar()[1]},
-            "monthly": {"races": 0, "solo": 0, "duo": 0, "month": datetime.date.today().month},
-            "yearly": {"races": 0, "solo": 0, "duo": 0, "year": datetime.date.today().year},
             "servers": {
                 "total": 0,
                 "weekly_new": 0,
@@ -2353,115 +2408,114 @@ def load_logs():
                 "tracking_start": str(datetime.date.today())
             },
             "server_join_dates": {},
+            "server_leave_dates": {},
             "race_history": []
         }
 
 def save_logs(logs):
     try:
-        with open('race_logs.json', 'w') as f:
-            json.dump(logs, f, indent=2)
+        write_json_atomic('race_logs.json', logs)
     except Exception as e:
         logger.error(f"Failed to save logs: {e}")
 
-def update_time_periods(logs):
-    today = datetime.date.today()
-    
-    # Daily check
-    if logs["daily"]["date"] != str(today):
-        logs["daily"] = {"races": 0, "solo": 0, "duo": 0, "date": str(today)}
-    
-    # Weekly check
-    current_week = today.isocalendar()[1]
-    if logs["weekly"]["week"] != current_week:
-        logs["weekly"] = {"races": 0, "solo": 0, "duo": 0, "week": current_week}
-    
-    # Monthly check
-    current_month = today.month
-    if logs["monthly"]["month"] != current_month:
-        logs["monthly"] = {"races": 0, "solo": 0, "duo": 0, "month": current_month}
-    
-    # Yearly check
-    current_year = today.year
-    if logs["yearly"]["year"] != current_year:
-        logs["yearly"] = {"races": 0, "solo": 0, "duo": 0, "year": current_year}
-    
-    return logs
+def load_race_logs():
+    global race_logs, server_index
+    logs = load_logs()
+    server_index = ServerJoinIndex(logs["server_join_dates"], logs.setdefault("server_leave_dates", {}))
+    logs["race_history"] = deque(logs.get("race_history", []), maxlen=RACE_HISTORY_SIZE)
+    # Race counts per period now come from the race_events rollups
+    for key in ("daily", "weekly", "monthly", "yearly"):
+        logs.pop(key, None)
+    race_logs = logs
+    logger.info(f"✅ Loaded race_logs.json (History: {len(race_logs['race_history'])})")
+
+def mark_race_logs_dirty():
+    global race_logs_dirty
+    race_logs_dirty = True
+
+def snapshot_race_logs():
+    # Copy on the event loop so the worker never serialises counters that are still changing
+    return {
+        key: list(value) if isinstance(value, deque) else dict(value) if isinstance(value, dict) else value
+        for key, value in race_logs.items()
+    }
+
+def flush_race_logs():
+    global race_logs_dirty
+    if race_logs is None or not race_logs_dirty:
+        return None  # Nothing to write, no trip through the worker
+    race_logs_dirty = False
+    return persistence.submit(save_logs, snapshot_race_logs())
+
+async def autosave_race_logs():
+    while True:
+        await asyncio.sleep(RACE_LOG_FLUSH_INTERVAL)
+        for flush in (flush_race_logs, flush_user_names):
+            pending = flush()
+            if pending is not None:
+                await pending
+        await persistence.submit(race_events.checkpoint)
 
 @bot.event
 async def on_guild_join(guild):
-    logs = load_logs()
-    logs = update_time_periods(logs)
-    
-    # Update server counts
-    logs["servers"]["total"] = len(bot.guilds)
-    
-    # Track new server joins
+    record_guild_join(guild.id, len(bot.guilds))
+
+@bot.event
+async def on_guild_remove(guild):
+    record_guild_remove(guild.id, len(bot.guilds))
+
+def record_guild_join(guild_id, guild_count):
+    race_logs["servers"]["total"] = guild_count
+    server_index.join(guild_id, datetime.date.today())
+    refresh_server_counts()
+    mark_race_logs_dirty()
+
+def record_guild_remove(guild_id, guild_count):
+    race_logs["servers"]["total"] = guild_count
+    server_index.leave(guild_id, datetime.date.today())
+    refresh_server_counts()
+    mark_race_logs_dirty()
+
+def refresh_server_counts():
+    # Each count is a bisect over the sorted join/leave dates; periods start where !logs starts them
     today = datetime.date.today()
-    join_date = str(today)
-    logs["server_join_dates"][str(guild.id)] = join_date
-    
-    # Calculate new joins for time periods
-    weekly_new = 0
-    monthly_new = 0
-    yearly_new = 0
-    current_week = today.isocalendar()[1]
-    current_month = today.month
-    current_year = today.year
-    
-    for server_id, join_date_str in logs["server_join_dates"].items():
-        join_date = datetime.date.fromisoformat(join_date_str)
-        if (today - join_date).days <= 7:
-            weekly_new += 1
-        if join_date.month == current_month and join_date.year == current_year:
-            monthly_new += 1
-        if join_date.year == current_year:
-            yearly_new += 1
-    
-    logs["servers"]["weekly_new"] = weekly_new
-    logs["servers"]["monthly_new"] = monthly_new
-    logs["servers"]["yearly_new"] = yearly_new
-    
-    save_logs(logs)
+    servers = race_logs["servers"]
+    for period in ("weekly", "monthly", "yearly"):
+        since = period_start_date(period, today)
+        servers[f"{period}_new"] = server_index.joined_since(since)
+        servers[f"{period}_left"] = server_index.left_since(since)
 
 def log_race(mode, channel_id=None):
-    logs = load_logs()
-    logs = update_time_periods(logs)
-    
-    # Update race counts
-    logs["daily"]["races"] += 1
-    logs["weekly"]["races"] += 1
-    logs["monthly"]["races"] += 1
-    logs["yearly"]["races"] += 1
-    
-    # Update mode counts
-    if mode == "solo":
-        logs["daily"]["solo"] += 1
-        logs["weekly"]["solo"] += 1
-        logs["monthly"]["solo"] += 1
-        logs["yearly"]["solo"] += 1
-    else:  # duo
-        logs["daily"]["duo"] += 1
-        logs["weekly"]["duo"] += 1
-        logs["monthly"]["duo"] += 1
-        logs["yearly"]["duo"] += 1
+    logs = race_logs
     
     # Add to race history if channel_id is provided
     if channel_id:
+        # The deque keeps only the last RACE_HISTORY_SIZE races
         logs["race_history"].append({
             "timestamp": str(datetime.datetime.now()),
             "mode": mode,
             "channel_id": channel_id
         })
-        # Keep only the last 100 races in history
-        if len(logs["race_history"]) > 100:
-            logs["race_history"] = logs["race_history"][-100:]
-    
-    save_logs(logs)
+        mark_race_logs_dirty()
+    return logs
+
+def period_start_date(time_period, today):
+    if time_period == "daily":
+        return today
+    if time_period == "weekly":
+        return today - datetime.timedelta(days=today.weekday())  # Monday
+    if time_period == "monthly":
+        return today.replace(day=1)
+    return today.replace(month=1, day=1)
+
+def period_start(time_period, now):
+    return utc_midnight(period_start_date(time_period, now.date()))
+
+def utc_midnight(date):
+    return datetime.datetime.combine(date, datetime.time(), tzinfo=datetime.timezone.utc).timestamp()
 
 @bot.command()
-async def logs(ctx, time_period: str = None):
-    logs = load_logs()
-    
+async def logs(ctx, time_period: str = None, *args):
     if not time_period:
         # Show log options
         embed = discord.Embed(
@@ -2469,19 +2523,67 @@ async def logs(ctx, time_period: str = None):
             description="Select a time period to view logs:",
             color=discord.Color.blue()
         )
-        embed.add_field(name="Options", value="`!logs daily`\n`!logs weekly`\n`!logs monthly`\n`!logs yearly`", inline=False)
+        embed.add_field(
+            name="Options",
+            value="`!logs daily`\n`!logs weekly`\n`!logs monthly`\n`!logs yearly`\n"
+                  "`!logs range YYYY-MM-DD [YYYY-MM-DD]`\n`!logs guilds [daily|weekly|monthly|yearly]`",
+            inline=False
+        )
         await ctx.send(embed=embed)
         return
     
     time_period = time_period.lower()
     valid_periods = ["daily", "weekly", "monthly", "yearly"]
+    now = datetime.datetime.now(datetime.timezone.utc)  # Rollups are bucketed on UTC hours/days
+    
+    if time_period == "range":
+        try:
+            start_date = datetime.date.fromisoformat(args[0])
+            end_date = datetime.date.fromisoformat(args[1]) if len(args) > 1 else start_date
+        except (IndexError, ValueError):
+            await ctx.send("❌ Usage: `!logs range YYYY-MM-DD [YYYY-MM-DD]`")
+            return
+        if end_date < start_date:
+            start_date, end_date = end_date, start_date
+        data = await persistence.submit(race_events.summary, utc_midnight(start_date), utc_midnight(end_date) + 86400)
+        embed = discord.Embed(title=f"📊 Logs {start_date} → {end_date}", color=discord.Color.green())
+        embed.add_field(name="Races Completed", value=str(data["races"]), inline=True)
+        embed.add_field(name="Solo Races", value=str(data["solo"]), inline=True)
+        embed.add_field(name="Duo Races", value=str(data["duo"]), inline=True)
+        if data["races"]:
+            embed.add_field(name="Avg Players", value=f"{data['players'] / data['races']:.1f}", inline=True)
+            embed.add_field(name="Avg Race Time", value=format_race_time(data["duration"] / data["races"]), inline=True)
+            embed.add_field(name="Active Servers", value=str(len(data["guilds"])), inline=True)
+        await ctx.send(embed=embed)
+        return
+    
+    if time_period == "guilds":
+        period = args[0].lower() if args else "monthly"
+        if period not in valid_periods:
+            await ctx.send("❌ Invalid time period. Use: daily, weekly, monthly, or yearly")
+            return
+        data = await persistence.submit(race_events.summary, period_start(period, now), now.timestamp())
+        top_guilds = sorted(data["guilds"].items(), key=lambda item: item[1], reverse=True)[:10]
+        lines = []
+        for rank, (guild_id, races) in enumerate(top_guilds, 1):
+            guild = bot.get_guild(guild_id)
+            lines.append(f"**{rank}.** {guild.name if guild else guild_id} — {races} races")
+        embed = discord.Embed(
+            title=f"📊 {period.capitalize()} Races by Server",
+            description="\n".join(lines) or "No races recorded in this period.",
+            color=discord.Color.green()
+        )
+        embed.set_footer(text=f"{data['races']} races across {len(data['guilds'])} servers")
+        await ctx.send(embed=embed)
+        return
     
     if time_period not in valid_periods:
-        await ctx.send("❌ Invalid time period. Use: daily, weekly, monthly, or yearly")
+        await ctx.send("❌ Invalid time period. Use: daily, weekly, monthly, yearly, range or guilds")
         return
     
-    data = logs[time_period]
-    servers = logs["servers"]
+    data = await persistence.submit(race_events.summary, period_start(time_period, now), now.timestamp())
+    refresh_server_counts()
+    servers = race_logs["servers"]
     
     embed = discord.Embed(
         title=f"📊 {time_period.capitalize()} Logs",
@@ -2492,23 +2594,27 @@ async def logs(ctx, time_period: str = None):
     embed.add_field(name="Solo Races", value=str(data["solo"]), inline=True)
     embed.add_field(name="Duo Races", value=str(data["duo"]), inline=True)
     
+    today = now.date()
     if time_period == "daily":
-        embed.add_field(name="Date", value=data["date"], inline=False)
+        embed.add_field(name="Date", value=str(today), inline=False)
     elif time_period == "weekly":
-        embed.add_field(name="Week Number", value=data["week"], inline=False)
+        embed.add_field(name="Week Number", value=today.isocalendar()[1], inline=False)
     elif time_period == "monthly":
-        embed.add_field(name="Month", value=data["month"], inline=False)
+        embed.add_field(name="Month", value=today.month, inline=False)
     elif time_period == "yearly":
-        embed.add_field(name="Year", value=data["year"], inline=False)
+        embed.add_field(name="Year", value=today.year, inline=False)
     
     embed.add_field(name="Total Servers", value=str(servers["total"]), inline=True)
     
     if time_period == "weekly":
         embed.add_field(name="New Servers This Week", value=str(servers["weekly_new"]), inline=True)
+        embed.add_field(name="Servers Left This Week", value=str(servers["weekly_left"]), inline=True)
     elif time_period == "monthly":
         embed.add_field(name="New Servers This Month", value=str(servers["monthly_new"]), inline=True)
+        embed.add_field(name="Servers Left This Month", value=str(servers["monthly_left"]), inline=True)
     elif time_period == "yearly":
         embed.add_field(name="New Servers This Year", value=str(servers["yearly_new"]), inline=True)
+        embed.add_field(name="Servers Left This Year", value=str(servers["yearly_left"]), inline=True)
     
     await ctx.send(embed=embed)
 
@@ -2516,46 +2622,33 @@ async def logs(ctx, time_period: str = None):
 @bot.event
 async def on_ready():
     logger.info("Starting bot initialization...")
-    load_career_stats()
-    load_banned_users()
-    migrate_to_car_parts()
-    
-    # Initialize server counts in logs
-    logs = load_logs()
-    logs["servers"]["total"] = len(bot.guilds)
-    
-    # Check for new servers that haven't been tracked yet
-    for guild in bot.guilds:
-        if str(guild.id) not in logs["server_join_dates"]:
-            logs["server_join_dates"][str(guild.id)] = str(datetime.date.today())
-    
-    # Recalculate new server counts
-    today = datetime.date.today()
-    weekly_new = 0
-    monthly_new = 0
-    yearly_new = 0
-    current_week = today.isocalendar()[1]
-    current_month = today.month
-    current_year = today.year
-    
-    for server_id, join_date_str in logs["server_join_dates"].items():
-        join_date = datetime.date.fromisoformat(join_date_str)
-        if (today - join_date).days <= 7:
-            weekly_new += 1
-        if join_date.month == current_month and join_date.year == current_year:
-            monthly_new += 1
-        if join_date.year == current_year:
-            yearly_new += 1
-    
-    logs["servers"]["weekly_new"] = weekly_new
-    logs["servers"]["monthly_new"] = monthly_new
-    logs["servers"]["yearly_new"] = yearly_new
-    
-    save_logs(logs)
+    if race_logs is None:  # on_ready fires again after every reconnect
+        await persistence.submit(load_career_stats)
+        await persistence.submit(load_banned_users)
+        await persistence.submit(load_user_names)
+        await persistence.submit(load_race_logs)
+        await persistence.submit(race_events.open)
+        # Start autosave tasks
+        bot.loop.create_task(autosave_career_stats())
+        bot.loop.create_task(autosync_career_journal())
+        bot.loop.create_task(autosave_race_logs())
+    sync_server_counts([guild.id for guild in bot.guilds])
     
     logger.info(f'🚀 {bot.user} has connected to Discord!')
-    # Start autosave task
-    bot.loop.create_task(autosave_career_stats())
+
+def sync_server_counts(guild_ids):
+    # Reconcile with the guilds Discord reports: anything joined or left while the bot was offline
+    logs = race_logs
+    logs["servers"]["total"] = len(guild_ids)
+    today = datetime.date.today()
+    current = {str(guild_id) for guild_id in guild_ids}
+    for guild_id in current:
+        if guild_id not in server_index:
+            server_index.join(guild_id, today)
+    for guild_id in [guild_id for guild_id in logs["server_join_dates"] if guild_id not in current]:
+        server_index.leave(guild_id, today)
+    refresh_server_counts()
+    mark_race_logs_dirty()
 
 def is_authorized():
     def predicate(ctx):
@@ -2575,10 +2668,12 @@ async def givecoins(ctx, member: discord.Member, amount: int):
         )
         await ctx.send(embed=embed)
         return
+    await load_player_profiles([member.id])
     profile = get_player_profile(member.id)
     zcoin_emoji = get_zcoin_emoji(ctx)
     profile["zcoins"] += amount
-    save_career_stats()
+    mark_profile_dirty(member.id)
+    flush_career_stats()
     logger.info(f"User {ctx.author.id} granted {amount} Zcoins to {member.id}")
     embed = discord.Embed(
         title="💰 Zcoins Granted",
@@ -2595,8 +2690,9 @@ async def givecoins(ctx, member: discord.Member, amount: int):
 @is_authorized()
 async def resetprofile(ctx, member: discord.Member):
     user_id = member.id
-    career_stats[user_id] = default_player_profile.copy()
-    save_career_stats()
+    career_stats[user_id] = new_player_profile()
+    mark_profile_dirty(user_id)
+    flush_career_stats()
     logger.info(f"User {ctx.author.id} reset profile for {user_id}")
     embed = discord.Embed(
         title="✅ Profile Reset",
@@ -2638,6 +2734,29 @@ async def ban(ctx, member: discord.Member):
     except discord.Forbidden:
         logger.warning(f"Could not DM {member.id} about ban")
 
+@bot.command()
+@is_authorized()
+async def reloadphysics(ctx):
+    previous = current_physics().version
+    try:
+        physics = await persistence.submit(reload_physics)
+    except (IOError, OSError, ValueError) as e:
+        logger.error(f"Physics reload by {ctx.author.id} failed: {e}")
+        embed = discord.Embed(
+            title="❌ Physics Reload Failed",
+            description=f"`{e}`\nStill racing with physics version **{previous}**.",
+            color=discord.Color.red()
+        )
+        await ctx.send(embed=embed)
+        return
+    logger.info(f"User {ctx.author.id} reloaded physics: version {previous} -> {physics.version}")
+    embed = discord.Embed(
+        title="⚙️ Physics Reloaded",
+        description=f"Physics version **{previous}** → **{physics.version}**. Races already running keep their current tables.",
+        color=discord.Color.green()
+    )
+    await ctx.send(embed=embed)
+
 CONTROLLED_ROLE_ID = 1382072723143921684
 
 @bot.command()
@@ -2660,5 +2779,14 @@ async def pingrole(ctx):
     role_cooldowns[role.id] = now
     await ctx.send(f"{role.mention} has been pinged!")
 
-
-
+def main():
+    token = os.environ.get("DISCORD_TOKEN")
+    if not token:
+        logger.error("❌ DISCORD_TOKEN is not set")
+        return 1
+    bot.run(token, log_handler=None)  # Logging is already configured above
+    return 0
+
+# !predict's worker processes import the main module too: only a direct run starts the bot
+if __name__ == "__main__":
+    sys.exit(main())
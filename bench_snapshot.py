@@ -0,0 +1,95 @@
+import argparse
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from profiles import default_player_profile
+from snapshot import PART_NAMES, BinarySnapshot, read_binary_snapshot, write_binary_snapshot
+
+# Startup load benchmark: pretty-printed career_stats.json (json.loads + default back-fill,
+# as load_career_stats() does it) against the binary snapshot, fully decoded and index-only.
+#
+#   python bench_snapshot.py                       # 10k, 100k and 1M profiles
+#   python bench_snapshot.py --sizes 10000,100000
+
+def make_profiles(count, rng):
+    profiles = {}
+    for _ in range(count):
+        races = rng.randint(0, 500)
+        profiles[rng.randrange(10**17, 10**19)] = {
+            "races": races, "wins": rng.randint(0, races), "podiums": rng.randint(0, races),
+            "dnfs": rng.randint(0, races), "fastest_lap": rng.choice([None, rng.uniform(60, 110)]),
+            "total_time": rng.uniform(0, 10**6), "points": rng.randint(0, 10**4), "zcoins": rng.randint(0, 10**5),
+            "last_daily": time.time(), "last_weekly": 0, "last_monthly": 0,
+            "car_parts": {part: rng.randrange(5, 101, 5) for part in PART_NAMES},
+            "part_upgrade_counts": {part: rng.randint(0, 19) for part in PART_NAMES},
+            "tournament_stats": {"points": rng.randint(0, 2000), "wins": rng.randint(0, 50), "podiums": rng.randint(0, 100)}
+        }
+    return profiles
+
+def load_json(path):
+    with open(path, "r") as f:
+        data = json.loads(f.read())
+    profiles = {int(k): v for k, v in data.items()}
+    for profile in profiles.values():
+        for key, value in default_player_profile.items():
+            if key not in profile:
+                profile[key] = value
+            elif isinstance(value, dict):
+                for subkey, subvalue in value.items():
+                    if subkey not in profile[key]:
+                        profile[key][subkey] = subvalue
+    return profiles
+
+def open_binary_index(path, lookups):
+    snapshot = BinarySnapshot(path)
+    try:
+        return [snapshot.get(user_id) for user_id in lookups]
+    finally:
+        snapshot.close()
+
+def measure(func, *args):
+    gc.collect()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark career_stats startup load: JSON vs binary snapshot.")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    print(f"{'profiles':>10} {'format':<20} {'file MB':>8} {'load s':>8} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in (int(size) for size in args.sizes.split(",")):
+            profiles = make_profiles(count, rng)
+            json_path = os.path.join(tmp, "career_stats.json")
+            bin_path = os.path.join(tmp, "career_stats.bin")
+            with open(json_path, "w") as f:
+                json.dump(profiles, f, indent=2)
+            write_binary_snapshot(bin_path, profiles)
+            lookups = rng.sample(list(profiles), min(1000, count))
+            del profiles
+            rows = [
+                ("json", json_path, measure(load_json, json_path)),
+                ("binary (full)", bin_path, measure(read_binary_snapshot, bin_path)),
+                (f"binary ({len(lookups)} gets)", bin_path, measure(open_binary_index, bin_path, lookups)),
+            ]
+            for name, path, (elapsed, peak) in rows:
+                print(f"{count:>10} {name:<20} {os.path.getsize(path) / 2**20:>8.1f} {elapsed:>8.3f} {peak / 2**20:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import logging
+import os
+import sys
+
+from storage import STORAGE_BACKENDS, open_profile_store
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("F1Bot")
+
+# One-shot copy of career stats between storage backends, e.g.
+#   python migrate_storage.py json sqlite
+#   python migrate_storage.py json sqlite --snapshot-format binary   # SNAPSHOT_FORMAT = "binary" installs
+# The stores are opened with the same files as app.py (STORAGE_BACKEND / SNAPSHOT_FORMAT); pass
+# the paths explicitly if the bot was configured differently.
+# Stop the bot first so nothing writes to either store while this runs.
+
+def store_options(backend, args):
+    if backend == "sqlite":
+        return {"path": args.database}
+    snapshot = args.snapshot or ("career_stats.bin" if args.snapshot_format == "binary" else "career_stats.json")
+    return {"path": snapshot, "journal_path": args.journal, "snapshot_format": args.snapshot_format}
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy Formula Z career stats from one storage backend to another.")
+    parser.add_argument("source", choices=sorted(STORAGE_BACKENDS))
+    parser.add_argument("target", choices=sorted(STORAGE_BACKENDS))
+    parser.add_argument("--force", action="store_true", help="merge into a target that already holds profiles")
+    parser.add_argument("--snapshot-format", choices=["json", "binary"], default="json", help="the app's SNAPSHOT_FORMAT")
+    parser.add_argument("--snapshot", help="json store snapshot (default: career_stats.json, or career_stats.bin for binary)")
+    parser.add_argument("--journal", default="career_stats.journal", help="json store journal")
+    parser.add_argument("--database", default="career_stats.db", help="sqlite store database")
+    args = parser.parse_args()
+    if args.source == args.target:
+        parser.error("source and target backends must differ")
+
+    source_options = store_options(args.source, args)
+    if not os.path.exists(source_options["path"]):
+        logger.error(f"❌ {source_options['path']} not found: check --snapshot-format/--snapshot/--database match the bot's configuration")
+        return 1
+    source = open_profile_store(args.source, **source_options)
+    profiles = source.load_all()
+    source.close()
+    if not profiles:
+        logger.warning(f"No profiles found in the {args.source} store, nothing to migrate")
+        return 1
+
+    target = open_profile_store(args.target, **store_options(args.target, args))
+    target.open()
+    existing = target.count()
+    if existing and not args.force:
+        logger.error(f"The {args.target} store already holds {existing} profiles, re-run with --force to merge")
+        target.close()
+        return 1
+    ok = target.write(profiles) and target.compact()
+    count = target.count()
+    target.close()
+    if not ok:
+        logger.error(f"❌ Migration from {args.source} to {args.target} failed")
+        return 1
+    logger.info(f"✅ Migrated {len(profiles)} profiles from {args.source} to {args.target} (Target entries: {count})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
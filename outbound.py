@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger("F1Bot")
+
+# Outbound scheduler for Discord writes. Every race-time send or edit is submitted as a job on
+# a route (a channel or a user's DMs) with a priority, and a dispatcher hands jobs out in
+# priority order as the route's token bucket and the global bucket allow, so a busy route
+# never holds up the others and a flood of panel refreshes can't delay a race's results.
+# Under pressure low-priority traffic degrades instead of queueing up:
+#
+#   merge_key   a queued job with the same key is replaced by the newer one (newest frame wins);
+#               every merged caller waits on its own future, so cancelling one leaves the others
+#   deadline    a job still queued at its deadline is dropped; its caller gets DROPPED
+#
+# The buckets are what keeps race traffic under Discord's limits. discord.py sleeps through a 429
+# inside the request and retries it (up to 5 times) before raising, holding the job's in-flight
+# slot all along, so the scheduler only sees the rare 429 the library gave up on. The default
+# rates are therefore set so that no window can exceed Discord's limits: a bucket allows at most
+# burst + rate * window writes in any window, 1 + 0.8 * 5 = 5 per 5s on a route and 10 + 40 = 50
+# per second overall. A 429 that does surface pauses the route (or every route, for a global
+# limit) for the retry-after the response reported and puts the job back at the front of its queue.
+
+RESULTS, ALERT, STATUS, PANEL = range(4)  # Priorities, most urgent first
+PRIORITY_NAMES = ("results", "alert", "status", "panel")
+ROUTE_RATE = 0.8  # Writes per second per channel/DM route (Discord: 5 per 5s)
+ROUTE_BURST = 1
+GLOBAL_RATE = 40.0  # Writes per second across all routes (Discord: 50/s)
+GLOBAL_BURST = 10
+DROPPED = object()
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate  # Tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        # Seconds until a token is available
+        self.refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self.refill(now)
+        self.tokens -= 1
+
+    def pause(self, until, remaining=0):
+        self.paused_until = max(self.paused_until, until)
+        self.tokens = min(self.tokens, remaining)
+
+class OutboundJob:
+    __slots__ = ("route", "priority", "send", "merge_key", "deadline", "waiters")
+
+    def __init__(self, route, priority, send, merge_key, deadline, waiter):
+        self.route = route
+        self.priority = priority
+        self.send = send
+        self.merge_key = merge_key
+        self.deadline = deadline
+        self.waiters = [waiter]  # One future per caller
+
+    def abandoned(self):
+        # Every caller was cancelled
+        return all(waiter.done() for waiter in self.waiters)
+
+class OutboundScheduler:
+    # rate_limit(error) returns (retry_after seconds, is_global) for a rate-limit error and None for
+    # anything else, which is passed on to the caller
+    def __init__(self, rate_limit, route_rate=ROUTE_RATE, route_burst=ROUTE_BURST, global_rate=GLOBAL_RATE, global_burst=GLOBAL_BURST, max_in_flight=16):
+        self.rate_limit = rate_limit
+        self.route_rate = route_rate
+        self.route_burst = route_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.buckets = {}  # route -> TokenBucket
+        self.queues = [deque() for _ in PRIORITY_NAMES]
+        self.merged = {}  # merge_key -> queued job
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.wakeup = None
+        self.task = None
+        self.stats = {"sent": 0, "merged": 0, "dropped": 0, "rate_limited": 0}
+
+    def bucket(self, route):
+        bucket = self.buckets.get(route)
+        if bucket is None:
+            bucket = self.buckets[route] = TokenBucket(self.route_rate, self.route_burst)
+        return bucket
+
+    def submit(self, route, priority, send, merge_key=None, deadline=None):
+        # send: a zero-argument coroutine function doing the actual write. Returns a future with
+        # its result, or DROPPED. deadline is in seconds from now.
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        if deadline is not None:
+            deadline = time.monotonic() + deadline
+        queued = self.merged.get(merge_key) if merge_key is not None else None
+        if queued is not None:
+            queued.send = send  # Takes the older job's place in the queue; both callers get the newest result
+            queued.deadline = deadline
+            queued.waiters.append(waiter)
+            self.stats["merged"] += 1
+            return waiter
+        job = OutboundJob(route, priority, send, merge_key, deadline, waiter)
+        self.queues[priority].append(job)
+        if merge_key is not None:
+            self.merged[merge_key] = job
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self.dispatch())
+        self.wakeup.set()
+        return waiter
+
+    async def send(self, route, priority, send, merge_key=None, deadline=None):
+        return await self.submit(route, priority, send, merge_key, deadline)
+
+    def next_job(self, now):
+        # The most urgent job whose route can send now, or the seconds until one can
+        wait = None
+        global_wait = self.global_bucket.wait_time(now)
+        for queue in self.queues:
+            for job in list(queue):
+                if job.abandoned():
+                    self.unqueue(queue, job)
+                    continue
+                if job.deadline is not None and now >= job.deadline:
+                    self.unqueue(queue, job)
+                    self.finish(job, DROPPED)
+                    self.stats["dropped"] += 1
+                    continue
+                route_wait = max(global_wait, self.bucket(job.route).wait_time(now))
+                if route_wait == 0:
+                    self.unqueue(queue, job)
+                    return job, 0.0
+                wait = route_wait if wait is None else min(wait, route_wait)
+        return None, wait
+
+    async def dispatch(self):
+        while True:
+            self.wakeup.clear()
+            now = time.monotonic()
+            job, wait = self.next_job(now)
+            if job is None:
+                if wait is None and not any(self.queues):
+                    await self.wakeup.wait()
+                    continue
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.global_bucket.take(now)
+            self.bucket(job.route).take(now)
+            await self.in_flight.acquire()
+            asyncio.create_task(self.run(job))
+
+    async def run(self, job):
+        try:
+            result = await job.send()
+        except Exception as e:
+            limited = self.rate_limit(e)
+            if limited is None:
+                for waiter in job.waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                return
+            retry_after, is_global = limited
+            self.stats["rate_limited"] += 1
+            logger.warning(f"Rate limited on {job.route} ({PRIORITY_NAMES[job.priority]}), pausing {'all routes' if is_global else 'the route'} for {retry_after:.2f}s")
+            bucket = self.global_bucket if is_global else self.bucket(job.route)
+            bucket.pause(time.monotonic() + retry_after)
+            self.requeue(job)
+            return
+        finally:
+            self.in_flight.release()
+        self.stats["sent"] += 1
+        self.finish(job, result)
+
+    def unqueue(self, queue, job):
+        queue.remove(job)
+        if job.merge_key is not None and self.merged.get(job.merge_key) is job:
+            del self.merged[job.merge_key]
+
+    def requeue(self, job):
+        queued = self.merged.get(job.merge_key) if job.merge_key is not None else None
+        if queued is not None:
+            # A newer frame is already waiting: it replaces this one
+            self.finish(job, DROPPED)
+            return
+        self.queues[job.priority].appendleft(job)
+        if job.merge_key is not None:
+            self.merged[job.merge_key] = job
+        self.wakeup.set()
+
+    def finish(self, job, result):
+        for waiter in job.waiters:
+            if not waiter.done():
+                waiter.set_result(result)
+
+    def pending(self):
+        return {name: len(queue) for name, queue in zip(PRIORITY_NAMES, self.queues)}
@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from profiles import PART_NAMES
+from race_engine import (
+    BALANCED, F1_POINTS, PUSH, SAVE, STRATEGY_CODES, TRACKS_INFO, TYRE_CODES, WEATHER_INDEX, WEATHER_OPTIONS,
+    car_modifiers, create_engine, current_physics, pit_when_worn, random_car_parts
+)
+
+logger = logging.getLogger("F1Bot")
+
+# Monte Carlo race predictor. A prediction runs PREDICT_RUNS headless races of a lobby's
+# track, weather and grid in a process pool and reports per-driver win/podium/DNF rates.
+# Every simulated driver starts on a random strategy/tyre from START_OPTIONS, so the same
+# runs also give the expected points gain of each start choice over the driver's average.
+#
+#   python predictor.py --track Monaco --drivers 6 --runs 2000
+
+PREDICT_RUNS = 2000
+PREDICT_CHUNK = 250  # Races per worker job
+PREDICTION_CACHE_SIZE = 64
+START_OPTIONS = [(strategy, tyre) for strategy in (BALANCED, PUSH, SAVE) for tyre in range(len(TYRE_CODES))]
+
+def new_tally(players):
+    return {pid: {"wins": 0, "podiums": 0, "dnfs": 0, "points": 0, "starts": [[0, 0] for _ in START_OPTIONS]} for pid in players}
+
+def simulate_runs(track, players, modifiers, weather, weather_window, runs, seed, physics):
+    # Runs in a worker process: only plain counters travel back
+    rng = random.Random(seed)
+    tally = new_tally(players)
+    for _ in range(runs):
+        engine = create_engine(track, players, modifiers, weather, weather_window, position_order=rng.sample(players, len(players)), rng=rng, physics=physics)
+        starts = {pid: rng.randrange(len(START_OPTIONS)) for pid in players}
+        for pid, option in starts.items():
+            engine.set_strategy(pid, *START_OPTIONS[option])
+        while not engine.finished:
+            pit_when_worn(engine)
+            engine.step()
+        positions = {pid: pos for pos, pid in enumerate(engine.position_order, 1)}
+        for pid in players:
+            counts = tally[pid]
+            pos = positions.get(pid)
+            points = F1_POINTS.get(pos, 0)
+            if pos is None:
+                counts["dnfs"] += 1
+            elif pos <= 3:
+                counts["podiums"] += 1
+                counts["wins"] += pos == 1
+            counts["points"] += points
+            start = counts["starts"][starts[pid]]
+            start[0] += 1
+            start[1] += points
+    return tally
+
+def merge_tallies(total, tally):
+    for pid, counts in tally.items():
+        merged = total[pid]
+        for key in ("wins", "podiums", "dnfs", "points"):
+            merged[key] += counts[key]
+        for merged_start, start in zip(merged["starts"], counts["starts"]):
+            merged_start[0] += start[0]
+            merged_start[1] += start[1]
+    return total
+
+def summarize(tally, runs):
+    drivers = {}
+    for pid, counts in tally.items():
+        average = counts["points"] / runs
+        gains = {
+            option: (points / races - average if races else None)
+            for option, (races, points) in zip(START_OPTIONS, counts["starts"])
+        }
+        drivers[pid] = {
+            "win": counts["wins"] / runs, "podium": counts["podiums"] / runs, "dnf": counts["dnfs"] / runs,
+            "points": average, "start_gains": gains
+        }
+    return {"runs": runs, "drivers": drivers}
+
+def best_start(prediction):
+    gains = {option: gain for option, gain in prediction["start_gains"].items() if gain is not None}
+    if not gains:
+        return None, 0.0
+    option = max(gains, key=gains.get)
+    return option, gains[option]
+
+def worker_context():
+    # Not fork: the bot process runs threads (persistence, discord) whose locks a forked child could
+    # inherit held. The forkserver preloads this module instead of the bot's __main__; each worker
+    # still imports __main__ as __mp_main__, which is why app.py only starts the bot under its
+    # if __name__ == "__main__" guard.
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["predictor"])
+    return context
+
+def chunk_sizes(runs, chunk=PREDICT_CHUNK):
+    return [min(chunk, runs - start) for start in range(0, runs, chunk)]
+
+def parts_signature(players, car_parts):
+    return tuple((pid, tuple(car_parts[pid][part] for part in PART_NAMES)) for pid in sorted(players))
+
+def predict_race(track, players, car_parts, weather, weather_window=None, runs=PREDICT_RUNS, seed=None):
+    # In-process prediction for scripts; the bot goes through RacePredictor
+    conditions = TRACKS_INFO[track]["conditions"]
+    physics = current_physics()
+    modifiers = {pid: car_modifiers(conditions, car_parts[pid], physics) for pid in players}
+    rng = random.Random(seed)
+    tally = new_tally(players)
+    for size in chunk_sizes(runs):
+        merge_tallies(tally, simulate_runs(track, list(players), modifiers, weather, weather_window, size, rng.getrandbits(64), physics))
+    return summarize(tally, runs)
+
+class RacePredictor:
+    # Predictions are cached per (track, weather code, WeatherWindow, car parts of every driver,
+    # physics tables); any change to the lobby, a driver's parts or a physics reload gives a new key. The cache holds the pending
+    # future too, so repeated !predict calls while one is running share it.
+    def __init__(self, workers=None, runs=PREDICT_RUNS, cache_size=PREDICTION_CACHE_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.runs = runs
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.executor = None
+
+    def prediction_key(self, track, players, car_parts, weather, weather_window, physics):
+        return (track, weather, weather_window, parts_signature(players, car_parts), physics)
+
+    async def predict(self, track, players, car_parts, weather, weather_window=None):
+        physics = current_physics()
+        key = self.prediction_key(track, players, car_parts, weather, weather_window, physics)
+        future = self.cache.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.simulate(track, list(players), car_parts, weather, weather_window, physics))
+            self.cache[key] = future
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            if self.cache.get(key) is future:
+                del self.cache[key]  # Don't cache failures
+            raise
+
+    async def simulate(self, track, players, car_parts, weather, weather_window, physics):
+        conditions = TRACKS_INFO[track]["conditions"]
+        modifiers = {pid: car_modifiers(conditions, car_parts[pid], physics) for pid in players}
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            tallies = await asyncio.gather(*(
+                loop.run_in_executor(self.executor, simulate_runs, track, players, modifiers, weather, weather_window, size, random.getrandbits(64), physics)
+                for size in chunk_sizes(self.runs)
+            ))
+        except BrokenProcessPool:
+            logger.error("Prediction worker pool broke, restarting it on the next prediction")
+            self.executor = None
+            raise
+        tally = new_tally(players)
+        for result in tallies:
+            merge_tallies(tally, result)
+        logger.info(f"🔮 Simulated {self.runs} races at {track} for {len(players)} drivers in {time.perf_counter() - started:.2f}s")
+        return summarize(tally, self.runs)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict a Formula Z race with Monte Carlo simulation.")
+    parser.add_argument("--track", choices=sorted(TRACKS_INFO), default="Monaco")
+    parser.add_argument("--drivers", type=int, default=6)
+    parser.add_argument("--runs", type=int, default=PREDICT_RUNS)
+    parser.add_argument("--weather", choices=WEATHER_OPTIONS, default=WEATHER_OPTIONS[0])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    players = list(range(1, args.drivers + 1))
+    car_parts = {pid: random_car_parts(rng) for pid in players}
+    started = time.perf_counter()
+    result = predict_race(args.track, players, car_parts, WEATHER_INDEX[args.weather], runs=args.runs, seed=args.seed)
+    print(f"{args.runs} races at {args.track} in {time.perf_counter() - started:.2f}s")
+    for pid, prediction in sorted(result["drivers"].items(), key=lambda item: -item[1]["win"]):
+        option, gain = best_start(prediction)
+        best = f"best start {STRATEGY_CODES[option[0]]}/{TYRE_CODES[option[1]]} ({gain:+.2f})" if option else "no better start"
+        print(f"driver {pid:>3}: win {prediction['win']:6.1%}  podium {prediction['podium']:6.1%}  dnf {prediction['dnf']:6.1%}  "
+              f"points {prediction['points']:5.2f}  {best}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
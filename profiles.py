@@ -0,0 +1,86 @@
+import copy
+
+# Career profile schema. Every stored profile carries a "schema" version; profiles written
+# by an older bot are brought up to date once, when the store loads them, by running the
+# MIGRATIONS steps newer than their version in order. Nothing walks the profile on access.
+
+PROFILE_SCHEMA_VERSION = 2
+PART_NAMES = ("engine", "aero", "tyres", "chassis", "gearbox", "suspension")
+
+default_player_profile = {
+    "races": 0, "wins": 0, "podiums": 0, "dnfs": 0, "fastest_lap": None, "total_time": 0.0,
+    "points": 0, "zcoins": 0, "last_daily": 0, "last_weekly": 0, "last_monthly": 0,
+    "car_parts": {
+        "engine": 5,
+        "aero": 5,
+        "tyres": 5,
+        "chassis": 5,
+        "gearbox": 5,
+        "suspension": 5
+    },
+    "part_upgrade_counts": {
+        "engine": 0,
+        "aero": 0,
+        "tyres": 0,
+        "chassis": 0,
+        "gearbox": 0,
+        "suspension": 0
+    },
+    "tournament_stats": {
+        "points": 0, "wins": 0, "podiums": 0
+    },
+    "schema": PROFILE_SCHEMA_VERSION
+}
+
+# Zcoin economy, shared by the bot's commands and the offline season simulator (season.py)
+PART_MAX_LEVEL = 100
+PART_UPGRADE_LEVELS = 5  # Levels gained per upgrade
+RACE_ZCOIN_REWARDS = {1: 30, 2: 20, 3: 10}  # Top 3 of races with RACE_ZCOIN_MIN_PLAYERS or more
+RACE_ZCOIN_MIN_PLAYERS = 6
+ZCOIN_CLAIMS = {  # !daily/!weekly/!monthly: (zcoins, cooldown in seconds)
+    "daily": (100, 24 * 3600),
+    "weekly": (500, 7 * 24 * 3600),
+    "monthly": (2000, 30 * 24 * 3600)
+}
+
+def upgrade_cost(profile, part):
+    # First upgrade: 500, then +100 per upgrade of that part
+    return 500 + profile["part_upgrade_counts"][part] * 100
+
+def apply_upgrade(profile, part):
+    profile["zcoins"] -= upgrade_cost(profile, part)
+    profile["car_parts"][part] = min(PART_MAX_LEVEL, profile["car_parts"][part] + PART_UPGRADE_LEVELS)
+    profile["part_upgrade_counts"][part] += 1
+
+def new_player_profile():
+    # deepcopy so new profiles never share the nested car_parts/tournament dicts
+    return copy.deepcopy(default_player_profile)
+
+def add_career_counters(profile):
+    # v1: race counters, economy and reward cooldowns
+    for key in ["races", "wins", "podiums", "dnfs", "points", "zcoins", "last_daily", "last_weekly", "last_monthly"]:
+        profile.setdefault(key, 0)
+    profile.setdefault("total_time", 0.0)
+    profile.setdefault("fastest_lap", None)
+
+def add_car_parts(profile):
+    # v2: car parts, upgrade counts and championship stats (formerly migrate_to_car_parts)
+    for key in ["car_parts", "part_upgrade_counts", "tournament_stats"]:
+        section = profile.setdefault(key, {})
+        for subkey, value in default_player_profile[key].items():
+            section.setdefault(subkey, value)
+
+MIGRATIONS = [
+    (1, add_career_counters),
+    (2, add_car_parts),
+]
+
+def migrate_profile(profile):
+    version = profile.get("schema", 0)
+    if version >= PROFILE_SCHEMA_VERSION:
+        return False
+    for target, step in MIGRATIONS:
+        if version < target:
+            step(profile)
+    profile["schema"] = PROFILE_SCHEMA_VERSION
+    return True
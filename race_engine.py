@@ -0,0 +1,709 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: without NumPy every race uses the pure Python lap loop
+    np = None
+
+logger = logging.getLogger("F1Bot")
+
+# Headless race simulation. RaceEngine owns the lap physics (tyre wear, weather, crashes,
+# safety car, lap times and running order) and knows nothing about Discord: step() simulates
+# one lap and returns what happened as a list of event dicts, which race_loop in app.py renders.
+#
+#   python race_engine.py --races 1000 --drivers 20     # throughput check
+#   python race_engine.py --kernel numpy --drivers 500   # vectorised lap kernel (needs NumPy)
+
+TRACKS_INFO = {
+    "Australia": {"base_lap_time": 96.5, "laps": 58, "conditions": {"speed": "Medium", "acceleration": "Medium", "overtaking": "Medium", "corners": "Moderate"}},
+    "China": {"base_lap_time": 92.7, "laps": 56, "conditions": {"speed": "Medium", "acceleration": "High", "overtaking": "Medium", "corners": "Moderate"}},
+    "Japan": {"base_lap_time": 87.6, "laps": 53, "conditions": {"speed": "Medium", "acceleration": "Medium", "overtaking": "Medium", "corners": "Many"}},
+    "Bahrain": {"base_lap_time": 93.8, "laps": 57, "conditions": {"speed": "High", "acceleration": "Medium", "overtaking": "Easy", "corners": "Moderate"}},
+    "Saudi Arabia": {"base_lap_time": 90.0, "laps": 50, "conditions": {"speed": "High", "acceleration": "Low", "overtaking": "Easy", "corners": "Few"}},
+    "Miami": {"base_lap_time": 91.8, "laps": 57, "conditions": {"speed": "Medium", "acceleration": "Medium", "overtaking": "Medium", "corners": "Moderate"}},
+    "Imola": {"base_lap_time": 93.2, "laps": 63, "conditions": {"speed": "Medium", "acceleration": "Medium", "overtaking": "Hard", "corners": "Many"}},
+    "Monaco": {"base_lap_time": 73.3, "laps": 78, "conditions": {"speed": "Low", "acceleration": "Low", "overtaking": "Hard", "corners": "Many"}},
+    "Spain": {"base_lap_time": 85.5, "laps": 66, "conditions": {"speed": "Medium", "acceleration": "High", "overtaking": "Medium", "corners": "Moderate"}},
+    "Canada": {"base_lap_time": 69.0, "laps": 70, "conditions": {"speed": "High", "acceleration": "Medium", "overtaking": "Easy", "corners": "Few"}},
+    "Austria": {"base_lap_time": 67.2, "laps": 71, "conditions": {"speed": "High", "acceleration": "High", "overtaking": "Easy", "corners": "Few"}},
+    "UK": {"base_lap_time": 90.3, "laps": 52, "conditions": {"speed": "High", "acceleration": "Medium", "overtaking": "Easy", "corners": "Moderate"}},
+    "Belgium": {"base_lap_time": 102.0, "laps": 44, "conditions": {"speed": "High", "acceleration": "High", "overtaking": "Medium", "corners": "Moderate"}},
+    "Hungary": {"base_lap_time": 71.5, "laps": 70, "conditions": {"speed": "Low", "acceleration": "Low", "overtaking": "Hard", "corners": "Many"}},
+    "Netherlands": {"base_lap_time": 67.1, "laps": 72, "conditions": {"speed": "Low", "acceleration": "Medium", "overtaking": "Hard", "corners": "Many"}},
+    "Monza": {"base_lap_time": 83.6, "laps": 53, "conditions": {"speed": "High", "acceleration": "Medium", "overtaking": "Easy", "corners": "Few"}},
+    "Azerbaijan": {"base_lap_time": 95.0, "laps": 51, "conditions": {"speed": "High", "acceleration": "Low", "overtaking": "Medium", "corners": "Moderate"}},
+    "Singapore": {"base_lap_time": 88.0, "laps": 61, "conditions": {"speed": "Low", "acceleration": "Low", "overtaking": "Hard", "corners": "Many"}},
+    "Austin": {"base_lap_time": 85.7, "laps": 56, "conditions": {"speed": "Medium", "acceleration": "High", "overtaking": "Easy", "corners": "Moderate"}},
+    "Mexico": {"base_lap_time": 67.6, "laps": 71, "conditions": {"speed": "Medium", "acceleration": "Medium", "overtaking": "Medium", "corners": "Moderate"}},
+    "Brazil": {"base_lap_time": 73.0, "laps": 71, "conditions": {"speed": "Medium", "acceleration": "High", "overtaking": "Medium", "corners": "Moderate"}},
+    "Las Vegas": {"base_lap_time": 89.5, "laps": 50, "conditions": {"speed": "High", "acceleration": "Low", "overtaking": "Easy", "corners": "Few"}},
+    "Qatar": {"base_lap_time": 91.2, "laps": 57, "conditions": {"speed": "High", "acceleration": "Medium", "overtaking": "Medium", "corners": "Moderate"}},
+    "Abu Dhabi": {"base_lap_time": 90.6, "laps": 55, "conditions": {"speed": "Medium", "acceleration": "Medium", "overtaking": "Medium", "corners": "Moderate"}}
+}
+
+WEATHER_OPTIONS = ["☀️ Sunny", "🌦️ Light Rain", "🌧️ Heavy Rain", "☁️ Cloudy", "🌬️ Windy"]
+
+F1_POINTS = {
+    1: 25, 2: 18, 3: 15, 4: 12, 5: 10, 6: 8, 7: 6, 8: 4, 9: 2, 10: 1
+}
+
+SAFETY_CAR_COOLDOWN = 3  # Laps after the safety car comes in before it can be deployed again
+
+# Race state stores strategy, tyre and weather as small integer codes; these tuples give the names
+STRATEGY_CODES = ("Balanced", "Push", "Save", "Pit Stop")
+TYRE_CODES = ("Soft", "Medium", "Hard", "Intermediate", "Wet")
+BALANCED, PUSH, SAVE, PIT_STOP = range(len(STRATEGY_CODES))
+SOFT, MEDIUM, HARD, INTERMEDIATE, WET = range(len(TYRE_CODES))
+CRASH_TYPES = ("Collision", "Engine Failure", "Gearbox Issue")
+STRATEGY_INDEX = {strategy: i for i, strategy in enumerate(STRATEGY_CODES)}
+TYRE_INDEX = {tyre: i for i, tyre in enumerate(TYRE_CODES)}
+WEATHER_INDEX = {weather: i for i, weather in enumerate(WEATHER_OPTIONS)}
+
+# A weather change between two laps (inclusive), new_weather is a weather code
+WeatherWindow = namedtuple("WeatherWindow", ["start", "end", "new_weather"])
+
+# Track condition levels (TRACKS_INFO "conditions"), in physics table order
+SPEED_LEVELS = ("Low", "Medium", "High")
+OVERTAKING_LEVELS = ("Easy", "Medium", "Hard")
+CORNER_LEVELS = ("Few", "Moderate", "Many")
+
+# Physics coefficients live in physics.json so they can be rebalanced without a deploy.
+# "schema" is the file layout, "version" the balance revision (bump it on every change, replays
+# record it). compile_physics() validates the file and flattens every name-keyed table into
+# tuples indexed by strategy/tyre/weather code or condition level, which is all the lap loop
+# reads. Engines keep the Physics they were created with, so a reload only affects new races.
+PHYSICS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "physics.json")
+PHYSICS_SCHEMA_VERSION = 1
+Physics = namedtuple("Physics", [
+    "version", "pit_penalty", "safety_car_slowdown",
+    "strategy_wear", "strategy_factor", "tyre_wear", "weather_wear", "weather_penalty",  # [strategy], [tyre], [weather][tyre]
+    "track_speed", "overtaking_variance", "overtaking_skill", "corner_tyre_wear",  # [condition level]
+    "collision_risk", "failure_risk"  # [overtaking level][strategy], [crash type - 1][corner level]
+])
+
+def physics_number(value, key, low=0.0, high=None):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < low or (high is not None and value > high):
+        limits = f"between {low} and {high}" if high is not None else f"at least {low}"
+        raise ValueError(f"{key} must be a number {limits}, got {value!r}")
+    return float(value)
+
+def physics_keys(table, key, names):
+    if not isinstance(table, dict):
+        raise ValueError(f"{key} is missing or not an object")
+    missing = [name for name in names if name not in table]
+    if missing:
+        raise ValueError(f"{key} has no entry for {', '.join(missing)}")
+    unknown = [name for name in table if name not in names]
+    if unknown:
+        raise ValueError(f"{key} has unknown entries {', '.join(unknown)}")
+
+def physics_table(table, key, names, low=0.0, high=None):
+    physics_keys(table, key, names)
+    return tuple(physics_number(table[name], f"{key}[{name}]", low, high) for name in names)
+
+def physics_matrix(table, key, rows, columns, low=0.0, high=None):
+    physics_keys(table, key, rows)
+    return tuple(physics_table(table[row], f"{key}[{row}]", columns, low, high) for row in rows)
+
+def compile_physics(config):
+    if not isinstance(config, dict):
+        raise ValueError("physics config must be a JSON object")
+    if config.get("schema") != PHYSICS_SCHEMA_VERSION:
+        raise ValueError(f"physics config is schema {config.get('schema')!r}, expected {PHYSICS_SCHEMA_VERSION}")
+    version = config.get("version")
+    if isinstance(version, bool) or not isinstance(version, int) or not 0 <= version <= 0xFFFF:
+        raise ValueError(f"physics version must be an integer from 0 to 65535, got {version!r}")
+    variance = config.get("overtaking_variance")
+    physics_keys(variance, "overtaking_variance", OVERTAKING_LEVELS)
+    for level in OVERTAKING_LEVELS:
+        bounds = variance[level]
+        if not isinstance(bounds, list) or len(bounds) != 2:
+            raise ValueError(f"overtaking_variance[{level}] must be a [min, max] pair")
+        if physics_number(bounds[0], f"overtaking_variance[{level}]") > physics_number(bounds[1], f"overtaking_variance[{level}]"):
+            raise ValueError(f"overtaking_variance[{level}] min is above max")
+    return Physics(
+        version=version,
+        pit_penalty=physics_number(config.get("pit_penalty"), "pit_penalty"),
+        safety_car_slowdown=physics_number(config.get("safety_car_slowdown"), "safety_car_slowdown", 1.0),
+        strategy_wear=physics_table(config.get("strategy_wear"), "strategy_wear", STRATEGY_CODES),
+        strategy_factor=physics_table(config.get("strategy_factor"), "strategy_factor", STRATEGY_CODES),
+        tyre_wear=physics_table(config.get("tyre_wear"), "tyre_wear", TYRE_CODES),
+        weather_wear=physics_matrix(config.get("weather_tyre_wear"), "weather_tyre_wear", WEATHER_OPTIONS, TYRE_CODES),
+        weather_penalty=physics_matrix(config.get("weather_penalty"), "weather_penalty", WEATHER_OPTIONS, TYRE_CODES),
+        track_speed=physics_table(config.get("track_speed"), "track_speed", SPEED_LEVELS),
+        overtaking_variance=tuple((float(variance[level][0]), float(variance[level][1])) for level in OVERTAKING_LEVELS),
+        overtaking_skill=physics_table(config.get("overtaking_skill"), "overtaking_skill", OVERTAKING_LEVELS),
+        corner_tyre_wear=physics_table(config.get("corner_tyre_wear"), "corner_tyre_wear", CORNER_LEVELS),
+        collision_risk=physics_matrix(config.get("collision_risk"), "collision_risk", OVERTAKING_LEVELS, STRATEGY_CODES, 0.0, 1.0),
+        failure_risk=physics_matrix(config.get("failure_risk"), "failure_risk", CRASH_TYPES[1:], CORNER_LEVELS, 0.0, 1.0)
+    )
+
+def load_physics(path=PHYSICS_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return compile_physics(json.load(f))
+
+active_physics = load_physics()
+
+def current_physics():
+    return active_physics
+
+def reload_physics(path=PHYSICS_FILE):
+    # Raises, keeping the current tables, if the file is unreadable or doesn't validate
+    global active_physics
+    active_physics = load_physics(path)
+    logger.info(f"⚙️ Loaded physics version {active_physics.version} from {path}")
+    return active_physics
+
+# Everything a driver's car contributes to a lap on a given track. Parts can't change
+# mid-race, so this is built once per driver at !start and only read during the race.
+# crash_risks holds a (collision, engine failure, gearbox issue) tuple per STRATEGY_CODES entry.
+CarModifiers = namedtuple("CarModifiers", ["speed_multiplier", "variance_min", "variance_max", "wear_multiplier", "crash_risks"])
+
+def car_modifiers(conditions, car_parts, physics=None):
+    physics = physics or active_physics
+    speed_multiplier, variance_min, variance_max, wear_multiplier = track_modifiers(conditions, car_parts, BALANCED, physics)[:4]
+    crash_risks = tuple(track_modifiers(conditions, car_parts, strategy, physics)[4:] for strategy in range(len(STRATEGY_CODES)))
+    return CarModifiers(speed_multiplier, variance_min, variance_max, wear_multiplier, crash_risks)
+
+def track_modifiers(conditions, car_parts, strategy, physics):
+    # Compute stats from car parts
+    stats = {
+        "top_speed": 0,
+        "acceleration": 0,
+        "overtaking": 0,
+        "cornering": 0,
+        "tyre_management": 0,
+        "reliability": 0
+    }
+    # Apply part contributions with exponential scaling
+    scaling_factor = 1.0 
+    stats["top_speed"] += (car_parts["engine"] - 5) / 5 * 8 * scaling_factor 
+    stats["acceleration"] += (car_parts["engine"] - 5) / 5 * 4 * scaling_factor 
+    stats["acceleration"] += (car_parts["gearbox"] - 5) / 5 * 4 * scaling_factor 
+    stats["overtaking"] += (car_parts["aero"] - 5) / 5 * 6 * scaling_factor
+    stats["cornering"] += (car_parts["aero"] - 5) / 5 * 4 * scaling_factor 
+    stats["cornering"] += (car_parts["chassis"] - 5) / 5 * 2 * scaling_factor 
+    stats["cornering"] += (car_parts["suspension"] - 5) / 5 * 4 * scaling_factor 
+    stats["tyre_management"] += (car_parts["tyres"] - 5) / 5 * 8 * scaling_factor 
+    stats["tyre_management"] += (car_parts["suspension"] - 5) / 5 * 4 * scaling_factor 
+    stats["reliability"] += (car_parts["chassis"] - 5) / 5 * 6 * scaling_factor 
+    stats["reliability"] += (car_parts["gearbox"] - 5) / 5 * 4 * scaling_factor
+    overtaking = OVERTAKING_LEVELS.index(conditions["overtaking"])
+    corners = CORNER_LEVELS.index(conditions["corners"])
+    
+    # Speed: Adjusts base lap time
+    speed_multiplier = physics.track_speed[SPEED_LEVELS.index(conditions["speed"])]
+    top_speed_mod = 1.0 - (stats["top_speed"] / 100.0) * 0.025 * (1 if conditions["speed"] == "High" else 0.5)
+    accel_mod = 1.0 - (stats["acceleration"] / 100.0) * 0.01 * (1 if conditions["acceleration"] == "High" else 0.5)
+    speed_multiplier *= top_speed_mod * accel_mod
+    
+    # Overtaking: Adjusts driver variance
+    base_min, base_max = physics.overtaking_variance[overtaking]
+    overtaking_mod = stats["overtaking"] / 100.0
+    variance_min = base_min - physics.overtaking_skill[overtaking] * overtaking_mod
+    variance_max = base_max + physics.overtaking_skill[overtaking] * overtaking_mod
+    
+    # Corners: Adjusts tyre wear
+    tyre_wear_multiplier = physics.corner_tyre_wear[corners]
+    cornering_mod = 1.0 - (stats["cornering"] / 100.0) * 0.20 * (1 if conditions["corners"] == "Many" else 0.5)
+    tyre_wear_multiplier *= cornering_mod
+    
+    # Tyre Management: Global tyre wear reduction
+    tyre_management_mod = 1.0 - (stats["tyre_management"] / 100.0) * 0.15
+    
+    # Crash risks
+    reliability_mod = max(0, 1.0 - (stats["reliability"] / 100.0) * 0.75)  # Cap at 0
+    collision = physics.collision_risk[overtaking][strategy] * reliability_mod
+    engine_failure, gearbox_issue = (risks[corners] * reliability_mod for risks in physics.failure_risk)
+    
+    return speed_multiplier, variance_min, variance_max, tyre_wear_multiplier * tyre_management_mod, collision, engine_failure, gearbox_issue
+
+class DriverState:
+    __slots__ = ("strategy", "tyre", "last_pit_lap", "total_time", "tyre_condition", "dnf", "dnf_reason", "lap_times", "variance_trend")
+
+    def __init__(self, strategy=BALANCED, tyre=MEDIUM):
+        self.strategy = strategy
+        self.tyre = tyre
+        self.last_pit_lap = 0
+        self.total_time = 0.0
+        self.tyre_condition = 100.0
+        self.dnf = False
+        self.dnf_reason = None
+        self.lap_times = []
+        self.variance_trend = 1.0
+
+# A driver's state as shown to players, frozen at one lap (same field names as DriverState)
+DriverView = namedtuple("DriverView", ["strategy", "tyre", "last_pit_lap", "tyre_condition", "dnf", "dnf_reason"])
+
+class PendingInput:
+    # A strategy/tyre choice that takes effect at the start of lap (tyre None keeps the current set)
+    __slots__ = ("lap", "pid", "strategy", "tyre")
+
+    def __init__(self, lap, pid, strategy, tyre=None):
+        self.lap = lap
+        self.pid = pid
+        self.strategy = strategy
+        self.tyre = tyre
+
+    def __eq__(self, other):
+        return isinstance(other, PendingInput) and (self.lap, self.pid, self.strategy, self.tyre) == (other.lap, other.pid, other.strategy, other.tyre)
+
+    def __repr__(self):
+        return f"PendingInput(lap={self.lap}, pid={self.pid}, strategy={STRATEGY_CODES[self.strategy]}, tyre={TYRE_CODES[self.tyre] if self.tyre is not None else None})"
+
+class RaceEngine:
+    # modifiers maps player ID -> CarModifiers (see car_modifiers), weather is a weather code and
+    # weather_window a WeatherWindow or None, physics the Physics tables to race with (default:
+    # the currently loaded ones).
+    # drivers maps player ID -> DriverState. The bot passes the lobby's player_data so the DM
+    # strategy panel can change strategy/tyre between laps; headless callers use set_strategy()
+    # or the PendingInputs of run() instead.
+    def __init__(self, track, players, modifiers, weather, weather_window=None, drivers=None, position_order=None, rng=None, physics=None):
+        track_info = TRACKS_INFO[track]
+        self.track = track
+        self.physics = physics or active_physics
+        self.base_lap_time = track_info["base_lap_time"]
+        self.laps = track_info["laps"]
+        self.conditions = track_info["conditions"]
+        self.players = list(players)
+        self.modifiers = modifiers
+        self.weather = weather
+        self.initial_weather = weather
+        self.weather_window = weather_window
+        self.drivers = drivers if drivers is not None else {}
+        for pid in self.players:
+            if pid not in self.drivers:
+                self.drivers[pid] = DriverState()
+        self.position_order = list(position_order) if position_order is not None else list(self.players)
+        self.gaps = {}  # pid -> (gap to leader, interval to the car ahead), refreshed every lap
+        self.rng = rng or random.Random()
+        self.current_lap = 1
+        self.safety_car_active = False
+        self.safety_car_laps = 0
+        self.safety_car_cooldown = 0
+        self.inputs = None
+
+    @property
+    def finished(self):
+        return self.current_lap > self.laps
+
+    def is_dnf(self, pid):
+        return self.drivers[pid].dnf
+
+    def driver_views(self):
+        return {
+            pid: DriverView(pdata.strategy, pdata.tyre, pdata.last_pit_lap, pdata.tyre_condition, pdata.dnf, pdata.dnf_reason)
+            for pid, pdata in self.drivers.items()
+        }
+
+    def gap_to_leader(self, pid):
+        return self.gaps[pid][0]
+
+    def interval(self, pid):
+        return self.gaps[pid][1]
+
+    def set_strategy(self, pid, strategy, tyre=None):
+        pdata = self.drivers[pid]
+        pdata.strategy = strategy
+        if tyre is not None:
+            pdata.tyre = tyre
+
+    def start_recording(self):
+        # From here on every strategy/tyre change is logged as a PendingInput, whether it came
+        # through set_strategy() or the shared driver states, so a seeded race can be
+        # re-simulated exactly with run() (see replay.py)
+        self.start_inputs = self.current_inputs()
+        self.seen_inputs = self.start_inputs
+        self.inputs = []
+
+    def current_inputs(self):
+        return [(self.drivers[pid].strategy, self.drivers[pid].tyre) for pid in self.players]
+
+    def capture_inputs(self, lap):
+        current = self.current_inputs()
+        for pid, seen, now in zip(self.players, self.seen_inputs, current):
+            if now != seen:
+                self.inputs.append(PendingInput(lap, pid, *now))
+        self.seen_inputs = current
+
+    def step(self):
+        if self.finished:
+            return []
+        lap = self.current_lap
+        if self.inputs is not None:
+            self.capture_inputs(lap)
+        events = self.update_weather(lap)
+        collision_occurred = False
+        for pid in self.players:
+            pdata = self.drivers[pid]
+            if pdata.dnf:
+                continue
+            collision_occurred |= self.drive_lap(pid, pdata, lap, events)
+        events.extend(self.update_safety_car(lap, collision_occurred))
+        if self.inputs is not None:
+            self.seen_inputs = self.current_inputs()  # Pit stops reset the strategy
+        self.update_order()
+        events.append({"type": "lap", "lap": lap, "order": self.position_order})
+        self.current_lap += 1
+        return events
+
+    def run(self, inputs=()):
+        # inputs: PendingInputs in lap order, applied before that lap is driven
+        inputs = iter(inputs)
+        pending = next(inputs, None)
+        events = []
+        while not self.finished:
+            while pending is not None and pending.lap <= self.current_lap:
+                self.set_strategy(pending.pid, pending.strategy, pending.tyre)
+                pending = next(inputs, None)
+            events.extend(self.step())
+        return events
+
+    def update_order(self):
+        # Last lap's order is nearly sorted already, so an insertion pass only moves the drivers
+        # past the neighbours they actually overtook instead of re-sorting the whole grid
+        drivers = self.drivers
+        order = [pid for pid in self.position_order if not drivers[pid].dnf]
+        times = [drivers[pid].total_time for pid in order]
+        for i in range(1, len(order)):
+            pid, total_time = order[i], times[i]
+            j = i
+            while j > 0 and times[j - 1] > total_time:
+                order[j], times[j] = order[j - 1], times[j - 1]
+                j -= 1
+            order[j], times[j] = pid, total_time
+        self.position_order = order
+        self.set_gaps(order, times)
+
+    def set_gaps(self, order, times):
+        leader = times[0] if times else 0.0
+        self.gaps = {pid: (total_time - leader, total_time - ahead) for pid, total_time, ahead in zip(order, times, [leader] + times)}
+
+    def update_weather(self, lap):
+        if self.weather_window is None:
+            return []
+        start, end, new_weather = self.weather_window
+        if lap == start and self.weather != new_weather:
+            self.weather = new_weather
+            return [{"type": "weather", "lap": lap, "weather": new_weather, "reverted": False}]
+        if lap == end + 1 and self.weather != self.initial_weather:
+            self.weather = self.initial_weather
+            return [{"type": "weather", "lap": lap, "weather": self.initial_weather, "reverted": True}]
+        return []
+
+    def drive_lap(self, pid, pdata, lap, events):
+        # Simulates one lap for one driver; returns True if the driver was taken out by a collision
+        rng = self.rng
+        physics = self.physics
+        weather = self.weather
+        strategy = pdata.strategy
+        tyre = pdata.tyre
+        safety_car = self.safety_car_active
+        collision = False
+        just_pitted = False
+        pit_penalty = 0
+        if strategy == PIT_STOP and pdata.last_pit_lap != lap:
+            pit_penalty = physics.pit_penalty
+            pdata.last_pit_lap = lap
+            pdata.tyre_condition = 100.0
+            just_pitted = True
+            events.append({"type": "pit", "lap": lap, "pid": pid, "tyre": tyre})
+        base_lap_time = self.base_lap_time
+        modifiers = self.modifiers[pid]
+        if not safety_car:
+            base_lap_time *= modifiers.speed_multiplier
+            if just_pitted or pdata.last_pit_lap == lap:
+                tyre_wear = 0.0  # Skip degradation on pit lap
+            else:
+                tyre_wear = physics.strategy_wear[strategy] * physics.tyre_wear[tyre] * modifiers.wear_multiplier * physics.weather_wear[weather][tyre]
+            pdata.tyre_condition = max(pdata.tyre_condition - tyre_wear, 0.0)
+            # Check for crashes
+            for crash_type, risk in zip(CRASH_TYPES, modifiers.crash_risks[strategy]):
+                if risk > 0 and rng.random() < risk and not pdata.dnf:
+                    pdata.dnf = True
+                    pdata.dnf_reason = crash_type
+                    events.append({"type": "dnf", "lap": lap, "pid": pid, "reason": crash_type})
+                    if crash_type == "Collision":
+                        collision = True
+        if pdata.tyre_condition <= 0 and not pdata.dnf:
+            pdata.dnf = True
+            pdata.dnf_reason = "Tyres worn out"
+            events.append({"type": "dnf", "lap": lap, "pid": pid, "reason": "Tyres worn out"})
+        strat_factor = physics.strategy_factor[strategy]
+        weather_penalty = physics.weather_penalty[weather][tyre]
+        tyre_wear_penalty = 1.0 + ((100.0 - pdata.tyre_condition) / 100.0) * 0.1
+        if not safety_car:
+            trend = pdata.variance_trend
+            driver_variance = rng.uniform(modifiers.variance_min, modifiers.variance_max) * (0.7 + 0.3 * trend)
+            pdata.variance_trend = max(0.9, min(1.1, trend + rng.uniform(-0.05, 0.05)))
+        else:
+            driver_variance = 1.0
+        lap_time = (base_lap_time * strat_factor * weather_penalty * tyre_wear_penalty + pit_penalty) * driver_variance
+        if just_pitted:
+            pdata.strategy = BALANCED
+        if safety_car:
+            lap_time *= physics.safety_car_slowdown
+        pdata.lap_times.append(lap_time)
+        pdata.total_time += lap_time
+        return collision
+
+    def update_safety_car(self, lap, collision_occurred):
+        # Once per lap, after every driver has completed it
+        if self.safety_car_active:
+            self.safety_car_laps = max(0, self.safety_car_laps - 1)
+            if self.safety_car_laps == 0:
+                self.safety_car_active = False
+                self.safety_car_cooldown = SAFETY_CAR_COOLDOWN
+                return [{"type": "safety_car", "lap": lap, "active": False}]
+            return []
+        self.safety_car_cooldown = max(0, self.safety_car_cooldown - 1)
+        if collision_occurred and self.safety_car_cooldown == 0 and lap < self.laps - 2:
+            self.safety_car_active = True
+            self.safety_car_laps = self.rng.randint(2, min(4, self.laps - lap - 1))  # Ensure safety car doesn't exceed race length
+            return [{"type": "safety_car", "lap": lap, "active": True, "laps": self.safety_car_laps}]
+        return []
+
+# Below VECTOR_MIN_DRIVERS the per-call NumPy overhead outweighs the batching, so bot-sized
+# grids (MAX_PLAYERS is 20) stay on the Python kernel. 100 Monaco races, races/s:
+#
+#   drivers     20    40    50    64   100
+#   python     131    69    60    54    32
+#   numpy       97    59    72    70    62
+VECTOR_MIN_DRIVERS = 50
+
+class VectorRaceEngine(RaceEngine):
+    # Same race as RaceEngine, but each lap is one batch of array operations over the whole grid:
+    # tyre condition, strategy/tyre codes, cumulative time, variance trend and DNF flags live in
+    # NumPy arrays indexed like self.players. Driver states are only kept in step when the caller
+    # passed its own (the bot's lobby.player_data); otherwise call driver_results() at the end.
+    def __init__(self, track, players, modifiers, weather, weather_window=None, drivers=None, position_order=None, rng=None, physics=None):
+        if np is None:
+            raise RuntimeError("VectorRaceEngine needs NumPy")
+        self.shared_drivers = drivers is not None
+        super().__init__(track, players, modifiers, weather, weather_window, drivers, position_order, rng, physics)
+        # The physics tables as arrays, for fancy indexing by the code arrays
+        self.strategy_wear = np.array(self.physics.strategy_wear)
+        self.strategy_factor = np.array(self.physics.strategy_factor)
+        self.tyre_wear = np.array(self.physics.tyre_wear)
+        self.weather_wear = np.array(self.physics.weather_wear)
+        self.weather_penalty = np.array(self.physics.weather_penalty)
+        self.np_rng = np.random.default_rng(self.rng.getrandbits(64))
+        n = len(self.players)
+        states = [self.drivers[pid] for pid in self.players]
+        self.strategy = np.array([pdata.strategy for pdata in states], dtype=np.int8)
+        self.tyre = np.array([pdata.tyre for pdata in states], dtype=np.int8)
+        self.tyre_condition = np.array([pdata.tyre_condition for pdata in states], dtype=np.float64)
+        self.total_time = np.array([pdata.total_time for pdata in states], dtype=np.float64)
+        self.trend = np.array([pdata.variance_trend for pdata in states], dtype=np.float64)
+        self.last_pit_lap = np.array([pdata.last_pit_lap for pdata in states], dtype=np.int32)
+        self.dnf = np.array([pdata.dnf for pdata in states], dtype=bool)
+        self.lap_time_table = np.full((self.laps, n), np.nan)
+        records = [modifiers[pid] for pid in self.players]
+        self.speed_multiplier = np.array([record.speed_multiplier for record in records])
+        self.variance_min = np.array([record.variance_min for record in records])
+        self.variance_max = np.array([record.variance_max for record in records])
+        self.wear_multiplier = np.array([record.wear_multiplier for record in records])
+        self.crash_risks = np.array([record.crash_risks for record in records]).reshape(n, len(STRATEGY_CODES), len(CRASH_TYPES))
+        self.index = {pid: i for i, pid in enumerate(self.players)}
+        self.grid = np.arange(n)
+        self.order = np.array([self.index[pid] for pid in self.position_order], dtype=np.intp)
+
+    def set_strategy(self, pid, strategy, tyre=None):
+        super().set_strategy(pid, strategy, tyre)
+        i = self.index[pid]
+        self.strategy[i] = strategy
+        if tyre is not None:
+            self.tyre[i] = tyre
+
+    def is_dnf(self, pid):
+        return bool(self.dnf[self.index[pid]])
+
+    def driver_views(self):
+        # dnf_reason is only known when the driver states are shared
+        rows = zip(self.players, self.strategy.tolist(), self.tyre.tolist(), self.last_pit_lap.tolist(), self.tyre_condition.tolist(), self.dnf.tolist())
+        return {
+            pid: DriverView(strategy, tyre, last_pit_lap, tyre_condition, dnf, self.drivers[pid].dnf_reason)
+            for pid, strategy, tyre, last_pit_lap, tyre_condition, dnf in rows
+        }
+
+    def current_inputs(self):
+        # The arrays are authoritative; headless runs never update the driver states mid-race
+        return list(zip(self.strategy.tolist(), self.tyre.tolist()))
+
+    def read_inputs(self):
+        # The DM strategy panel writes straight into the shared driver states
+        for i, pid in enumerate(self.players):
+            pdata = self.drivers[pid]
+            self.strategy[i] = pdata.strategy
+            self.tyre[i] = pdata.tyre
+
+    def step(self):
+        if self.finished:
+            return []
+        if self.shared_drivers:
+            self.read_inputs()
+        lap = self.current_lap
+        if self.inputs is not None:
+            self.capture_inputs(lap)
+        events = self.update_weather(lap)
+        weather = self.weather
+        safety_car = self.safety_car_active
+        rng = self.np_rng
+        n = len(self.players)
+        strategy, tyre = self.strategy, self.tyre
+        active = ~self.dnf
+        pitting = active & (strategy == PIT_STOP) & (self.last_pit_lap != lap)
+        self.last_pit_lap[pitting] = lap
+        self.tyre_condition[pitting] = 100.0
+        base_lap_time = np.full(n, self.base_lap_time)
+        crashed = np.zeros(n, dtype=bool)
+        collision_occurred = False
+        if not safety_car:
+            base_lap_time *= self.speed_multiplier
+            wear = self.strategy_wear[strategy] * self.tyre_wear[tyre] * self.wear_multiplier * self.weather_wear[weather, tyre]
+            wear[self.last_pit_lap == lap] = 0.0  # Skip degradation on pit lap
+            np.maximum(self.tyre_condition - wear, 0.0, out=self.tyre_condition, where=active)
+            # Check for crashes: one roll per crash type, the first one that hits decides the reason
+            risks = self.crash_risks[self.grid, strategy]
+            hits = (rng.random((n, 3)) < risks) & active[:, None]
+            crashed = hits.any(axis=1)
+            crash_type = hits.argmax(axis=1)
+            collision_occurred = bool((crashed & (crash_type == 0)).any())
+        worn = active & ~crashed & (self.tyre_condition <= 0)
+        tyre_wear_penalty = 1.0 + ((100.0 - self.tyre_condition) / 100.0) * 0.1
+        lap_time = base_lap_time * self.strategy_factor[strategy] * self.weather_penalty[weather, tyre] * tyre_wear_penalty
+        lap_time += np.where(pitting, self.physics.pit_penalty, 0.0)
+        if not safety_car:
+            lap_time *= rng.uniform(self.variance_min, self.variance_max) * (0.7 + 0.3 * self.trend)
+            np.clip(self.trend + rng.uniform(-0.05, 0.05, n), 0.9, 1.1, out=self.trend)
+        else:
+            lap_time *= self.physics.safety_car_slowdown
+        strategy[pitting] = BALANCED
+        if self.inputs is not None:
+            self.seen_inputs = self.current_inputs()
+        lap_time[~active] = np.nan
+        self.lap_time_table[lap - 1] = lap_time
+        self.total_time += np.where(active, lap_time, 0.0)
+        self.dnf |= crashed | worn
+        for i in np.flatnonzero(pitting):
+            events.append({"type": "pit", "lap": lap, "pid": self.players[i], "tyre": int(tyre[i])})
+        for i in np.flatnonzero(crashed):
+            events.append({"type": "dnf", "lap": lap, "pid": self.players[i], "reason": CRASH_TYPES[crash_type[i]]})
+        for i in np.flatnonzero(worn):
+            events.append({"type": "dnf", "lap": lap, "pid": self.players[i], "reason": "Tyres worn out"})
+        events.extend(self.update_safety_car(lap, collision_occurred))
+        # Sorting in last lap's order keeps the input nearly sorted, which the stable sort exploits
+        order = self.order[~self.dnf[self.order]]
+        self.order = order = order[np.argsort(self.total_time[order], kind="stable")]
+        players = self.players
+        self.position_order = [players[i] for i in order.tolist()]
+        self.set_gaps(self.position_order, self.total_time[order].tolist())
+        if self.shared_drivers:
+            self.write_back(lap, active, crashed, crash_type if not safety_car else None, worn)
+        events.append({"type": "lap", "lap": lap, "order": self.position_order})
+        self.current_lap += 1
+        return events
+
+    def write_back(self, lap, active, crashed, crash_type, worn):
+        for i in np.flatnonzero(active):
+            pdata = self.drivers[self.players[i]]
+            pdata.lap_times.append(float(self.lap_time_table[lap - 1, i]))
+            pdata.total_time = float(self.total_time[i])
+            pdata.tyre_condition = float(self.tyre_condition[i])
+            pdata.variance_trend = float(self.trend[i])
+            pdata.last_pit_lap = int(self.last_pit_lap[i])
+            pdata.strategy = int(self.strategy[i])
+            if crashed[i]:
+                pdata.dnf, pdata.dnf_reason = True, CRASH_TYPES[crash_type[i]]
+            elif worn[i]:
+                pdata.dnf, pdata.dnf_reason = True, "Tyres worn out"
+
+    def driver_results(self):
+        # Headless runs: fill the driver states from the arrays once, at the end
+        for i, pid in enumerate(self.players):
+            pdata = self.drivers[pid]
+            laps = self.lap_time_table[:, i]
+            pdata.lap_times = laps[~np.isnan(laps)].tolist()
+            pdata.total_time = float(self.total_time[i])
+            pdata.tyre_condition = float(self.tyre_condition[i])
+            pdata.dnf = bool(self.dnf[i])
+        return self.drivers
+
+def create_engine(track, players, modifiers, weather, weather_window=None, drivers=None, position_order=None, rng=None, physics=None, kernel="auto"):
+    # kernel: "python", "numpy", or "auto" (NumPy when installed and the grid is big enough)
+    if kernel == "numpy" or (kernel == "auto" and np is not None and len(players) >= VECTOR_MIN_DRIVERS):
+        return VectorRaceEngine(track, players, modifiers, weather, weather_window, drivers, position_order, rng, physics)
+    return RaceEngine(track, players, modifiers, weather, weather_window, drivers, position_order, rng, physics)
+
+def random_car_parts(rng):
+    return {part: rng.randrange(5, 101, 5) for part in ("engine", "aero", "tyres", "chassis", "gearbox", "suspension")}
+
+def pit_when_worn(engine, threshold=25.0):
+    # Minimal strategy input for headless runs: box for fresh mediums once the tyres are worn
+    if isinstance(engine, VectorRaceEngine):
+        for i in np.flatnonzero(~engine.dnf & (engine.tyre_condition < threshold)):
+            engine.set_strategy(engine.players[i], PIT_STOP, MEDIUM)
+        return
+    for pid, pdata in engine.drivers.items():
+        if not pdata.dnf and pdata.tyre_condition < threshold:
+            engine.set_strategy(pid, PIT_STOP, MEDIUM)
+
+# One simulated lap as the bot shows it: the lap's events and the state right after it
+LapRecord = namedtuple("LapRecord", ["lap", "events", "order", "gaps", "weather", "safety_car", "drivers"])
+HIGHLIGHT_EVENTS = ("dnf", "safety_car", "weather")
+
+def resolve_race(engine, strategy=pit_when_worn):
+    # Runs the race to the flag in one go, calling strategy(engine) before every lap. position_order
+    # and gaps are rebuilt every lap, so the records can keep references to them.
+    records = []
+    while not engine.finished:
+        strategy(engine)
+        lap = engine.current_lap
+        events = engine.step()
+        records.append(LapRecord(lap, events, engine.position_order, engine.gaps, engine.weather, engine.safety_car_active, engine.driver_views()))
+    return records
+
+def race_highlights(records, final_laps=3):
+    # Laps worth publishing in a condensed race: anything that happened, plus the run to the flag
+    last = records[-1].lap if records else 0
+    return [
+        record for record in records
+        if record.lap > last - final_laps or any(event["type"] in HIGHLIGHT_EVENTS for event in record.events)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate Formula Z races headlessly and report throughput.")
+    parser.add_argument("--races", type=int, default=1000)
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--track", choices=sorted(TRACKS_INFO), default=None, help="default: a random track per race")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--kernel", choices=["auto", "python", "numpy"], default="auto")
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    players = list(range(1, args.drivers + 1))
+    dnfs = 0
+    start = time.perf_counter()
+    for _ in range(args.races):
+        track = args.track or rng.choice(list(TRACKS_INFO))
+        conditions = TRACKS_INFO[track]["conditions"]
+        engine = create_engine(
+            track, players, {pid: car_modifiers(conditions, random_car_parts(rng)) for pid in players},
+            rng.randrange(len(WEATHER_OPTIONS)), rng=rng, kernel=args.kernel
+        )
+        while not engine.finished:
+            pit_when_worn(engine)
+            engine.step()
+        dnfs += sum(1 for pid in players if engine.is_dnf(pid))
+    elapsed = time.perf_counter() - start
+    print(f"{type(engine).__name__}: {args.races} races x {args.drivers} drivers in {elapsed:.2f}s ({args.races / elapsed:.0f} races/s, {dnfs / args.races:.2f} DNFs/race)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
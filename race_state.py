@@ -0,0 +1,56 @@
+from race_engine import BALANCED, MEDIUM, TRACKS_INFO, DriverState
+
+# Bot-side race state. Lobbies and drivers are __slots__ classes rather than string-keyed
+# dicts: a typo in a field name raises instead of silently creating a new key, and strategy,
+# tyre and weather are the small integer codes from race_engine.
+
+class RaceDriver(DriverState):
+    # The engine's per-driver state plus what the bot tracks for the driver's DM panel
+    __slots__ = ("last_panel", "dm_msg")
+
+    def __init__(self, strategy=BALANCED, tyre=MEDIUM):
+        super().__init__(strategy, tyre)
+        self.last_panel = None  # Description last shown on the DM panel
+        self.dm_msg = None
+
+class Lobby:
+    __slots__ = (
+        "host", "track", "weather", "initial_weather", "weather_window", "players", "users", "status",
+        "mode", "teams", "team_names", "initial_settings", "race_mode", "pace",
+        # Set at !start
+        "laps", "current_lap", "position_order", "gaps", "safety_car_active", "safety_car_laps",
+        "car_parts", "modifiers", "physics", "seed", "player_data", "status_msg_id", "status_lines"
+    )
+
+    def __init__(self, host, user, track, weather, weather_window=None):
+        self.host = host
+        self.track = track
+        self.weather = weather
+        self.initial_weather = weather
+        self.weather_window = weather_window  # race_engine.WeatherWindow or None
+        self.players = [host]
+        self.users = {host: user}
+        self.status = "waiting"
+        self.mode = "solo"
+        self.teams = []
+        self.team_names = {}
+        self.initial_settings = {}  # pid -> PendingInput from !setstrat, applied at !start
+        self.race_mode = "casual"
+        self.pace = "live"  # "instant": resolved at !start, published as highlights (app.play_highlights)
+        self.laps = TRACKS_INFO[track]["laps"]
+        self.current_lap = 1
+        self.position_order = []
+        self.gaps = {}
+        self.safety_car_active = False
+        self.safety_car_laps = 0
+        self.car_parts = {}
+        self.modifiers = {}
+        self.physics = None
+        self.seed = None
+        self.player_data = {}
+        self.status_msg_id = None
+        self.status_lines = {}  # pid -> (inputs, line) of the driver's status embed line, reused while unchanged
+
+    @property
+    def conditions(self):
+        return TRACKS_INFO[self.track]["conditions"]
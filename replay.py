@@ -0,0 +1,171 @@
+import argparse
+import logging
+import os
+import random
+import struct
+import sys
+import time
+
+from profiles import PART_NAMES
+from race_engine import TRACKS_INFO, WEATHER_OPTIONS, PendingInput, VectorRaceEngine, WeatherWindow, car_modifiers, create_engine, current_physics
+
+logger = logging.getLogger("F1Bot")
+
+# Race replays. A race is fully determined by its seed, setup, car parts and the strategy/tyre
+# inputs players made, so that is all a replay stores; re-simulating it with the same kernel
+# reproduces every lap time bit for bit, as long as the physics tables are the same version.
+# The final times are kept to verify that.
+#
+#   header   magic, format version, seed, kernel (0 Python, 1 NumPy), weather, window weather
+#            (255: none), window start/end lap, laps run, driver count, input count, track,
+#            physics version (version 2 on; version 1 replays were all physics version 1)
+#   drivers  user ID, car parts (PART_NAMES order), starting strategy and tyre codes
+#   inputs   lap, driver index, strategy and tyre codes
+#   results  total time and DNF flag per driver
+#
+#   python replay.py replays/5f0c3a9e2b7d4411.fzr [--laps]
+
+REPLAY_MAGIC = b"FZRP"
+REPLAY_VERSION = 2
+HEADER_V1 = struct.Struct("<4sHQBBBHHHHI32s")
+HEADER = struct.Struct("<4sHQBBBHHHHI32sH")
+DRIVER = struct.Struct("<Q6BBB")
+INPUT = struct.Struct("<HHBB")
+RESULT = struct.Struct("<d?")
+NO_WEATHER = 255
+
+def replay_path(directory, seed):
+    return os.path.join(directory, f"{seed:016x}.fzr")
+
+def encode_replay(engine, seed, car_parts):
+    drivers = driver_results(engine)
+    window = engine.weather_window or WeatherWindow(0, 0, NO_WEATHER)
+    parts = [
+        HEADER.pack(
+            REPLAY_MAGIC, REPLAY_VERSION, seed, int(isinstance(engine, VectorRaceEngine)),
+            engine.initial_weather, window.new_weather, window.start, window.end, engine.current_lap - 1,
+            len(engine.players), len(engine.inputs), engine.track.encode("utf-8")[:32], engine.physics.version
+        )
+    ]
+    for pid, (strategy, tyre) in zip(engine.players, engine.start_inputs):
+        parts.append(DRIVER.pack(pid, *(car_parts[pid][part] for part in PART_NAMES), strategy, tyre))
+    index = {pid: i for i, pid in enumerate(engine.players)}
+    for pending in engine.inputs:
+        parts.append(INPUT.pack(pending.lap, index[pending.pid], pending.strategy, pending.tyre))
+    for pid in engine.players:
+        parts.append(RESULT.pack(drivers[pid].total_time, drivers[pid].dnf))
+    return b"".join(parts)
+
+def decode_replay(data):
+    magic, version = struct.unpack_from("<4sH", data, 0)
+    if magic != REPLAY_MAGIC or version not in (1, REPLAY_VERSION):
+        raise ValueError(f"not a version 1-{REPLAY_VERSION} race replay")
+    header = HEADER if version == REPLAY_VERSION else HEADER_V1
+    (magic, version, seed, kernel, weather, window_weather, window_start, window_end,
+     laps_run, driver_count, input_count, track, *physics_version) = header.unpack_from(data, 0)
+    expected = header.size + driver_count * (DRIVER.size + RESULT.size) + input_count * INPUT.size
+    if len(data) != expected:
+        raise ValueError(f"replay is {len(data)} bytes, expected {expected}")
+    offset = header.size
+    players, car_parts, start_inputs = [], {}, []
+    for values in DRIVER.iter_unpack(data[offset:offset + driver_count * DRIVER.size]):
+        pid = values[0]
+        players.append(pid)
+        car_parts[pid] = dict(zip(PART_NAMES, values[1:7]))
+        start_inputs.append((values[7], values[8]))
+    offset += driver_count * DRIVER.size
+    inputs = [
+        PendingInput(lap, players[i], strategy, tyre)
+        for lap, i, strategy, tyre in INPUT.iter_unpack(data[offset:offset + input_count * INPUT.size])
+    ]
+    offset += input_count * INPUT.size
+    results = dict(zip(players, RESULT.iter_unpack(data[offset:])))
+    window = None
+    if window_weather != NO_WEATHER:
+        window = WeatherWindow(window_start, window_end, window_weather)
+    return {
+        "seed": seed, "kernel": "numpy" if kernel else "python", "track": track.rstrip(b"\0").decode("utf-8"),
+        "weather": weather, "weather_window": window, "laps_run": laps_run, "physics": physics_version[0] if physics_version else 1,
+        "players": players, "car_parts": car_parts, "start_inputs": start_inputs, "inputs": inputs, "results": results
+    }
+
+def write_replay(path, data):
+    # Runs on the persistence thread
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_file = f"{path}.tmp"
+        with open(temp_file, "wb") as f:
+            f.write(data)
+        os.replace(temp_file, path)
+        return True
+    except (IOError, OSError) as e:
+        logger.error(f"Failed to write replay {path}: {e}")
+        return False
+
+def read_replay(path):
+    with open(path, "rb") as f:
+        return decode_replay(f.read())
+
+def driver_results(engine):
+    if isinstance(engine, VectorRaceEngine) and not engine.shared_drivers:
+        return engine.driver_results()
+    return engine.drivers
+
+def replay_race(replay):
+    conditions = TRACKS_INFO[replay["track"]]["conditions"]
+    players = replay["players"]
+    engine = create_engine(
+        replay["track"], players, {pid: car_modifiers(conditions, replay["car_parts"][pid]) for pid in players},
+        replay["weather"], replay["weather_window"], rng=random.Random(replay["seed"]), kernel=replay["kernel"]
+    )
+    for pid, (strategy, tyre) in zip(players, replay["start_inputs"]):
+        engine.set_strategy(pid, strategy, tyre)
+    inputs = iter(replay["inputs"])
+    pending = next(inputs, None)
+    laps = []
+    while engine.current_lap <= replay["laps_run"]:
+        while pending is not None and pending.lap <= engine.current_lap:
+            engine.set_strategy(pending.pid, pending.strategy, pending.tyre)
+            pending = next(inputs, None)
+        laps.append(engine.step())
+    return engine, laps
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Re-simulate a Formula Z race replay and verify it against the recorded results.")
+    parser.add_argument("replay")
+    parser.add_argument("--laps", action="store_true", help="print the running order after every lap")
+    args = parser.parse_args()
+    replay = read_replay(args.replay)
+    if replay["physics"] != current_physics().version:
+        print(f"⚠️ Recorded with physics version {replay['physics']}, re-simulating with version {current_physics().version}: results may differ")
+    started = time.perf_counter()
+    engine, laps = replay_race(replay)
+    elapsed = time.perf_counter() - started
+    drivers = driver_results(engine)
+    print(f"{replay['track']} ({WEATHER_OPTIONS[replay['weather']]}), seed {replay['seed']:016x}, {replay['kernel']} kernel: "
+          f"{replay['laps_run']} laps, {len(replay['players'])} drivers, {len(replay['inputs'])} inputs, "
+          f"re-simulated in {elapsed * 1000:.1f}ms")
+    if args.laps:
+        for events in laps:
+            for event in events:
+                if event["type"] == "lap":
+                    print(f"lap {event['lap']:>3}: {' '.join(str(pid) for pid in event['order'])}")
+                elif event["type"] != "weather":
+                    print(f"         {event}")
+    mismatches = 0
+    classified = {pid: pos for pos, pid in enumerate(engine.position_order, 1)}
+    for pid in sorted(replay["players"], key=lambda pid: (classified.get(pid, len(classified) + 1), pid)):
+        total_time, dnf = replay["results"][pid]
+        match = drivers[pid].total_time == total_time and drivers[pid].dnf == dnf
+        mismatches += not match
+        pos = f"P{classified[pid]}" if pid in classified else "DNF"
+        print(f"{pos:>4} {pid:>20} {drivers[pid].total_time:12.3f}s {'' if match else f'(recorded {total_time:.3f}s, dnf={dnf})'}")
+    if mismatches:
+        print(f"❌ {mismatches} drivers differ from the recorded race")
+        return 1
+    print("✅ Replay matches the recorded race bit for bit")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from profiles import (
+    PART_MAX_LEVEL, PART_NAMES, RACE_ZCOIN_MIN_PLAYERS, RACE_ZCOIN_REWARDS, ZCOIN_CLAIMS,
+    apply_upgrade, new_player_profile, upgrade_cost
+)
+from race_engine import F1_POINTS, TRACKS_INFO, WEATHER_OPTIONS, car_modifiers, create_engine, current_physics, pit_when_worn
+
+logger = logging.getLogger("F1Bot")
+
+# Offline championship simulator for balancing the upgrade economy. A season is one race at
+# every track in TRACKS_INFO, in calendar order, for a grid of fresh profiles. Between rounds
+# every driver claims the !daily/!weekly/!monthly rewards that came off cooldown and spends
+# zcoins on !upgrade following the chosen policy; races pay F1_POINTS and the race zcoin
+# rewards. Everything goes through the bot's own rules (profiles.py, race_engine.py).
+# Seasons run in a process pool and one summary row per season is streamed to CSV or JSONL.
+#
+#   python season.py --seasons 2000 --drivers 20 --output seasons.csv
+#   python season.py --seasons 500 --policy none --days-between-rounds 0 --output baseline.jsonl
+
+SEASON_CHUNK = 25  # Seasons per worker job
+UPGRADE_POLICIES = ("cheapest", "random", "none")
+SEASON_FIELDS = [
+    "season", "rounds", "drivers", "champion_points", "runner_up_points", "champion_part_level",
+    "mean_part_level", "min_part_level", "max_part_level", "upgrades", "zcoins_earned", "zcoins_spent",
+    "zcoins_banked", "dnf_rate"
+]
+
+def part_level(profile):
+    return sum(profile["car_parts"].values()) / len(PART_NAMES)
+
+def claim_rewards(profile, now):
+    # A driver who claims every reward as soon as its cooldown is over
+    earned = 0
+    for name, (amount, cooldown) in ZCOIN_CLAIMS.items():
+        if now - profile[f"last_{name}"] >= cooldown:
+            profile["zcoins"] += amount
+            profile[f"last_{name}"] = now
+            earned += amount
+    return earned
+
+def buy_upgrades(profile, policy, rng):
+    # Returns the zcoins spent
+    spent = 0
+    while policy != "none":
+        parts = [part for part in PART_NAMES if profile["car_parts"][part] < PART_MAX_LEVEL and upgrade_cost(profile, part) <= profile["zcoins"]]
+        if not parts:
+            break
+        if policy == "cheapest":
+            cheapest = min(upgrade_cost(profile, part) for part in parts)
+            parts = [part for part in parts if upgrade_cost(profile, part) == cheapest]
+        part = rng.choice(parts)
+        spent += upgrade_cost(profile, part)
+        apply_upgrade(profile, part)
+    return spent
+
+def simulate_season(season, seed, drivers, policy, days_between_rounds, kernel, physics):
+    rng = random.Random(f"{seed}:{season}")  # Per-season stream: results don't depend on chunking
+    players = list(range(1, drivers + 1))
+    profiles = {pid: new_player_profile() for pid in players}
+    points = dict.fromkeys(players, 0)
+    upgrades = zcoins_earned = zcoins_spent = dnfs = 0
+    now = max(cooldown for _, cooldown in ZCOIN_CLAIMS.values())  # Every reward is claimable before round 1
+    calendar = list(TRACKS_INFO)
+    for track in calendar:
+        for day in range(days_between_rounds):
+            for pid in players:
+                zcoins_earned += claim_rewards(profiles[pid], now + day * 24 * 3600)
+        now += days_between_rounds * 24 * 3600
+        for pid in players:
+            before = sum(profiles[pid]["part_upgrade_counts"].values())
+            zcoins_spent += buy_upgrades(profiles[pid], policy, rng)
+            upgrades += sum(profiles[pid]["part_upgrade_counts"].values()) - before
+        conditions = TRACKS_INFO[track]["conditions"]
+        engine = create_engine(
+            track, players, {pid: car_modifiers(conditions, profiles[pid]["car_parts"], physics) for pid in players},
+            rng.randrange(len(WEATHER_OPTIONS)), position_order=rng.sample(players, len(players)), rng=rng,
+            physics=physics, kernel=kernel
+        )
+        while not engine.finished:
+            pit_when_worn(engine)
+            engine.step()
+        order = engine.position_order
+        for pos, pid in enumerate(order, 1):
+            points[pid] += F1_POINTS.get(pos, 0)
+            profiles[pid]["points"] += F1_POINTS.get(pos, 0)
+        if len(players) >= RACE_ZCOIN_MIN_PLAYERS:
+            for pos, pid in enumerate(order[:len(RACE_ZCOIN_REWARDS)], 1):
+                profiles[pid]["zcoins"] += RACE_ZCOIN_REWARDS[pos]
+                zcoins_earned += RACE_ZCOIN_REWARDS[pos]
+        dnfs += sum(1 for pid in players if engine.is_dnf(pid))
+    standings = sorted(players, key=lambda pid: -points[pid])
+    levels = [part_level(profiles[pid]) for pid in players]
+    return {
+        "season": season, "rounds": len(calendar), "drivers": drivers,
+        "champion_points": points[standings[0]], "runner_up_points": points[standings[1]] if drivers > 1 else 0,
+        "champion_part_level": round(part_level(profiles[standings[0]]), 2),
+        "mean_part_level": round(sum(levels) / drivers, 2), "min_part_level": round(min(levels), 2), "max_part_level": round(max(levels), 2),
+        "upgrades": upgrades, "zcoins_earned": zcoins_earned, "zcoins_spent": zcoins_spent,
+        "zcoins_banked": sum(profiles[pid]["zcoins"] for pid in players),
+        "dnf_rate": round(dnfs / (len(calendar) * drivers), 4)
+    }
+
+def simulate_seasons(first, count, seed, drivers, policy, days_between_rounds, kernel, physics):
+    # Runs in a worker process
+    return [simulate_season(season, seed, drivers, policy, days_between_rounds, kernel, physics) for season in range(first, first + count)]
+
+class SeasonWriter:
+    def __init__(self, path):
+        self.jsonl = path.endswith((".jsonl", ".json"))
+        self.file = open(path, "w", newline="")
+        if not self.jsonl:
+            self.writer = csv.DictWriter(self.file, fieldnames=SEASON_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self.jsonl:
+                self.file.write(json.dumps(row) + "\n")
+            else:
+                self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Simulate Formula Z championships over the full calendar to balance the upgrade economy.")
+    parser.add_argument("--seasons", type=int, default=1000)
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--policy", choices=UPGRADE_POLICIES, default="cheapest", help="how drivers spend zcoins between rounds")
+    parser.add_argument("--days-between-rounds", type=int, default=7, help="days of reward claims between rounds (0: race rewards only)")
+    parser.add_argument("--kernel", choices=["auto", "python", "numpy"], default="auto")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="seasons.csv", help="CSV, or JSON lines for a .jsonl path")
+    args = parser.parse_args()
+    physics = current_physics()
+    writer = SeasonWriter(args.output)
+    started = time.perf_counter()
+    done = 0
+    champion_points = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [
+                executor.submit(simulate_seasons, first, min(SEASON_CHUNK, args.seasons - first), args.seed, args.drivers,
+                                args.policy, args.days_between_rounds, args.kernel, physics)
+                for first in range(0, args.seasons, SEASON_CHUNK)
+            ]
+            for future in as_completed(futures):
+                rows = future.result()
+                writer.write(rows)
+                done += len(rows)
+                champion_points += sum(row["champion_points"] for row in rows)
+                logger.info(f"🏆 {done}/{args.seasons} seasons ({done / (time.perf_counter() - started):.1f}/s)")
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+    print(f"{args.seasons} seasons x {len(TRACKS_INFO)} rounds x {args.drivers} drivers in {elapsed:.1f}s "
+          f"(physics version {physics.version}, mean champion points {champion_points / max(done, 1):.1f}) -> {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import argparse
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+
+from profiles import PART_NAMES, PROFILE_SCHEMA_VERSION
+
+logger = logging.getLogger("F1Bot")
+
+# Compact binary snapshot of career_stats.
+#
+#   header   magic, format version, record size, profile count
+#   index    one little-endian uint64 user ID per profile, sorted ascending
+#   records  one fixed-width struct per profile, in index order
+#
+# Every profile field is numeric, so a record is a flat struct and a lookup is a binary
+# search over the mmap'd index plus one struct.unpack_from. None fastest laps are stored as NaN.
+# A record holds every field of the current profile schema, so decoded profiles need no migration.
+
+SNAPSHOT_MAGIC = b"FZPS"
+SNAPSHOT_VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+RECORD = struct.Struct("<IIIIqqddddd6H6HqII")
+
+def encode_profile(profile):
+    # Missing fields (e.g. when importing an old JSON file) fall back to the profile defaults
+    parts = profile.get("car_parts", {})
+    counts = profile.get("part_upgrade_counts", {})
+    tournament = profile.get("tournament_stats", {})
+    fastest_lap = profile.get("fastest_lap")
+    return RECORD.pack(
+        profile.get("races", 0), profile.get("wins", 0), profile.get("podiums", 0), profile.get("dnfs", 0),
+        profile.get("points", 0), profile.get("zcoins", 0),
+        profile.get("total_time", 0.0), math.nan if fastest_lap is None else fastest_lap,
+        profile.get("last_daily", 0), profile.get("last_weekly", 0), profile.get("last_monthly", 0),
+        *(parts.get(part, 5) for part in PART_NAMES),
+        *(counts.get(part, 0) for part in PART_NAMES),
+        tournament.get("points", 0), tournament.get("wins", 0), tournament.get("podiums", 0)
+    )
+
+def decode_profile(values):
+    (races, wins, podiums, dnfs, points, zcoins, total_time, fastest_lap,
+     last_daily, last_weekly, last_monthly) = values[:11]
+    return {
+        "races": races, "wins": wins, "podiums": podiums, "dnfs": dnfs,
+        "fastest_lap": None if math.isnan(fastest_lap) else fastest_lap, "total_time": total_time,
+        "points": points, "zcoins": zcoins,
+        "last_daily": last_daily, "last_weekly": last_weekly, "last_monthly": last_monthly,
+        "car_parts": dict(zip(PART_NAMES, values[11:17])),
+        "part_upgrade_counts": dict(zip(PART_NAMES, values[17:23])),
+        "tournament_stats": {"points": values[23], "wins": values[24], "podiums": values[25]},
+        "schema": PROFILE_SCHEMA_VERSION
+    }
+
+def write_binary_snapshot(path, profiles):
+    user_ids = sorted(int(user_id) for user_id in profiles)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, RECORD.size, len(user_ids)))
+        f.write(struct.pack(f"<{len(user_ids)}Q", *user_ids))
+        f.write(b"".join(encode_profile(profiles[user_id]) for user_id in user_ids))
+        f.flush()
+        os.fsync(f.fileno())
+
+def merge_walk(base, overlay_ids):
+    # Yields (user_id, base record index or None) in ascending user ID order
+    base_count = base.count if base is not None else 0
+    i = j = 0
+    while i < base_count or j < len(overlay_ids):
+        if j == len(overlay_ids) or (i < base_count and base.user_ids[i] < overlay_ids[j]):
+            yield base.user_ids[i], i
+            i += 1
+        else:
+            if i < base_count and base.user_ids[i] == overlay_ids[j]:
+                i += 1
+            yield overlay_ids[j], None
+            j += 1
+
+def write_merged_snapshot(path, base, overlay):
+    # Fold changed profiles into an existing snapshot without decoding the untouched records:
+    # those are copied over byte for byte.
+    overlay_ids = sorted(int(user_id) for user_id in overlay)
+    replaced = sum(1 for user_id in overlay_ids if base is not None and base.find(user_id) is not None)
+    count = (base.count if base is not None else 0) + len(overlay_ids) - replaced
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, RECORD.size, count))
+        f.write(b"".join(struct.pack("<Q", user_id) for user_id, _ in merge_walk(base, overlay_ids)))
+        for user_id, i in merge_walk(base, overlay_ids):
+            f.write(encode_profile(overlay[user_id]) if i is None else base.record_bytes(i))
+        f.flush()
+        os.fsync(f.fileno())
+    return count
+
+class BinarySnapshot:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = None
+        self.user_ids = None
+        self.count = 0
+        if os.fstat(self.file.fileno()).st_size == 0:
+            return
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, count = HEADER.unpack_from(self.map, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} career stats snapshot")
+        if len(self.map) != HEADER.size + count * (8 + RECORD.size):
+            self.close()
+            raise ValueError(f"{path} is truncated")
+        self.count = count
+        self.records_offset = HEADER.size + count * 8
+        self.user_ids = memoryview(self.map)[HEADER.size:self.records_offset].cast("Q")
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, user_id):
+        return self.find(user_id) is not None
+
+    def find(self, user_id):
+        i = bisect.bisect_left(self.user_ids, user_id) if self.count else 0
+        if i < self.count and self.user_ids[i] == user_id:
+            return i
+        return None
+
+    def get(self, user_id):
+        i = self.find(int(user_id))
+        if i is None:
+            return None
+        return decode_profile(RECORD.unpack_from(self.map, self.records_offset + i * RECORD.size))
+
+    def record_bytes(self, i):
+        offset = self.records_offset + i * RECORD.size
+        return self.map[offset:offset + RECORD.size]
+
+    def tournament_rows(self):
+        # (user_id, tournament points, races) for every record, without building profile dicts
+        if not self.count:
+            return
+        with memoryview(self.map) as view:
+            for user_id, values in zip(self.user_ids, RECORD.iter_unpack(view[self.records_offset:])):
+                yield user_id, values[23], values[0]
+
+    def items(self):
+        if not self.count:
+            return
+        with memoryview(self.map) as view:
+            for user_id, values in zip(self.user_ids, RECORD.iter_unpack(view[self.records_offset:])):
+                yield user_id, decode_profile(values)
+
+    def load_all(self):
+        return dict(self.items())
+
+    def close(self):
+        if self.user_ids is not None:
+            self.user_ids.release()
+            self.user_ids = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+def read_binary_snapshot(path):
+    snapshot = BinarySnapshot(path)
+    try:
+        return snapshot.load_all()
+    finally:
+        snapshot.close()
+
+# JSON stays the interchange format: export a binary snapshot for inspection or
+# backups, or import an existing career_stats.json into a binary snapshot.
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Convert Formula Z career stats between JSON and the binary snapshot format.")
+    parser.add_argument("command", choices=["export", "import"], help="export: binary -> JSON, import: JSON -> binary")
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args()
+    if args.command == "export":
+        profiles = read_binary_snapshot(args.source)
+        with open(args.target, "w") as f:
+            json.dump(profiles, f, indent=2)
+    else:
+        with open(args.source, "r") as f:
+            profiles = {int(k): v for k, v in json.load(f).items()}
+        write_binary_snapshot(args.target, profiles)
+    logger.info(f"✅ {args.command.capitalize()}ed {len(profiles)} profiles from {args.source} to {args.target}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,466 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from profiles import migrate_profile
+from snapshot import BinarySnapshot, write_binary_snapshot, write_merged_snapshot
+
+logger = logging.getLogger("F1Bot")
+
+# Storage backends for career_stats. app.py keeps the working set of profiles in memory
+# (ProfileCache) and hands changed profiles to the store; the store decides how they reach disk.
+
+def leaderboard_key(item):
+    user_id, profile = item
+    return (-profile["tournament_stats"]["points"], profile["races"])
+
+def copy_profile(profile):
+    # Profiles are at most two levels deep, so this is a full copy at a fraction of deepcopy's cost
+    return {key: dict(value) if isinstance(value, dict) else value for key, value in profile.items()}
+
+class ProfileStore(ABC):
+    # A backend missing one of the abstract methods fails when it is constructed, not mid-race
+    name = "base"
+
+    def open(self):
+        pass
+
+    @abstractmethod
+    def load_all(self):
+        pass
+
+    @abstractmethod
+    def get(self, user_id):
+        pass
+
+    @abstractmethod
+    def write(self, profiles):
+        pass
+
+    def sync(self):
+        pass
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self):
+        return True
+
+    @abstractmethod
+    def top_tournament(self, limit):
+        pass
+
+    @abstractmethod
+    def count(self):
+        pass
+
+    def close(self):
+        pass
+
+class JsonProfileStore(ProfileStore):
+    name = "json"
+
+    # Snapshot in career_stats.json (or the compact career_stats.bin, see snapshot.py)
+    # plus an append-only journal of changed profiles. The journaled profiles are kept in
+    # overlay until the next compaction folds them into the snapshot. A binary snapshot stays
+    # mmap'd as base, so only the overlay and the app's ProfileCache are resident.
+    def __init__(self, path="career_stats.json", journal_path="career_stats.journal", compact_records=5000, snapshot_format="json"):
+        base, ext = os.path.splitext(path)
+        self.path = path
+        self.backup_path = f"{base}_backup{ext}"
+        self.temp_path = f"{base}_temp{ext}"
+        self.legacy_path = f"{base}.json"
+        self.snapshot_format = snapshot_format
+        self.journal_path = journal_path
+        self.compact_records = compact_records
+        self.journal_file = None
+        self.journal_records = 0
+        self.journal_unsynced = 0
+        self.base = {}
+        self.overlay = {}
+        # get() runs on the event loop thread while writes and compaction run on the persistence thread
+        self.lock = threading.Lock()
+
+    def open(self):
+        self.base = self.load_snapshot()
+        self.overlay = {}
+        self.replay_journal()
+
+    def load_all(self):
+        self.open()
+        if isinstance(self.base, BinarySnapshot):
+            profiles = self.base.load_all()
+        else:
+            profiles = {user_id: copy_profile(profile) for user_id, profile in self.base.items()}
+        profiles.update(self.overlay)
+        return profiles
+
+    def load_snapshot(self):
+        paths = [self.path, self.backup_path]
+        if self.snapshot_format == "binary":
+            # First start after switching formats: pick up the old JSON snapshot
+            paths.append(self.legacy_path)
+        for path in paths:
+            try:
+                if not os.path.exists(path):
+                    logger.info(f"ℹ️ {path} not found")
+                    continue
+                if path.endswith(".json"):
+                    profiles = self.load_json_snapshot(path)
+                else:
+                    profiles = BinarySnapshot(path)
+                logger.info(f"✅ Loaded {path} (Entries: {len(profiles)})")
+                return profiles
+            except (json.JSONDecodeError, ValueError, IOError) as e:
+                logger.error(f"⚠️ Error loading {path}: {e}, attempting backup")
+        logger.info("ℹ️ No usable career stats snapshot, starting fresh")
+        return {}
+
+    def load_json_snapshot(self, path):
+        with open(path, "r") as f:
+            file_content = f.read()
+        if not file_content.strip():  # Check for empty file
+            logger.warning(f"{path} is empty, starting fresh")
+            return {}
+        data = json.loads(file_content)
+        profiles = {int(k): v for k, v in data.items()}
+        migrated = sum(migrate_profile(profile) for profile in profiles.values())
+        if migrated:
+            logger.info(f"🔧 Migrated {migrated} profiles in {path} to the current schema")
+        return profiles
+
+    def replay_journal(self):
+        self.journal_records = 0
+        if not os.path.exists(self.journal_path):
+            return
+        try:
+            with open(self.journal_path, "r") as f:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash mid-append can leave a torn last record behind
+                        logger.warning(f"Skipping corrupt journal record at line {line_no}")
+                        continue
+                    migrate_profile(record["p"])
+                    self.overlay[int(record["id"])] = record["p"]
+                    self.journal_records += 1
+            logger.info(f"✅ Replayed {self.journal_path} (Records: {self.journal_records})")
+        except (IOError, OSError) as e:
+            logger.error(f"⚠️ Error replaying {self.journal_path}: {e}")
+
+    def get(self, user_id):
+        user_id = int(user_id)
+        with self.lock:
+            profile = self.overlay.get(user_id)
+            if profile is not None:
+                return copy_profile(profile)
+            if isinstance(self.base, BinarySnapshot):
+                return self.base.get(user_id)
+            profile = self.base.get(user_id)
+            return copy_profile(profile) if profile is not None else None
+
+    def write(self, profiles):
+        if not profiles:
+            return True
+        lines = [json.dumps({"id": user_id, "p": profile}, separators=(",", ":")) for user_id, profile in profiles.items()]
+        try:
+            if self.journal_file is None:
+                self.journal_file = open(self.journal_path, "a")
+            self.journal_file.write("\n".join(lines) + "\n")
+            self.journal_file.flush()
+            self.journal_records += len(lines)
+            self.journal_unsynced += len(lines)
+        except (IOError, OSError) as e:
+            logger.error(f"Failed to append to {self.journal_path}: {e}")
+            return False
+        with self.lock:
+            self.overlay.update(profiles)
+        return True
+
+    def sync(self):
+        if self.journal_file is None or not self.journal_unsynced:
+            return
+        try:
+            os.fsync(self.journal_file.fileno())
+            self.journal_unsynced = 0
+        except (IOError, OSError) as e:
+            logger.error(f"Failed to fsync {self.journal_path}: {e}")
+
+    def needs_compaction(self):
+        return self.journal_records >= self.compact_records
+
+    def compact(self):
+        # Fold the journal into a fresh snapshot, then start a new journal
+        if not self.overlay and not self.journal_records:
+            return True
+        self.sync()
+        if not self.save_snapshot():
+            return False
+        try:
+            if self.journal_file is not None:
+                self.journal_file.close()
+            self.journal_file = open(self.journal_path, "w")
+            logger.info(f"🗜️ Compacted {self.journal_records} journal records into {self.path}")
+            self.journal_records = 0
+            self.journal_unsynced = 0
+            return True
+        except (IOError, OSError) as e:
+            self.journal_file = None
+            logger.error(f"Failed to truncate {self.journal_path}: {e}")
+            return False
+
+    def save_snapshot(self):
+        overlay = dict(self.overlay)
+        backed_up = False
+        try:
+            if self.snapshot_format == "binary" and isinstance(self.base, BinarySnapshot):
+                write_merged_snapshot(self.temp_path, self.base, overlay)
+            elif self.snapshot_format == "binary":
+                write_binary_snapshot(self.temp_path, {**self.base, **overlay})
+            else:
+                merged = {**self.base, **overlay}
+                with open(self.temp_path, "w") as f:
+                    json.dump(merged, f, indent=2)
+            if os.path.exists(self.path):
+                os.replace(self.path, self.backup_path)
+                backed_up = True
+            os.replace(self.temp_path, self.path)
+            logger.info(f"💾 Saved {self.path} (Size: {os.path.getsize(self.path)} bytes)")
+        except (IOError, OSError) as e:
+            logger.error(f"Failed to save {self.path}: {e}")
+            # Only when the live snapshot was moved aside and not replaced; otherwise it's still intact
+            if backed_up and not os.path.exists(self.path) and os.path.exists(self.backup_path):
+                os.replace(self.backup_path, self.path)
+                logger.info(f"Restored {self.path} from backup")
+            return False
+        old_base = self.base
+        new_base = BinarySnapshot(self.path) if self.snapshot_format == "binary" else merged
+        with self.lock:
+            self.base = new_base
+            for user_id in overlay:
+                self.overlay.pop(user_id, None)
+        if isinstance(old_base, BinarySnapshot):
+            old_base.close()
+        return True
+
+    def top_tournament(self, limit):
+        # Compaction runs on this same thread, so base cannot be swapped out mid-scan;
+        # only the overlay needs copying under the lock.
+        with self.lock:
+            overlay = dict(self.overlay)
+        if isinstance(self.base, BinarySnapshot):
+            rows = ((-points, races, user_id) for user_id, points, races in self.base.tournament_rows() if user_id not in overlay)
+        else:
+            rows = ((-profile["tournament_stats"]["points"], profile["races"], user_id)
+                    for user_id, profile in self.base.items() if user_id not in overlay)
+        overlay_rows = ((-profile["tournament_stats"]["points"], profile["races"], user_id) for user_id, profile in overlay.items())
+        top = heapq.nsmallest(limit, itertools.chain(rows, overlay_rows))
+        return [(user_id, overlay[user_id] if user_id in overlay else self.get(user_id)) for _, _, user_id in top]
+
+    def count(self):
+        with self.lock:
+            return len(self.base) + sum(1 for user_id in self.overlay if user_id not in self.base)
+
+    def close(self):
+        self.sync()
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+        if isinstance(self.base, BinarySnapshot):
+            self.base.close()
+            self.base = {}
+
+class SqliteProfileStore(ProfileStore):
+    name = "sqlite"
+
+    # One row per user. The hot sort/filter fields are mirrored into indexed columns,
+    # the full profile lives in the data column as JSON.
+    def __init__(self, path="career_stats.db"):
+        self.path = path
+        # Page-ins run on the event loop thread, everything else on the persistence thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS profiles (
+                user_id INTEGER PRIMARY KEY,
+                tournament_points INTEGER NOT NULL DEFAULT 0,
+                zcoins INTEGER NOT NULL DEFAULT 0,
+                races INTEGER NOT NULL DEFAULT 0,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_profiles_tournament_points ON profiles (tournament_points DESC, races ASC);
+            CREATE INDEX IF NOT EXISTS idx_profiles_zcoins ON profiles (zcoins);
+            CREATE INDEX IF NOT EXISTS idx_profiles_races ON profiles (races);
+        """)
+        self.conn.commit()
+
+    def load_all(self):
+        with self.lock:
+            profiles = {user_id: json.loads(data) for user_id, data in self.conn.execute("SELECT user_id, data FROM profiles")}
+        for profile in profiles.values():
+            migrate_profile(profile)
+        logger.info(f"✅ Loaded {self.path} (Entries: {len(profiles)})")
+        return profiles
+
+    def get(self, user_id):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM profiles WHERE user_id = ?", (int(user_id),)).fetchone()
+        if not row:
+            return None
+        profile = json.loads(row[0])
+        migrate_profile(profile)
+        return profile
+
+    def write(self, profiles):
+        if not profiles:
+            return True
+        rows = [
+            (
+                int(user_id),
+                profile.get("tournament_stats", {}).get("points", 0),
+                profile.get("zcoins", 0),
+                profile.get("races", 0),
+                json.dumps(profile, separators=(",", ":"))
+            )
+            for user_id, profile in profiles.items()
+        ]
+        try:
+            with self.lock, self.conn:
+                self.conn.executemany(
+                    "INSERT INTO profiles (user_id, tournament_points, zcoins, races, data) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET tournament_points = excluded.tournament_points, "
+                    "zcoins = excluded.zcoins, races = excluded.races, data = excluded.data",
+                    rows
+                )
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Failed to upsert {len(rows)} profiles into {self.path}: {e}")
+            return False
+
+    def compact(self):
+        try:
+            with self.lock:
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Failed to checkpoint {self.path}: {e}")
+            return False
+
+    def top_tournament(self, limit):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT user_id, data FROM profiles ORDER BY tournament_points DESC, races ASC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        profiles = [(user_id, json.loads(data)) for user_id, data in rows]
+        for _, profile in profiles:
+            migrate_profile(profile)
+        return profiles
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class ProfileCache:
+    # LRU of the profiles in active use, in front of a ProfileStore. Profiles are paged in
+    # on first access and the least recently used one is dropped once maxsize is exceeded.
+    # A dirty profile is copied into writeback and handed to write_back on eviction; the copy
+    # answers lookups until the store confirms the write with written_back().
+    def __init__(self, store, maxsize, is_dirty=None, write_back=None):
+        self.store = store
+        self.maxsize = maxsize
+        self.is_dirty = is_dirty
+        self.write_back = write_back
+        self.resident = OrderedDict()
+        self.writeback = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.resident)
+
+    def __contains__(self, user_id):
+        return int(user_id) in self.resident
+
+    def __getitem__(self, user_id):
+        profile = self.get(user_id)
+        if profile is None:
+            raise KeyError(user_id)
+        return profile
+
+    def __setitem__(self, user_id, profile):
+        user_id = int(user_id)
+        self.resident[user_id] = profile
+        self.resident.move_to_end(user_id)
+        while len(self.resident) > self.maxsize:
+            self.evict()
+
+    def items(self):
+        return list(self.resident.items())
+
+    def get(self, user_id, default=None):
+        user_id = int(user_id)
+        profile = self.resident.get(user_id)
+        if profile is not None:
+            self.resident.move_to_end(user_id)
+            return profile
+        with self.lock:
+            pending = self.writeback.get(user_id)
+        # The queued write may still be serialising the pending copy, so never hand it out directly
+        profile = copy_profile(pending) if pending is not None else self.store.get(user_id)
+        if profile is None:
+            return default
+        self[user_id] = profile
+        return profile
+
+    def evict(self):
+        user_id, profile = self.resident.popitem(last=False)
+        if self.is_dirty is None or not self.is_dirty(user_id):
+            return
+        pending = copy_profile(profile)
+        with self.lock:
+            self.writeback[user_id] = pending
+        self.write_back(user_id, pending)
+
+    def missing(self, user_ids):
+        # The IDs get() would have to read from the store
+        with self.lock:
+            return [user_id for user_id in map(int, user_ids) if user_id not in self.resident and user_id not in self.writeback]
+
+    def preload(self, profiles):
+        # Profiles read from the store off the event loop; anything paged in or evicted since wins
+        for user_id, profile in profiles.items():
+            with self.lock:
+                pending = user_id in self.writeback
+            if user_id not in self.resident and not pending:
+                self[user_id] = profile
+
+    def written_back(self, user_id, profile):
+        # Called from the persistence thread; a newer eviction of the same user keeps its copy
+        with self.lock:
+            if self.writeback.get(user_id) is profile:
+                del self.writeback[user_id]
+
+STORAGE_BACKENDS = {
+    "json": JsonProfileStore,
+    "sqlite": SqliteProfileStore,
+}
+
+def open_profile_store(backend, **kwargs):
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return STORAGE_BACKENDS[backend](**kwargs)